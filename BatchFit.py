@@ -0,0 +1,218 @@
+# encoding = utf8
+''' This script fits a batch of spectra without the GUI. It uses the same
+fit routines as PySpec.py (sflib), and the same initial guesses for every
+file, which are read from a parameter file. Files are fitted in parallel
+processes. For each successful fit, Fit*.csv and Fit*.log are written next
+to the spectrum, and a FitJob.log summarizes the whole batch.
+
+The parameter file contains "key = value" lines. Lines starting with # are
+ignored. Example:
+    ftype = 0           # 0 Gaussian, 1 Lorentzian
+    der = 2             # order of derivative (up to 4)
+    peak = 2            # number of peaks. 0 fits baseline only
+    deg = 1             # degree of polynomial baseline
+    boxwin = 1          # boxcar smooth window
+    rescale = 1         # y intensity rescaler
+    smooth_edge = 0     # remove additional baseline from smoothed edge
+    par = 8.0 0.7 1.5  12.0 0.9 -1.0    # (mu, sigma/gamma, A) * peak
+'''
+
+import os
+import glob
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+# custom module
+import sflib
+
+
+# default fit parameters, same as PySpec.FitParameter
+DEFAULT_PAR = {'ftype': 0,
+               'der': 0,
+               'peak': 1,
+               'deg': 0,
+               'boxwin': 1,
+               'rescale': 1,
+               'smooth_edge': False,
+               'par': []}
+
+
+def read_par(par_name):
+    ''' Read fit parameters from the parameter file.
+
+    Arguments:
+    par_name -- parameter file name
+
+    Returns:
+    fit_par -- dictionary of fit parameters. None if the file is invalid
+    '''
+
+    fit_par = dict(DEFAULT_PAR)
+    try:
+        with open(par_name, 'r') as par_file:
+            for line in par_file:
+                line = line.split('#')[0].strip()
+                if not line:
+                    continue
+                key, value = [s.strip() for s in line.split('=', 1)]
+                if key == 'par':
+                    fit_par['par'] = [float(s) for s in value.replace(',', ' ').split()]
+                elif key == 'rescale':
+                    fit_par['rescale'] = abs(float(value))
+                elif key == 'smooth_edge':
+                    fit_par['smooth_edge'] = bool(int(value))
+                elif key in fit_par:
+                    fit_par[key] = abs(int(value))
+                else:
+                    return None
+    except (OSError, ValueError):
+        return None
+
+    # check the parameter vector matches the number of peaks
+    if fit_par['ftype'] > 1 or fit_par['der'] > 4:
+        return None
+    elif len(fit_par['par']) != 3*fit_par['peak']:
+        return None
+    else:
+        return fit_par
+
+
+def list_spectra(targets):
+    ''' List spectrum files from directories and glob patterns.
+    Fit outputs (Fit*), hidden files and log files are skipped in directories.
+    '''
+
+    filelist = []
+    for target in targets:
+        if os.path.isdir(target):
+            for name in os.listdir(target):
+                full_name = os.path.join(target, name)
+                if (os.path.isfile(full_name) and not name.startswith(('Fit', '.'))
+                    and not name.endswith('.log')):
+                    filelist.append(full_name)
+        else:
+            filelist.extend(glob.glob(target))
+    # remove duplicates and sort file name
+    return sorted(set(filelist))
+
+
+def fit_file(file_name, fit_par):
+    ''' Fit a single spectrum file and save the fit & log files.
+    This is the worker function running in the process pool.
+
+    Arguments:
+    file_name -- spectrum file name
+    fit_par -- dictionary of fit parameters
+
+    Returns:
+    file_name -- spectrum file name
+    stat -- fit status code, see sflib.FIT_STAT
+    noise -- noise level
+    '''
+
+    xdata, ydata, stat = sflib.read_file(file_name, fit_par['boxwin'],
+                                         fit_par['rescale'])
+    if stat:
+        return file_name, stat, 0
+
+    f = sflib.Function(fit_par['ftype'], fit_par['der'], fit_par['peak'])
+    if fit_par['peak']:
+        popt, uncertainty, noise, ppoly, stat = sflib.fit_spectrum(f, xdata,
+                ydata, np.array(fit_par['par']), fit_par['deg'],
+                fit_par['smooth_edge'])
+    else:
+        popt, uncertainty, noise, ppoly, stat = sflib.fit_baseline(xdata,
+                ydata, fit_par['deg'])
+    if stat:
+        return file_name, stat, 0
+
+    # concatenate data table, same as PySpec.FitMainGui.fit_try
+    baseline = np.polyval(ppoly, xdata - np.median(xdata))
+    if fit_par['peak']:
+        fit = f.get_func()(xdata, *popt)
+    else:
+        fit = np.zeros_like(ydata)
+    data_table = np.column_stack((xdata, ydata, fit, baseline))
+
+    dir_name, base_name = os.path.split(file_name)
+    out_name = os.path.join(dir_name, sflib.out_name_gen(base_name))
+    if not fit_par['ftype']:
+        par_name = ['mu', 'sigma', 'A']
+    else:
+        par_name = ['mu', 'gamma', 'A']
+    sflib.save_fit(out_name + '.csv', data_table, popt, fit_par['ftype'],
+                   fit_par['der'], fit_par['peak'])
+    sflib.save_log(out_name + '.log', popt, uncertainty, ppoly,
+                   fit_par['ftype'], fit_par['der'], fit_par['peak'], par_name)
+
+    return file_name, stat, noise
+
+
+def batch_fit(filelist, fit_par, workers=None):
+    ''' Fit all files across a process pool. Prints the status of each file
+    as soon as it finishes.
+
+    Returns:
+    list_success_file -- list of successfully fitted file names
+    list_aborted_file -- list of failed file names
+    '''
+
+    list_success_file = []
+    list_aborted_file = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(fit_file, file_name, fit_par) for file_name in filelist]
+        for job in as_completed(jobs):
+            try:
+                file_name, stat, noise = job.result()
+            except Exception as err:
+                # unexpected error, e.g. output file not writable
+                file_name = filelist[jobs.index(job)]
+                list_aborted_file.append(file_name)
+                print('{:s} --- {:s}'.format(file_name, str(err)))
+                continue
+            if stat:
+                list_aborted_file.append(file_name)
+                print('{:s} --- [{:d}] {:s}'.format(file_name, stat,
+                                                    sflib.FIT_STAT[stat]))
+            else:
+                list_success_file.append(file_name)
+                print('{:s} --- [0] {:s}, noise {:.4f}'.format(file_name,
+                      sflib.FIT_STAT[stat], noise))
+
+    return sorted(list_success_file), sorted(list_aborted_file)
+
+
+# ------ run script ------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                    formatter_class=argparse.RawDescriptionHelpFormatter,
+                    epilog='--- Luyao Zou @ https://github.com/luyaozou/ ---')
+    parser.add_argument('spectra', nargs='+',
+                        help='List spectrum files, directories or glob patterns')
+    parser.add_argument('-p', '--par', nargs=1, required=True,
+                        help='Specify fit parameter file')
+    parser.add_argument('-j', '--jobs', nargs=1, type=int,
+                        help='Number of worker processes. Default is cpu count')
+    parser.add_argument('-o', '--out', nargs=1,
+                        help='Specify fit job log name. Default is FitJob.log')
+    args = parser.parse_args()
+
+    fit_par = read_par(args.par[0])
+    if not fit_par:
+        parser.error('invalid parameter file ' + args.par[0])
+
+    filelist = list_spectra(args.spectra)
+    if not filelist:
+        parser.error('no spectrum file found')
+
+    workers = args.jobs[0] if args.jobs else None
+    list_success_file, list_aborted_file = batch_fit(filelist, fit_par, workers)
+
+    logname = args.out[0] if args.out else 'FitJob.log'
+    with open(logname, 'w') as a_log:
+        for file_name in list_success_file:
+            a_log.write('Successful  --- {0:s}\n'.format(file_name))
+        for file_name in list_aborted_file:
+            a_log.write('Aborted     --- {0:s}\n'.format(file_name))
+    print('{:d} successful, {:d} aborted. {:s} saved!'.format(
+          len(list_success_file), len(list_aborted_file), logname))
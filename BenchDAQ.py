@@ -0,0 +1,335 @@
+# encoding = utf8
+''' This script benchmarks the JPL scan acquisition path without hardware.
+Scans run through daq.ScanLockin.ScanWorker against the simulated
+instruments in api.simulator, with the same plot refresh as SingleScan,
+in a headless Qt application. For each wait time, a batch of scan entries
+is taken, and each entry is saved by data.save.save_lwa.
+
+Reported per wait time (times in ms):
+    dwell       achieved time per point (read to read), vs. the nominal
+                wait time. overhead = mean - nominal, jitter = std
+    gui_stall   lateness of a 10 ms heartbeat timer in the GUI thread
+    gui_slot    time spent in the GUI slots per signal
+    save_lwa    time to save each entry
+    transactions  VISA transactions per point
+Memory (peak RSS & number of Python objects) is recorded after each entry,
+to spot growth over long batches. The result is written as JSON.
+
+Example:
+    python BenchDAQ.py -w 10 30 60 -p 201 -a 2 -e 5 -l 2 -o daq.json
+'''
+
+import os
+import sys
+import gc
+import time
+import json
+import tempfile
+import platform
+import argparse
+import numpy as np
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PyQt5 import QtGui, QtCore
+import pyqtgraph as pg
+# custom module
+from api import simulator as api_sim
+from api import synthesizer as api_syn
+from api import lockin as api_lia
+from api import validator as api_val
+from daq.ScanLockin import ScanWorker
+from gui import SharedWidgets as Shared
+from data import save
+
+try:
+    import resource
+except ImportError:     # not on Windows
+    resource = None
+
+
+# heartbeat interval of the GUI thread (ms)
+HEARTBEAT = 10
+
+
+def stats(a):
+    ''' Summary statistics of an array of times in seconds, returned in ms '''
+
+    a = np.asarray(a) * 1e3
+    if not len(a):
+        return None
+    return {'n': len(a),
+            'mean': float(np.mean(a)),
+            'std': float(np.std(a)),
+            'min': float(np.min(a)),
+            'p50': float(np.percentile(a, 50)),
+            'p95': float(np.percentile(a, 95)),
+            'p99': float(np.percentile(a, 99)),
+            'max': float(np.max(a))}
+
+
+def rss_kb():
+    ''' Peak resident memory of this process (kB). None if unavailable '''
+
+    if resource:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, kB on Linux
+        return rss // 1024 if sys.platform == 'darwin' else rss
+    else:
+        return None
+
+
+class ScanMonitor(QtCore.QObject):
+    ''' GUI side of the benchmark. Mirrors what SingleScan does with the
+        worker signals, and times it.
+    '''
+
+    def __init__(self, worker, x):
+        QtCore.QObject.__init__(self)
+
+        self.worker = worker
+        self.x = x
+        self.yCurve = pg.PlotDataItem()
+        self.yCurve.setClipToView(True)
+        self.yCurve.setDownsampling(auto=True, method='peak')
+        self.ySumCurve = pg.PlotDataItem()
+        self.ySumCurve.setClipToView(True)
+        self.ySumCurve.setDownsampling(auto=True, method='peak')
+        self.freqLabel = QtGui.QLabel()
+        self.refresher = Shared.PlotRefresher(self)
+        self.sweep_y = worker.y
+        self.refresher.set_data(self.yCurve, x, self.sweep_y, shown=False)
+        self.refresher.set_data(self.ySumCurve, x, worker.y_sum)
+
+        # read times, recorded in the worker thread
+        self.t_read = []
+        # GUI slot durations and heartbeat lateness
+        self.t_slot = []
+        self.t_late = []
+        self._t_beat = None
+        self.heartbeat = QtCore.QTimer(self)
+        self.heartbeat.setInterval(HEARTBEAT)
+        self.heartbeat.timeout.connect(self.beat)
+
+        worker.point_acquired.connect(self.mark_read, QtCore.Qt.DirectConnection)
+        worker.point_acquired.connect(self.update_point)
+        worker.sweep_finished.connect(self.update_ysum)
+        worker.freq_tuned.connect(self.update_syn_freq)
+
+    def mark_read(self, *args):
+
+        self.t_read.append(time.perf_counter())
+
+    def beat(self):
+
+        now = time.perf_counter()
+        if self._t_beat is not None:
+            self.t_late.append(max(now - self._t_beat - HEARTBEAT * 1e-3, 0))
+        self._t_beat = now
+
+    def update_point(self, y, idx, pts_taken):
+
+        t = time.perf_counter()
+        if y is not self.sweep_y:
+            self.sweep_y = y
+            self.refresher.set_data(self.yCurve, self.x, y, shown=False)
+        if idx < 0:
+            self.refresher.update(self.yCurve)
+        else:
+            self.refresher.update(self.yCurve, idx, idx+1)
+        self.t_slot.append(time.perf_counter() - t)
+
+    def update_ysum(self, y_sum):
+
+        t = time.perf_counter()
+        self.refresher.set_data(self.ySumCurve, self.x, y_sum)
+        self.t_slot.append(time.perf_counter() - t)
+
+    def update_syn_freq(self, prob_freq):
+
+        t = time.perf_counter()
+        self.freqLabel.setText('{:.3f} MHz'.format(prob_freq * 1e-6))
+        self.t_slot.append(time.perf_counter() - t)
+
+    def run(self, timeout):
+        ''' Run the scan until the target averages are reached.
+            Returns the wall time (s), None if timed out
+        '''
+
+        loop = QtCore.QEventLoop()
+        self.worker.scan_finished.connect(loop.quit)
+        timer = QtCore.QTimer(loop)
+        timer.setSingleShot(True)
+        timer.timeout.connect(loop.quit)
+        timer.start(int(timeout * 1e3))
+        self._t_beat = None
+        self.heartbeat.start()
+        t = time.perf_counter()
+        self.worker.start()
+        loop.exec_()
+        t = time.perf_counter() - t
+        finished = self.worker.acquired_avg == self.worker.target_avg
+        self.worker.stop()
+        self.heartbeat.stop()
+        self.refresher.flush()
+        self.worker.scan_finished.disconnect(loop.quit)
+        return t if finished else None
+
+
+def tune_inst(synHandle, liaHandle, x, multiplier, sens_index, harm):
+    ''' Tune the simulated instruments as SingleScan.tune_inst, FM mode '''
+
+    api_syn.set_syn_freq(synHandle, x[0] * 1e6 / multiplier)
+    api_syn.set_mod_mode(synHandle, 2)
+    api_syn.set_fm(synHandle, 15e3, 300e3, True)
+    api_lia.set_sens(liaHandle, sens_index)
+    api_lia.set_tc(liaHandle, 4)
+    api_lia.set_harm(liaHandle, harm)
+    api_lia.set_phase(liaHandle, 0)
+
+
+def run_entry(bench, synHandle, liaHandle, args, waittime, filename):
+    ''' Take and save a single scan entry.
+        Returns a dictionary of raw timings
+    '''
+
+    f0 = bench.lines[1][0]
+    half = args.step * (args.points - 1) / 2
+    x = Shared.gen_x_array(f0 - half, f0 + half, args.step)
+    tune_inst(synHandle, liaHandle, x, bench.multiplier, args.sens, args.harm)
+
+    worker = ScanWorker()
+    worker.setup(x, args.avg, waittime, synHandle, liaHandle,
+                 bench.multiplier, False)
+    worker.use_buffer = args.buffer
+    monitor = ScanMonitor(worker, x)
+
+    n_trans = sum(bench.transactions.values())
+    # nominal time plus a generous margin for the VISA latency
+    timeout = len(x) * args.avg * (waittime * 1e-3 + 20 * max(bench.latency.values())) + 10
+    wall = monitor.run(timeout)
+    n_trans = sum(bench.transactions.values()) - n_trans
+
+    # save as SingleScan.save_data
+    h_info = (bench.multiplier, waittime, api_val.LIASENSLIST[args.sens],
+              api_val.LIATCLIST[4] * 1e-3, 15, 300, 'FM', args.harm, 0,
+              min(x), args.step, worker.acquired_avg, 'BenchDAQ')
+    t = time.perf_counter()
+    save.save_lwa(filename, worker.y_sum / max(worker.acquired_avg, 1), h_info)
+    t_save = time.perf_counter() - t
+
+    # intervals between reads, pauses between entries are not included
+    t_read = np.array(monitor.t_read)
+    entry = {'wall': wall,
+             'points': len(t_read),
+             'dwell': np.diff(t_read),
+             'slot': monitor.t_slot,
+             'late': monitor.t_late,
+             'save': t_save,
+             'transactions': n_trans}
+    worker.deleteLater()
+    monitor.deleteLater()
+    return entry
+
+
+def run_waittime(bench, synHandle, liaHandle, args, waittime, filename, memory):
+    ''' Run a batch of entries at one wait time and summarize them '''
+
+    entries = []
+    for i in range(args.entries):
+        entries.append(run_entry(bench, synHandle, liaHandle, args, waittime, filename))
+        QtCore.QCoreApplication.processEvents()
+        gc.collect()
+        memory.append({'waittime': waittime, 'entry': i,
+                       'max_rss_kb': rss_kb(), 'objects': len(gc.get_objects())})
+
+    done = [e for e in entries if e['wall'] is not None]
+    dwell = np.concatenate([e['dwell'] for e in entries])
+    points = sum(e['points'] for e in done)
+    wall = sum(e['wall'] for e in done)
+    summary = {'waittime': waittime,
+               'entries': len(entries),
+               'timed_out': len(entries) - len(done),
+               'points_per_entry': args.points * args.avg,
+               'points_per_sec': points / wall if wall else None,
+               'dwell': stats(dwell),
+               'overhead': float(np.mean(dwell) * 1e3 - waittime) if len(dwell) else None,
+               'gui_stall': stats(np.concatenate([e['late'] for e in entries])),
+               'gui_slot': stats(np.concatenate([e['slot'] for e in entries])),
+               'save_lwa': stats([e['save'] for e in entries]),
+               'transactions': (sum(e['transactions'] for e in entries) /
+                                max(sum(e['points'] for e in entries), 1))}
+    return summary
+
+
+# ------ run script ------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                    formatter_class=argparse.RawDescriptionHelpFormatter,
+                    epilog='--- Luyao Zou @ https://github.com/luyaozou/ ---')
+    parser.add_argument('-w', '--waittime', nargs='+', type=float, default=[10, 60],
+                        help='Wait time per point (ms). Default 10 60')
+    parser.add_argument('-p', '--points', type=int, default=201,
+                        help='Number of points per sweep. Default 201')
+    parser.add_argument('-s', '--step', type=float, default=0.02,
+                        help='Step size (MHz). Default 0.02')
+    parser.add_argument('-a', '--avg', type=int, default=2,
+                        help='Number of averages (sweeps) per entry. Default 2')
+    parser.add_argument('-e', '--entries', type=int, default=3,
+                        help='Number of entries per wait time. Default 3')
+    parser.add_argument('-l', '--latency', type=float, default=2,
+                        help='VISA latency per transaction (ms). Default 2')
+    parser.add_argument('--no-contention', action='store_true',
+                        help='Do not serialize the GPIB bus')
+    parser.add_argument('-b', '--buffer', action='store_true',
+                        help='Use the lockin data buffer')
+    parser.add_argument('--sens', type=int, default=17,
+                        help='Lockin sensitivity index. Default 17 (1 mV)')
+    parser.add_argument('--harm', type=int, default=2,
+                        help='Lockin harmonic. Default 2')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed of the simulated noise')
+    parser.add_argument('--label', default='',
+                        help='Free text label saved in the output, e.g. release')
+    parser.add_argument('-o', '--out', nargs=1,
+                        help='Output JSON file. Default prints to stdout')
+    args = parser.parse_args()
+
+    app = QtGui.QApplication(sys.argv[:1])
+
+    bench = api_sim.SimBench(latency=args.latency * 1e-3,
+                             contention=not args.no_contention, seed=args.seed)
+    synHandle = bench.open_resource(api_sim.ADDRESS['syn'])
+    liaHandle = bench.open_resource(api_sim.ADDRESS['lia'])
+    api_syn.init_syn(synHandle)
+    api_lia.init_lia(liaHandle)
+
+    memory = [{'waittime': None, 'entry': None, 'max_rss_kb': rss_kb(),
+               'objects': len(gc.get_objects())}]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, 'bench.lwa')
+        for waittime in args.waittime:
+            results.append(run_waittime(bench, synHandle, liaHandle, args,
+                                        waittime, filename, memory))
+            print('wait time {:g} ms --- {:.1f} points/s'.format(waittime,
+                  results[-1]['points_per_sec'] or 0), file=sys.stderr)
+
+    report = {'benchmark': 'daq',
+              'label': args.label,
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'platform': platform.platform(),
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'config': {'points': args.points, 'step': args.step,
+                         'avg': args.avg, 'entries': args.entries,
+                         'latency': args.latency,
+                         'contention': not args.no_contention,
+                         'buffer': args.buffer, 'sens': args.sens,
+                         'harm': args.harm, 'seed': args.seed},
+              'results': results,
+              'memory': memory}
+
+    if args.out:
+        with open(args.out[0], 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,212 @@
+# encoding = utf8
+''' This script benchmarks sflib.fit_spectrum on synthetic spectra.
+Spectra are generated from each sflib.Function family (Gaussian or
+Lorentzian, derivative 0-4) with known peak parameters, a polynomial
+baseline and Gaussian noise. Each spectrum is fitted from a perturbed
+initial guess, over a grid of spectrum lengths, numbers of peaks and
+baseline degrees.
+
+Reported for each grid point:
+    time        fit wall time (ms) over the repeats: min, median, max
+    nfev, njev  number of function (including residuals) & Jacobian
+                evaluations
+    loops       number of baseline/fit iterations in fit_spectrum
+    stat        fit status code, see sflib.FIT_STAT
+    err_mu      max |mu - true mu| / true width
+    err_width   max relative error of the widths
+    err_A       max relative error of the intensities
+    z           max |popt - true| / uncertainty
+The result is written as JSON.
+
+Example:
+    python BenchFit.py -n 1000 10000 -k 1 3 -d 0 2 -r 3 -o fit.json
+'''
+
+import sys
+import time
+import json
+import platform
+import argparse
+import numpy as np
+import scipy
+# custom module
+import sflib
+
+
+class CountedFunction(sflib.Function):
+    ''' sflib.Function that counts calls of the function and its Jacobian '''
+
+    def __init__(self, ftype, der, peak):
+        sflib.Function.__init__(self, ftype, der, peak)
+        self.nfev = 0
+        self.njev = 0
+        self.nget = 0
+
+    def get_func(self):
+        func = sflib.Function.get_func(self)
+        self.nget += 1
+
+        def counted(x, *p):
+            self.nfev += 1
+            return func(x, *p)
+        return counted
+
+    def get_jac(self):
+        jac = sflib.Function.get_jac(self)
+
+        def counted(x, *p):
+            self.njev += 1
+            return jac(x, *p)
+        return counted
+
+
+def true_par(f, x, width):
+    ''' Peak parameters with evenly spaced centers, and intensities
+    scaled so that every peak is about 1 at its maximum.
+    Returns the (mu, width, A) * peak vector
+    '''
+
+    span = x[-1] - x[0]
+    par = []
+    for k in range(f.peak):
+        mu = x[0] + span * (k + 1) / (f.peak + 1)
+        # unit intensity peak on a dense grid around its center
+        dx = np.linspace(-5*width, 5*width, 2001)
+        height = np.max(np.abs(sflib.Function(f.ftype, f.der, 1).get_func()(dx, 0, width, 1)))
+        par.extend([mu, width, 1 / height])
+    return np.array(par)
+
+
+def synth_spectrum(f, npts, deg, width, snr, rng):
+    ''' Generate a synthetic spectrum.
+    Returns x, y, true parameter vector, true baseline polynomial
+    '''
+
+    x = np.linspace(0, 100, npts)
+    par = true_par(f, x, width)
+    xshift = x - np.median(x)
+    # baseline of about +-0.5 over the whole spectrum
+    ppoly = rng.uniform(-0.5, 0.5, deg + 1) / 50.0**np.arange(deg, -1, -1)
+    y = (sflib.Function(f.ftype, f.der, f.peak).get_func()(x, *par) +
+         np.polyval(ppoly, xshift) + rng.normal(0, 1 / snr, npts))
+    return x, y, par, ppoly
+
+
+def perturb(par, rng):
+    ''' Initial guess: centers shifted by up to 0.2 width, widths and
+    intensities off by up to 20% '''
+
+    init = par.copy()
+    width = par[1::3]
+    init[0::3] += rng.uniform(-0.2, 0.2, len(width)) * width
+    init[1::3] *= rng.uniform(0.8, 1.2, len(width))
+    init[2::3] *= rng.uniform(0.8, 1.2, len(width))
+    return init
+
+
+def bench_case(ftype, der, peak, npts, deg, args, rng):
+    ''' Fit one grid point args.repeat times. Returns the result dict '''
+
+    f = CountedFunction(ftype, der, peak)
+    x, y, par, ppoly = synth_spectrum(f, npts, deg, args.width, args.snr, rng)
+    init = perturb(par, rng)
+
+    times = []
+    for i in range(args.repeat):
+        f.nfev = f.njev = f.nget = 0
+        t = time.perf_counter()
+        popt, uncertainty, noise, ppoly_fit, stat = sflib.fit_spectrum(f, x, y,
+                                                        init.copy(), deg)
+        times.append(time.perf_counter() - t)
+
+    case = {'ftype': 'lorentzian' if ftype else 'gaussian',
+            'der': der, 'peak': peak, 'npts': npts, 'deg': deg,
+            'time': {'min': min(times) * 1e3,
+                     'median': float(np.median(times)) * 1e3,
+                     'max': max(times) * 1e3},
+            'nfev': f.nfev, 'njev': f.njev,
+            # get_func is called 3 times per loop
+            'loops': f.nget // 3,
+            'stat': stat}
+    if stat:
+        case.update({'err_mu': None, 'err_width': None, 'err_A': None, 'z': None})
+    else:
+        width = par[1::3]
+        case['err_mu'] = float(np.max(np.abs(popt[0::3] - par[0::3]) / width))
+        case['err_width'] = float(np.max(np.abs(popt[1::3] / width - 1)))
+        case['err_A'] = float(np.max(np.abs(popt[2::3] / par[2::3] - 1)))
+        if len(uncertainty):
+            case['z'] = float(np.max(np.abs(popt - par) / uncertainty))
+        else:
+            case['z'] = None
+    return case
+
+
+# ------ run script ------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                    formatter_class=argparse.RawDescriptionHelpFormatter,
+                    epilog='--- Luyao Zou @ https://github.com/luyaozou/ ---')
+    parser.add_argument('-f', '--ftype', nargs='+', type=int, default=[0, 1],
+                        help='Function types: 0 Gaussian, 1 Lorentzian. Default 0 1')
+    parser.add_argument('--der', nargs='+', type=int, default=[0, 1, 2, 3, 4],
+                        help='Derivative orders. Default 0 1 2 3 4')
+    parser.add_argument('-n', '--npts', nargs='+', type=int, default=[1000, 10000],
+                        help='Spectrum lengths. Default 1000 10000')
+    parser.add_argument('-k', '--peak', nargs='+', type=int, default=[1, 3],
+                        help='Numbers of peaks. Default 1 3')
+    parser.add_argument('-d', '--deg', nargs='+', type=int, default=[0, 2],
+                        help='Baseline polynomial degrees. Default 0 2')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Fits per grid point. Default 3')
+    parser.add_argument('-w', '--width', type=float, default=1.0,
+                        help='Peak sigma/gamma, x range is 0-100. Default 1')
+    parser.add_argument('--snr', type=float, default=100,
+                        help='Peak height / noise. Default 100')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed')
+    parser.add_argument('--label', default='',
+                        help='Free text label saved in the output, e.g. release')
+    parser.add_argument('-o', '--out', nargs=1,
+                        help='Output JSON file. Default prints to stdout')
+    args = parser.parse_args()
+
+    if any(der > 4 for der in args.der) or any(ftype > 1 for ftype in args.ftype):
+        parser.error('ftype must be 0 or 1, der must be 0-4')
+
+    rng = np.random.default_rng(args.seed)
+    results = []
+    t_total = time.perf_counter()
+    for ftype in args.ftype:
+        for der in args.der:
+            for peak in args.peak:
+                for npts in args.npts:
+                    for deg in args.deg:
+                        case = bench_case(ftype, der, peak, npts, deg, args, rng)
+                        results.append(case)
+                        print('{:s} der {:d} peak {:d} npts {:d} deg {:d} --- '
+                              '{:.1f} ms, nfev {:d}, [{:d}] {:s}'.format(
+                              case['ftype'], der, peak, npts, deg,
+                              case['time']['median'], case['nfev'],
+                              case['stat'], sflib.FIT_STAT[case['stat']]),
+                              file=sys.stderr)
+    t_total = time.perf_counter() - t_total
+
+    report = {'benchmark': 'fit',
+              'label': args.label,
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'platform': platform.platform(),
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'scipy': scipy.__version__,
+              'config': {'repeat': args.repeat, 'width': args.width,
+                         'snr': args.snr, 'seed': args.seed},
+              'total_time': t_total,
+              'failed': sum(1 for case in results if case['stat']),
+              'results': results}
+
+    if args.out:
+        with open(args.out[0], 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
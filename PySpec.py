@@ -65,12 +65,7 @@ class FitStatus:
     def __init__(self):
         self.stat = 2
         self.input_valid = True
-        self.stat_dict = {0:'Fit successful',
-                          1:'Fit failed',
-                          2:'File not found',
-                          3:'Unsupported file format',
-                          4:'Baseline removal failed',
-                          5:'Input Invalid'}
+        self.stat_dict = sflib.FIT_STAT
         self.file_idx = 0
 
     def print_stat(self):
@@ -92,6 +87,9 @@ class FitMainGui(QtWidgets.QMainWindow):
         # get file directory (read last directory from .cfg file)
         self.current_dir = self.get_file_dir()
 
+        # cache of loaded spectra, so that retries do not parse files again
+        self.spec_cache = sflib.SpectrumCache()
+
         # add aborted and successful file list
         self.list_aborted_file = []
         self.list_success_file = []
@@ -347,7 +345,7 @@ class FitMainGui(QtWidgets.QMainWindow):
                 self.fit_stat.stat = 2  # exception: file not found
                 return None, None
         # try load data
-        xdata, ydata, self.fit_stat.stat = sflib.read_file(filename,
+        xdata, ydata, self.fit_stat.stat = self.spec_cache.read_file(filename,
                                  self.fit_par.boxwin, self.fit_par.rescale)
         # if file is readable, plot raw data and return xy data
         if not self.fit_stat.stat:
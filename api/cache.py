@@ -0,0 +1,86 @@
+#! encoding = utf-8
+
+''' Write-through cache of instrument settings '''
+
+import pyvisa
+
+
+class InstCache():
+    ''' Write-through cache around the set functions of an instrument api.
+        The cached values are the attributes of the instrument info object
+        (gui.SharedWidgets.SynInfo or LiaInfo), which mirror the instrument.
+        A setting is only trusted after it is read from the instrument
+        (validate) or written successfully. Any failed write, or an error
+        reported by the instrument, invalidates all settings.
+    '''
+
+    def __init__(self, info, has_error=None):
+        ''' info: instrument info object
+            has_error: function(handle) returns True if the instrument
+                       reports an error, e.g. api.lockin.has_error
+        '''
+
+        self.info = info
+        self.has_error = has_error
+        self._valid = set()         # trusted keys
+        self._all_valid = False     # all keys trusted
+        self.changed = False        # settings written since validate()
+
+    def validate(self, keys=None):
+        ''' Trust the info attributes in keys, default all.
+            Call right after a full query of the instrument.
+        '''
+
+        if keys is None:
+            self._all_valid = True
+            self.changed = False
+        else:
+            self._valid.update(keys)
+
+    def invalidate(self):
+        ''' Distrust all cached settings '''
+
+        self._all_valid = False
+        self._valid.clear()
+
+    def is_valid(self, key):
+
+        return self._all_valid or key in self._valid
+
+    def set(self, handle, set_func, state, *args):
+        ''' Call set_func(handle, *args) unless the instrument is known to
+            be in state already.
+            Arguments
+                handle: pyvisa.resources.Resource
+                set_func: api set function, returns visaCode
+                state: dict {info attribute name: value} after the setting
+                args: arguments of set_func
+            Returns
+                vcode: visaCode. pyvisa.constants.StatusCode.success if skipped
+        '''
+
+        if all(self.is_valid(key) and getattr(self.info, key) == value
+               for key, value in state.items()):
+            return pyvisa.constants.StatusCode.success
+
+        vcode = set_func(handle, *args)
+        self.changed = True
+        if vcode == pyvisa.constants.StatusCode.success:
+            for key, value in state.items():
+                setattr(self.info, key, value)
+            self.validate(state.keys())
+        else:
+            self.invalidate()
+
+        return vcode
+
+    def check_error(self, handle):
+        ''' Query the instrument error and invalidate if there is any.
+            Returns True if there is an error
+        '''
+
+        if self.has_error and self.has_error(handle):
+            self.invalidate()
+            return True
+        else:
+            return False
@@ -2,54 +2,174 @@
 
 import pyvisa
 import os.path
+import threading
+import time
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from api import simulator as api_sim
+from api import trace as api_trace
 
-def list_inst():
+# shared pyvisa resource manager, see get_rm()
+_RM = None
+_RM_LOCK = threading.Lock()
+
+# instrument description cache {address: (time stamp, description)}
+IDN_TTL = 60        # seconds
+_IDN_CACHE = {}
+
+# timeout (ms) for opening & querying a resource when probing instruments
+PROBE_TIMEOUT = 500
+
+
+def get_rm():
     '''
-        List current available instruments.
+        Return the shared pyvisa resource manager. It is opened at the
+        first call. Raises OSError if the VISA library cannot be opened.
+    '''
+
+    global _RM
+    with _RM_LOCK:
+        if _RM is None:
+            _RM = pyvisa.highlevel.ResourceManager()
+        return _RM
+
+
+def open_resource(inst, **kwargs):
+    '''
+        Open a resource from the shared resource manager, or from the
+        simulated bench if the address is a simulated instrument.
+        kwargs are passed to open_resource.
+    '''
+
+    if api_sim.is_sim(inst):
+        return api_sim.BENCH.open_resource(inst, **kwargs)
+    else:
+        return get_rm().open_resource(inst, **kwargs)
+
+
+def probe_inst(inst, timeout=PROBE_TIMEOUT):
+    '''
+        Get the description of a single instrument. GPIB instruments are
+        asked for *IDN?. Results are cached for IDN_TTL seconds.
+        Arguments
+            inst: instrument address, str
+            timeout: open & query timeout, ms
+        Returns
+            description: str
+    '''
+
+    now = time.monotonic()
+    if inst in _IDN_CACHE and now - _IDN_CACHE[inst][0] < IDN_TTL:
+        return _IDN_CACHE[inst][1]
+
+    try:
+        # open each instrument and get instrument information
+        temp = open_resource(inst, read_termination='\r\n',
+                             open_timeout=timeout)
+        temp.timeout = timeout
+        # If the instrument is GPIB, query for the instrument name
+        if int(temp.interface_type) == 1:
+            text = temp.query('*IDN?').strip()
+        else:
+            text = inst
+        # close instrument right way in case of unexpected crashes
+        temp.close()
+    except:
+        # do not cache failures, the instrument may be turned on later
+        return 'Visa IO Error'
+
+    _IDN_CACHE[inst] = (now, text)
+    return text
+
+
+def probe_all(inst_list, callback=None, workers=8, timeout=PROBE_TIMEOUT):
+    '''
+        Probe instruments concurrently.
+        Arguments
+            inst_list: list of instrument addresses
+            callback: function(inst, description), called as soon as each
+                      instrument replies (from the worker threads)
+            workers: number of threads, int
+            timeout: open & query timeout per instrument, ms
+        Returns
+            inst_dict: {address: description}
+    '''
+
+    inst_dict = {}
+    if not inst_list:
+        return inst_dict
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        jobs = {pool.submit(probe_inst, inst, timeout): inst for inst in inst_list}
+        for job in as_completed(jobs):
+            inst = jobs[job]
+            inst_dict[inst] = job.result()
+            if callback:
+                callback(inst, inst_dict[inst])
+
+    return inst_dict
+
+
+def list_resources():
+    '''
+        List current available instrument addresses. Simulated instruments
+        are appended if enabled (see api.simulator).
         Returns
             inst_list: a sorted list of available instrument addresses, list
-            inst_str: formated text for GUI display, str
+            None:      if cannot open the VISA library
     '''
 
-    # open pyvisa resource manager
     try:
-        rm = pyvisa.highlevel.ResourceManager()
+        inst_list = list(get_rm().list_resources())
     except OSError:
-        return [], 'Cannot open VISA library!'
-    # get available instrument address list
-    inst_list = list(rm.list_resources())
+        if api_sim.enabled():
+            inst_list = []
+        else:
+            return None
+    if api_sim.enabled():
+        inst_list.extend(api_sim.BENCH.list_resources())
     inst_list.sort()
-    inst_dict = {}
-    for inst in inst_list:
-        try:
-            # open each instrument and get instrument information
-            temp = rm.open_resource(inst, read_termination='\r\n')
-            # If the instrument is GPIB, query for the instrument name
-            if int(temp.interface_type) == 1:
-                text = temp.query('*IDN?')
-                inst_dict[inst] = text.strip()
-            else:
-                inst_dict[inst] = inst
-            # close instrument right way in case of unexpected crashes
-            temp.close()
-        except:
-            inst_dict[inst] = 'Visa IO Error'
+    return inst_list
+
 
-    inst_str = 'Detected Instrument:\n'
-    if inst_dict:
+def format_inst_str(inst_list, inst_dict):
+    '''
+        Format instrument list for GUI display.
+        Instruments not in inst_dict yet are shown as probing.
+    '''
+
+    if inst_list:
+        inst_str = 'Detected Instrument:\n'
         for inst in inst_list:
-            inst_str = inst_str + '{:s}\t{:s}\n'.format(inst, inst_dict[inst])
+            inst_str = inst_str + '{:s}\t{:s}\n'.format(inst, inst_dict.get(inst, 'Probing...'))
     else:
         inst_str = 'No instrument available. Check your connection/driver.'
 
-    return inst_list, inst_str
+    return inst_str
+
+
+def list_inst():
+    '''
+        List current available instruments.
+        Returns
+            inst_list: a sorted list of available instrument addresses, list
+            inst_str: formated text for GUI display, str
+    '''
+
+    inst_list = list_resources()
+    if inst_list is None:
+        return [], 'Cannot open VISA library!'
+    inst_dict = probe_all(inst_list)
+
+    return inst_list, format_inst_str(inst_list, inst_dict)
 
 
 def open_inst(inst_address):
     '''
         Open single instrument by its address.
         Returns
-            inst_handle: pyvisa object for the instrument
+            inst_handle: pyvisa object for the instrument, wrapped by
+                         api.trace.TracedHandle, whose I/O is serialized
+                         between threads
             None:        if cannot open the instrument
     '''
 
@@ -57,13 +177,23 @@ def open_inst(inst_address):
         return None
     else:
         try:
-            rm = pyvisa.highlevel.ResourceManager()
-            inst_handle = rm.open_resource(inst_address)
-            return inst_handle
+            inst_handle = open_resource(inst_address)
+            return api_trace.TracedHandle(inst_handle)
         except:
             return None
 
 
+def io_lock(inst_handle):
+    '''
+        Lock to hold over a write & read sequence on inst_handle, so that
+        other threads cannot interleave their I/O.
+        Returns
+            the io_lock of a handle from open_inst, or a no-op context
+    '''
+
+    return getattr(inst_handle, 'io_lock', contextlib.nullcontext())
+
+
 def close_inst(*inst_handle):
     '''
         Close all connecting instruments
@@ -81,3 +211,68 @@ def close_inst(*inst_handle):
             pass
 
     return status
+
+
+# instruments (resource names) that failed a compound query
+_NO_COMPOUND = set()
+
+
+def query_snapshot(inst_handle, items, chunk=10, sep=';'):
+    '''
+        Read a list of settings with as few transactions as possible.
+        Queries are joined by sep into compound messages of up to chunk
+        queries. Replies are accepted either joined by sep in one line (SCPI)
+        or one line per query. If a compound query fails or the number of
+        replies does not match, the device is cleared to discard the
+        replies left in its output queue, and the queries of that message
+        are sent one by one instead, and so are all later snapshots of that
+        instrument.
+        Arguments
+            inst_handle: pyvisa.resources.Resource
+            items: list of (key, query_str, parse_func, default)
+                   parse_func converts the stripped reply text;
+                   default is used if the query or the parsing fails
+            chunk: max number of queries in one message, int
+            sep: query & reply separator, str
+        Returns
+            snapshot: dict {key: value}
+    '''
+
+    snapshot = {}
+    for i in range(0, len(items), chunk):
+        group = items[i:i+chunk]
+        replies = []
+        if inst_handle.resource_name not in _NO_COMPOUND:
+            # keep other threads off the bus until all replies are read
+            with io_lock(inst_handle):
+                try:
+                    inst_handle.write(sep.join(item[1] for item in group))
+                    while len(replies) < len(group):
+                        text = inst_handle.read()
+                        replies.extend(text.strip().split(sep))
+                except:
+                    replies = []
+                if len(replies) != len(group):
+                    _NO_COMPOUND.add(inst_handle.resource_name)
+                    # stale replies would shift the one-by-one queries
+                    try:
+                        inst_handle.clear()
+                    except:
+                        pass
+        else:
+            pass
+        if len(replies) == len(group):
+            for (key, _, parse, default), text in zip(group, replies):
+                try:
+                    snapshot[key] = parse(text.strip())
+                except:
+                    snapshot[key] = default
+        else:
+            # compound query not supported, ask one by one
+            for key, query_str, parse, default in group:
+                try:
+                    snapshot[key] = parse(inst_handle.query(query_str).strip())
+                except:
+                    snapshot[key] = default
+
+    return snapshot
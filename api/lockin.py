@@ -1,6 +1,7 @@
 #! encoding = utf-8
 
 import numpy as np
+from api import general as api_gen
 
 # LOCKIN AMPLIFIER SENSTIVITY LIST
 SENS_LIST = ['2 nV', '5 nV', '10 nV', '20 nV', '50 nV', '100 nV',
@@ -42,6 +43,29 @@ SAMPLE_RATE_LIST = ['1/16 Hz', '1/8 Hz', '1/4 Hz', '1/2 Hz', '1 Hz',
                     '2 Hz', '4 Hz', '8 Hz', '16 Hz', '32 Hz', '64 Hz',
                     '128 Hz', '256 Hz', '512 Hz', 'Trigger']
 
+# LOCKIN DATA BUFFER SIZE (points per channel)
+BUFFER_SIZE = 16383
+
+# setting queries, shared by the read_* functions and read_snapshot.
+# keys are the attribute names of gui.SharedWidgets.LiaInfo
+_QUERY = {'refSrcIndex': 'FMOD?',
+          'refFreq': 'FREQ?',
+          'refPhase': 'PHAS?',
+          'refHarm': 'HARM?',
+          'configIndex': 'ISRC?',
+          'groundingIndex': 'IGND?',
+          'coupleIndex': 'ICPL?',
+          'inputFilterIndex': 'ILIN?',
+          'sensIndex': 'SENS?',
+          'tcIndex': 'OFLT?',
+          'reserveIndex': 'RMOD?',
+          'lpSlopeIndex': 'OFSL?',
+          'disp1Text': 'DDEF?1',
+          'disp2Text': 'DDEF?2',
+          'front1Text': 'FPOP?1',
+          'front2Text': 'FPOP?2',
+          'sampleRateIndex': 'SRAT?'}
+
 
 def init_lia(liaHandle):
     ''' Initiate the lockin with default settings.
@@ -80,21 +104,36 @@ def query_inst_name(liaHandle):
 
 
 def query_err_msg(liaHandle):
-
+    ''' Query the error status byte. Reading it clears the errors.
+        Returns msg: str, '0' if no error
+    '''
 
     try:
         text = liaHandle.query('ERRS?')
+        return text.strip()
     except:
         return 'N.A.'
 
 
+def has_error(liaHandle):
+    ''' Check if the lockin has reported any error since the last check.
+        Returns status (bool)
+    '''
+
+    msg = query_err_msg(liaHandle)
+    try:
+        return bool(int(msg))
+    except ValueError:
+        return True
+
+
 def read_freq(liaHandle):
     ''' Read current lockin frequency.
         Returns frequency in Hz (float)
     '''
 
     try:
-        text = liaHandle.query('FREQ?')
+        text = liaHandle.query(_QUERY['refFreq'])
         return float(text.strip())
     except:
         return 0
@@ -106,7 +145,7 @@ def read_harm(liaHandle):
     '''
 
     try:
-        text = liaHandle.query('HARM?')
+        text = liaHandle.query(_QUERY['refHarm'])
         return int(text.strip())
     except:
         return 0
@@ -133,7 +172,7 @@ def read_phase(liaHandle):
     '''
 
     try:
-        text = liaHandle.query('PHAS?')
+        text = liaHandle.query(_QUERY['refPhase'])
         return float(text.strip())
     except:
         return 0
@@ -184,7 +223,7 @@ def read_sens(liaHandle):
     '''
 
     try:
-        text = liaHandle.query('SENS?')
+        text = liaHandle.query(_QUERY['sensIndex'])
         index = int(text.strip())
     except:
         index = 0
@@ -214,7 +253,7 @@ def read_tc(liaHandle):
     '''
 
     try:
-        text = liaHandle.query('OFLT?')
+        text = liaHandle.query(_QUERY['tcIndex'])
         index = int(text.strip())
     except:
         index = 0
@@ -244,7 +283,7 @@ def read_couple(liaHandle):
     '''
 
     try:
-        text = liaHandle.query('ICPL?')
+        text = liaHandle.query(_QUERY['coupleIndex'])
         return int(text.strip())
     except:
         return 0
@@ -272,7 +311,7 @@ def read_reserve(liaHandle):
     '''
 
     try:
-        text = liaHandle.query('RMOD?')
+        text = liaHandle.query(_QUERY['reserveIndex'])
         return int(text.strip())
     except:
         return 1    # default is normal
@@ -309,7 +348,7 @@ def read_ref_source(liaHandle):
     '''
 
     try:
-        text = liaHandle.query('FMOD?')
+        text = liaHandle.query(_QUERY['refSrcIndex'])
         return int(text.strip())
     except:
         return 0
@@ -322,7 +361,7 @@ def read_input_config(liaHandle):
     '''
 
     try:
-        text = liaHandle.query('ISRC?')
+        text = liaHandle.query(_QUERY['configIndex'])
         return int(text.strip())
     except:
         return 0
@@ -334,7 +373,7 @@ def read_input_grounding(liaHandle):
     '''
 
     try:
-        text = liaHandle.query('IGND?')
+        text = liaHandle.query(_QUERY['groundingIndex'])
         return int(text.strip())
     except:
         return 1    # default is gound
@@ -359,7 +398,7 @@ def read_input_filter(liaHandle):
     '''
 
     try:
-        text = liaHandle.query('ILIN?')
+        text = liaHandle.query(_QUERY['inputFilterIndex'])
         return int(text.strip())
     except:
         return 0
@@ -384,40 +423,53 @@ def read_lp_slope(liaHandle):
     '''
 
     try:
-        text = liaHandle.query('OFSL?')
+        text = liaHandle.query(_QUERY['lpSlopeIndex'])
         return int(text.strip())
     except:
         return 0
 
 
+def _parse_disp(text, chn):
+    ''' Parse DDEF? reply of CH1 or CH2 to display text '''
+
+    a_dict = {0:'X', 1:'R', 2:'X Noise', 3:'Aux In 1', 4:'Aux In 2'}
+    b_dict = {0:'Y', 1:'θ', 2:'Y Noise', 3:'Aux In 3', 4:'Aux In 4'}
+
+    j, k = text.strip().split(',')
+    if chn == 1:
+        ch = a_dict[int(j)]
+    else:
+        ch = b_dict[int(j)]
+    if k:
+        ch += '; Ratio {:s}'.format(a_dict[int(k) + 2])
+    else:
+        pass
+
+    return ch
+
+
+def _parse_front_panel(text, chn):
+    ''' Parse FPOP? reply of CH1 or CH2 to output source text '''
+
+    a_dict = {(1, 0):'CH1 Display', (1, 1):'X',
+              (2, 0):'CH2 Display', (2, 1):'Y'}
+
+    return a_dict[(chn, int(text.strip()))]
+
+
 def read_disp(liaHandle):
     ''' Read display parameter
         Returns
             text1, text2: str, for CH1 & CH2
     '''
 
-    a_dict = {0:'X', 1:'R', 2:'X Noise', 3:'Aux In 1', 4:'Aux In 2'}
-    b_dict = {0:'Y', 1:'θ', 2:'Y Noise', 3:'Aux In 3', 4:'Aux In 4'}
-
     try:
-        text = liaHandle.query('DDEF?1')
-        j, k = text.strip().split(',')
-        ch1 = a_dict[int(j)]
-        if k:
-            ch1 += '; Ratio {:s}'.format(a_dict[int(k) + 2])
-        else:
-            pass
+        ch1 = _parse_disp(liaHandle.query(_QUERY['disp1Text']), 1)
     except:
         ch1 = 'N.A.'
 
     try:
-        text = liaHandle.query('DDEF?2')
-        j, k = text.strip().split(',')
-        ch2 = b_dict[int(j)]
-        if k:
-            ch2 += '; Ratio {:s}'.format(a_dict[int(k) + 2])
-        else:
-            pass
+        ch2 = _parse_disp(liaHandle.query(_QUERY['disp2Text']), 2)
     except:
         ch2 = 'N.A.'
 
@@ -430,19 +482,13 @@ def read_front_panel(liaHandle):
             text1, text2: str
     '''
 
-    a_dict = {(1, 0):'CH1 Display', (1, 1):'X',
-              (2, 0):'CH2 Display', (2, 1):'Y'}
     try:
-        text = liaHandle.query('FPOP?1')
-        code = (1, int(text.strip()))
-        ch1 = a_dict[code]
+        ch1 = _parse_front_panel(liaHandle.query(_QUERY['front1Text']), 1)
     except:
         ch1 = 'N.A.'
 
     try:
-        text = liaHandle.query('FPOP?2')
-        code = (2, int(text.strip()))
-        ch2 = a_dict[code]
+        ch2 = _parse_front_panel(liaHandle.query(_QUERY['front2Text']), 2)
     except:
         ch2 = 'N.A.'
 
@@ -471,7 +517,125 @@ def read_sample_rate(liaHandle):
     '''
 
     try:
-        text = liaHandle.query('SRAT?')
+        text = liaHandle.query(_QUERY['sampleRateIndex'])
+        return int(text.strip())
+    except:
+        return 0
+
+
+def set_sample_rate(liaHandle, srat_index):
+    ''' Set the data sample rate.
+        Arguments
+            liaHandle: pyvisa.resources.Resource, Lockin handle
+            srat_index: int, index of SAMPLE_RATE_LIST. 14 is Trigger
+        Returns visaCode
+    '''
+
+    try:
+        num, vcode = liaHandle.write('SRAT{:d}'.format(srat_index))
+        return vcode
+    except:
+        return 'Lockin set sample rate: IOError'
+
+
+def start_buffer(liaHandle, srat_index=14):
+    ''' Clear the data buffer and start filling it.
+        By default, one point (CH1 display, i.e. X) is stored each time
+        send_trigger is called. Buffer is in single shot mode, and the
+        trigger does not start the scan.
+        Returns visaCode
+    '''
+
+    try:
+        num, vcode = liaHandle.write('SRAT{:d};SEND0;TSTR0;REST;STRT'.format(srat_index))
+        return vcode
+    except:
+        return 'Lockin start buffer: IOError'
+
+
+def pause_buffer(liaHandle):
+    ''' Pause filling the data buffer
+        Returns visaCode
+    '''
+
+    try:
+        num, vcode = liaHandle.write('PAUS')
+        return vcode
+    except:
+        return 'Lockin pause buffer: IOError'
+
+
+def send_trigger(liaHandle):
+    ''' Software trigger. Stores one point in the data buffer if the
+        sample rate is Trigger.
+        Returns visaCode
+    '''
+
+    try:
+        num, vcode = liaHandle.write('TRIG')
+        return vcode
+    except:
+        return 'Lockin send trigger: IOError'
+
+
+def query_buffer_len(liaHandle):
+    ''' Query number of points stored in the data buffer.
+        Returns pts: int
+    '''
+
+    try:
+        text = liaHandle.query('SPTS?')
         return int(text.strip())
     except:
         return 0
+
+
+def query_buffer(liaHandle, start, pts, chn=1):
+    ''' Read points from the data buffer with a single binary transfer.
+        Arguments
+            liaHandle: pyvisa.resources.Resource, Lockin handle
+            start: int, first point (starts at 0)
+            pts: int, number of points
+            chn: int, buffer channel (1 or 2)
+        Returns
+            data: np.array, float. Empty array if failed
+    '''
+
+    try:
+        with api_gen.io_lock(liaHandle):
+            liaHandle.write('TRCB?{:d},{:d},{:d}'.format(chn, start, pts))
+            # IEEE little-endian float32, 4 bytes per point
+            raw = liaHandle.read_raw()
+        return np.frombuffer(raw[:4*pts], dtype='<f4').astype(np.float64)
+    except:
+        return np.zeros(0)
+
+
+# lockin settings in the snapshot: (key, query, parse_func, default)
+_SNAPSHOT_ITEMS = [('refSrcIndex', _QUERY['refSrcIndex'], int, 0),
+                   ('refFreq', _QUERY['refFreq'], float, 0),
+                   ('refPhase', _QUERY['refPhase'], float, 0),
+                   ('refHarm', _QUERY['refHarm'], int, 0),
+                   ('configIndex', _QUERY['configIndex'], int, 0),
+                   ('groundingIndex', _QUERY['groundingIndex'], int, 1),
+                   ('coupleIndex', _QUERY['coupleIndex'], int, 0),
+                   ('inputFilterIndex', _QUERY['inputFilterIndex'], int, 0),
+                   ('sensIndex', _QUERY['sensIndex'], int, 0),
+                   ('tcIndex', _QUERY['tcIndex'], int, 0),
+                   ('reserveIndex', _QUERY['reserveIndex'], int, 1),
+                   ('lpSlopeIndex', _QUERY['lpSlopeIndex'], int, 0),
+                   ('disp1Text', _QUERY['disp1Text'], lambda text: _parse_disp(text, 1), 'N.A.'),
+                   ('disp2Text', _QUERY['disp2Text'], lambda text: _parse_disp(text, 2), 'N.A.'),
+                   ('front1Text', _QUERY['front1Text'], lambda text: _parse_front_panel(text, 1), 'N.A.'),
+                   ('front2Text', _QUERY['front2Text'], lambda text: _parse_front_panel(text, 2), 'N.A.'),
+                   ('sampleRateIndex', _QUERY['sampleRateIndex'], int, 0)]
+
+
+def read_snapshot(liaHandle):
+    ''' Read all lockin settings shown on the status panel, with several
+        queries in one command line. Replies come one line per query.
+        Returns
+            snapshot: dict {LiaInfo attribute name: value}
+    '''
+
+    return api_gen.query_snapshot(liaHandle, _SNAPSHOT_ITEMS)
@@ -51,6 +51,46 @@ def query_p(pressureHandle, chn):
         return 0, 'System Error', 0
 
 
+def query_p_all(pressureHandle):
+    ''' Query pressure readings of both channels in one exchange.
+        Falls back to query_p channel by channel if the combined read
+        is not acknowledged.
+        Returns
+            [(msgcode, status_txt, p) of channel 1, (...) of channel 2]
+        Query Syntax:
+            sender:   PRX<CR><LF>
+            receiver: <ACK><CR><LF>  \x06: positive; \x15 negative
+            sender:   \x05
+            receiver: a,+b.bbbbE+bb,c,+d.ddddE+dd<CR><LF>
+                      a, c: status; b, d: value
+    '''
+
+    try:
+        text = pressureHandle.query('PRX')
+        if text.strip() == '\x06':     # if positive acknowledgement
+            text = pressureHandle.query('\x05') # query for values
+            fields = text.strip().split(',')
+            readings = []
+            for status, p in zip(fields[0::2], fields[1::2]):
+                if status == '0':
+                    msgcode = 2
+                elif status in ['1', '2']:
+                    msgcode = 1
+                else:
+                    msgcode = 0
+                readings.append((msgcode, _P_STATUS[status], float(p)))
+            if len(readings) == 2:
+                return readings
+            else:
+                pass
+        else:
+            pass
+    except:
+        pass
+
+    return [query_p(pressureHandle, '1'), query_p(pressureHandle, '2')]
+
+
 def set_query_p_unit(pressureHandle, unit_idx=-1):
     ''' set/query current pressure unit.
         Arguments
@@ -0,0 +1,460 @@
+#! encoding = utf-8
+
+''' Simulated instruments for running the DAQ stack without hardware.
+    A SimBench holds a synthesizer (SCPI), a SR830 lockin (GPIB) and a
+    CENTER TWO pressure gauge (serial) that share one state: the lockin
+    reads spectral lines at the frequency the synthesizer is tuned to.
+    Their handles mimic pyvisa message based resources, so the functions in
+    api.synthesizer, api.lockin and api.pressure work on them unchanged.
+    Every transaction sleeps the bench latency while holding the lock of
+    its bus, so instruments on the same bus queue up as they do on GPIB.
+
+    Simulated instruments are listed and opened by api.general when the
+    environment variable PYSPEC_SIM is set, at the addresses in ADDRESS.
+'''
+
+import os
+import re
+import threading
+import time
+import math
+import numpy as np
+import pyvisa
+from numpy.polynomial import hermite_e
+from api import validator as api_val
+
+
+ADDRESS = {'syn': 'SIM::GPIB0::19::INSTR',
+           'lia': 'SIM::GPIB0::8::INSTR',
+           'pres': 'SIM::ASRL1::INSTR'}
+
+# pressure unit conversion from mbar, keys are the CENTER TWO unit codes
+_P_UNIT_FACTOR = {0: 1, 1: 0.750062, 2: 100, 3: 750.062}
+
+
+def is_sim(inst_address):
+    ''' Check if the address belongs to a simulated instrument '''
+
+    return inst_address.startswith('SIM::')
+
+
+def enabled():
+    ''' Check if simulated instruments are enabled by PYSPEC_SIM '''
+
+    return bool(os.environ.get('PYSPEC_SIM'))
+
+
+class SimBench():
+    ''' Shared state of the simulated instruments.
+        Arguments
+            latency: time per transaction, s. float, or dict {'syn', 'lia',
+                     'pres': float} for each instrument
+            contention: bool, serialize transactions on the same bus
+            lines: list of (center freq MHz, width MHz, amplitude V) seen at
+                   the detector. Default is 3 lines around the default
+                   synthesizer frequency
+            multiplier: frequency multiplication factor from the synthesizer
+                        to the detector. Default is VDI band 5
+            noise: lockin noise, V
+            seed: random seed, int
+    '''
+
+    def __init__(self, latency=2e-3, contention=True, lines=None,
+                 multiplier=None, noise=1e-6, seed=0):
+
+        if isinstance(latency, dict):
+            self.latency = dict(latency)
+        else:
+            self.latency = {'syn': latency, 'lia': latency, 'pres': latency}
+        self.contention = contention
+        if multiplier is None:
+            self.multiplier = api_val.VDIBANDMULTI[4]
+        else:
+            self.multiplier = multiplier
+        if lines is None:
+            f0 = 30000 * self.multiplier
+            self.lines = [(f0 - 20, 0.5, 1e-4), (f0, 0.6, 3e-4),
+                          (f0 + 35, 0.4, 2e-4)]
+        else:
+            self.lines = list(lines)
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.t0 = time.monotonic()
+
+        self.lock = threading.Lock()        # protects the instrument states
+        self._bus_locks = {}
+        # number of transactions on each address
+        self.transactions = {address: 0 for address in ADDRESS.values()}
+        self.reset()
+
+    def reset(self):
+        ''' Reset the instruments to the power-on state '''
+
+        with self.lock:
+            self.syn = _syn_defaults()
+            self.lia = _lia_defaults()
+            self.lia_buffer = []
+            self.lia_buffering = False
+            self.pres_unit = 0
+
+    def list_resources(self):
+
+        return tuple(sorted(ADDRESS.values()))
+
+    def open_resource(self, inst_address, **kwargs):
+        ''' Open a simulated instrument, same signature as
+            pyvisa.highlevel.ResourceManager.open_resource
+        '''
+
+        if inst_address == ADDRESS['syn']:
+            handle = SimSynthesizer(self, inst_address, 'syn')
+        elif inst_address == ADDRESS['lia']:
+            handle = SimLockin(self, inst_address, 'lia')
+        elif inst_address == ADDRESS['pres']:
+            handle = SimGauge(self, inst_address, 'pres')
+        else:
+            raise pyvisa.errors.VisaIOError(pyvisa.constants.StatusCode.error_resource_not_found)
+        for key, value in kwargs.items():
+            if key != 'open_timeout':
+                setattr(handle, key, value)
+        return handle
+
+    def bus_lock(self, inst_address):
+        ''' Return the lock of the bus the instrument is connected to '''
+
+        bus = inst_address.split('::')[1]
+        with self.lock:
+            return self._bus_locks.setdefault(bus, threading.Lock())
+
+    def probe_freq(self):
+        ''' Frequency at the detector, MHz '''
+
+        return float(self.syn['FREQ:CW']) * 1e-6 * self.multiplier
+
+    def signal(self):
+        ''' Lockin X & Y output for the current synthesizer setting, V.
+            Lines are only detected when the modulation is on. With FM, the
+            lockin sees the n-th derivative of the Gaussian line shape,
+            n = lockin harmonic. With AM, it sees the line shape itself.
+        '''
+
+        syn = self.syn
+        if syn['OUTP:MOD'] != '1':
+            order = -1
+        elif syn['FM1:STAT'] == '1':
+            order = int(self.lia['HARM'])
+        elif syn['AM1:STAT'] == '1':
+            order = 0
+        else:
+            order = -1
+
+        x = 0
+        if order >= 0:
+            f = self.probe_freq()
+            coef = np.zeros(order + 1)
+            coef[-1] = (-1)**order / math.sqrt(math.factorial(order))
+            for f0, width, amp in self.lines:
+                u = (f - f0) / width
+                x += amp * hermite_e.hermeval(u, coef) * math.exp(-u*u/2)
+        phase = math.radians(float(self.lia['PHAS']))
+        x_out = x * math.cos(phase) + self.rng.normal(0, self.noise)
+        y_out = -x * math.sin(phase) + self.rng.normal(0, self.noise)
+        # overload at 109% of the full scale
+        sens = api_val.LIASENSLIST[int(self.lia['SENS'])]
+        return (min(max(x_out, -1.09*sens), 1.09*sens),
+                min(max(y_out, -1.09*sens), 1.09*sens))
+
+    def pressure(self, chn):
+        ''' Pressure reading of channel 1 or 2 in the current unit.
+            Slow drift with 1% noise.
+        '''
+
+        t = time.monotonic() - self.t0
+        p = (1e-3 if chn == 1 else 2e-2) * (1 + 0.1*math.sin(2*math.pi*t/600))
+        p *= 1 + 0.01 * self.rng.normal()
+        return p * _P_UNIT_FACTOR[self.pres_unit]
+
+
+def _syn_defaults():
+
+    state = {'*IDN': 'Simulated,Synthesizer,0,1.0',
+             'OUTP': '0', 'POW': '-20', 'FREQ:CW': '30000000000',
+             'OUTP:MOD': '0', 'POW:MODE': 'FIX', 'FREQ:MODE': 'CW',
+             'LFO:STAT': '0', 'LFO:AMPL': '0', 'LFO:SOUR': 'INT1',
+             'DISP:REM': '1'}
+    for mod in ('AM', 'FM', 'PM'):
+        for chn in ('1', '2'):
+            head = mod + chn
+            state.update({head + ':STAT': '0',
+                          head + ':SOUR': 'INT' + chn,
+                          head + ':INT' + chn + ':FREQ': '1000',
+                          head + ':INT' + chn + ':FUNC:SHAP': 'SINE'})
+            if mod == 'AM':
+                state.update({head + ':DEPT': '0', head + ':DEPT:EXP': '0'})
+            else:
+                state[head + ':DEV'] = '0'
+    return state
+
+
+def _lia_defaults():
+
+    return {'*IDN': 'Stanford_Research_Systems,SR830,s/n00000,ver1.07',
+            'FMOD': '1', 'FREQ': '1000', 'PHAS': '0', 'HARM': '1',
+            'ISRC': '0', 'IGND': '0', 'ICPL': '0', 'ILIN': '0',
+            'SENS': '26', 'OFLT': '8', 'RMOD': '1', 'OFSL': '1',
+            'DDEF1': '0,0', 'DDEF2': '0,0', 'FPOP1': '0', 'FPOP2': '0',
+            'SRAT': '4', 'SEND': '1', 'TSTR': '0', 'OUTX': '1'}
+
+
+class _SimHandle():
+    ''' Base class of the simulated instrument handles. Mimics the part of
+        pyvisa.resources.MessageBasedResource used by the api modules.
+        Subclasses implement _execute(message), which returns the list of
+        replies to queue for read().
+    '''
+
+    interface_type = pyvisa.constants.InterfaceType.gpib
+    interface_number = 0
+
+    def __init__(self, bench, resource_name, key):
+
+        self.bench = bench
+        self.resource_name = resource_name
+        self.key = key
+        self.timeout = 2000         # ms
+        self.read_termination = '\n'
+        self.write_termination = '\r\n'
+        self._replies = []
+        self._bus_lock = bench.bus_lock(resource_name)
+
+    def _transaction(self):
+        ''' Occupy the bus for one transaction '''
+
+        if self.bench.contention:
+            with self._bus_lock:
+                time.sleep(self.bench.latency[self.key])
+        else:
+            time.sleep(self.bench.latency[self.key])
+        with self.bench.lock:
+            self.bench.transactions[self.resource_name] += 1
+
+    def write(self, message):
+
+        self._transaction()
+        with self.bench.lock:
+            self._replies.extend(self._execute(message.strip()))
+        return len(message), pyvisa.constants.StatusCode.success
+
+    def read_raw(self):
+
+        self._transaction()
+        if self._replies:
+            reply = self._replies.pop(0)
+            if isinstance(reply, str):
+                reply = (reply + self.read_termination).encode('utf-8')
+            return reply
+        else:
+            # nothing to read, the instrument does not answer
+            time.sleep(self.timeout * 1e-3)
+            raise pyvisa.errors.VisaIOError(pyvisa.constants.StatusCode.error_timeout)
+
+    def read(self):
+
+        text = self.read_raw().decode('utf-8')
+        if self.read_termination and text.endswith(self.read_termination):
+            text = text[:-len(self.read_termination)]
+        return text
+
+    def query(self, message):
+
+        self.write(message)
+        return self.read()
+
+    def clear(self):
+        ''' Device clear, discards the pending replies '''
+
+        self._transaction()
+        with self.bench.lock:
+            self._replies = []
+
+    def close(self):
+
+        self._replies = []
+
+
+class SimSynthesizer(_SimHandle):
+    ''' Simulated synthesizer, SCPI commands. Headers are case insensitive,
+        the leading colon is optional and units of numbers are ignored.
+        Replies of a compound query are joined by ';' in one line.
+    '''
+
+    # short form aliases: ':AM1 x' sets :AM1:DEPT etc.
+    _ALIAS = {'AM1': 'AM1:DEPT', 'AM2': 'AM2:DEPT', 'FM1': 'FM1:DEV',
+              'FM2': 'FM2:DEV', 'PM1': 'PM1:DEV', 'PM2': 'PM2:DEV',
+              'FREQ': 'FREQ:CW', 'OUTP:STAT': 'OUTP'}
+    _UNIT = re.compile(r'(HZ|DBM|VP)$')
+
+    def __init__(self, bench, resource_name, key):
+
+        super().__init__(bench, resource_name, key)
+        self._errors = []
+
+    def _execute(self, message):
+
+        state = self.bench.syn
+        replies = []
+        for cmd in message.split(';'):
+            cmd = cmd.strip()
+            if not cmd:
+                continue
+            header, _, arg = cmd.partition(' ')
+            header = header.lstrip(':').upper()
+            is_query = header.endswith('?')
+            header = header.rstrip('?')
+            header = self._ALIAS.get(header, header)
+            if header == 'SYST:ERR' and is_query:
+                if self._errors:
+                    replies.append(self._errors.pop(0))
+                else:
+                    replies.append('+0,"No error"')
+            elif header not in state:
+                self._errors.append('-113,"Undefined header"')
+            elif is_query:
+                replies.append(state[header])
+            elif header == '*IDN':
+                self._errors.append('-113,"Undefined header"')
+            else:
+                arg = self._UNIT.sub('', arg.strip().upper())
+                try:
+                    if header == 'FREQ:CW':
+                        arg = '{:.3f}'.format(float(arg))
+                    elif re.fullmatch(r'-?[0-9.]+(E[-+]?[0-9]+)?', arg):
+                        arg = '{:g}'.format(float(arg))
+                    state[header] = arg
+                except ValueError:
+                    self._errors.append('-224,"Illegal parameter value"')
+        if replies:
+            return [';'.join(replies)]
+        else:
+            return []
+
+
+class SimLockin(_SimHandle):
+    ''' Simulated SR830 lockin. Commands have no space before the arguments,
+        each query of a compound message is answered in its own line.
+        Supports the internal data buffer with triggered sampling
+        (SRAT14) and the binary TRCB? transfer.
+    '''
+
+    _CMD = re.compile(r'(\*?[A-Z]+)(\?)?(.*)')
+
+    def __init__(self, bench, resource_name, key):
+
+        super().__init__(bench, resource_name, key)
+        self._errs = 0
+
+    def _execute(self, message):
+
+        bench = self.bench
+        state = bench.lia
+        replies = []
+        for cmd in message.split(';'):
+            match = self._CMD.fullmatch(cmd.strip().upper())
+            if not match:
+                self._errs |= 2         # command error
+                continue
+            header, is_query, arg = match.groups()
+            if header in ('DDEF', 'FPOP'):
+                # keyed by the channel
+                chn, _, arg = arg.partition(',')
+                header += chn
+            if is_query:
+                if header == 'OUTP':
+                    x, y = bench.signal()
+                    out = {'1': x, '2': y, '3': math.hypot(x, y),
+                           '4': math.degrees(math.atan2(y, x))}
+                    replies.append('{:.6e}'.format(out.get(arg, x)))
+                elif header == 'FREQ' and state['FMOD'] == '0':
+                    # external reference, the synthesizer modulation
+                    if bench.syn['FM1:STAT'] == '1':
+                        replies.append(bench.syn['FM1:INT1:FREQ'])
+                    else:
+                        replies.append(bench.syn['AM1:INT1:FREQ'])
+                elif header == 'ERRS':
+                    replies.append(str(self._errs))
+                    self._errs = 0
+                elif header == 'SPTS':
+                    replies.append(str(len(bench.lia_buffer)))
+                elif header == 'TRCB':
+                    chn, start, pts = (int(s) for s in arg.split(','))
+                    data = bench.lia_buffer[start:start+pts]
+                    replies.append(np.array(data, dtype='<f4').tobytes())
+                elif header in state:
+                    replies.append(state[header])
+                else:
+                    self._errs |= 2
+            elif header == '*RST':
+                state.clear()
+                state.update(_lia_defaults())
+                bench.lia_buffer = []
+                bench.lia_buffering = False
+            elif header == 'REST':
+                bench.lia_buffer = []
+                bench.lia_buffering = False
+            elif header == 'STRT':
+                bench.lia_buffering = True
+            elif header == 'PAUS':
+                bench.lia_buffering = False
+            elif header == 'TRIG':
+                if bench.lia_buffering and state['SRAT'] == '14':
+                    bench.lia_buffer.append(bench.signal()[0])
+            elif header in ('APHS', 'AGAN'):
+                pass
+            elif header in state and arg and header != '*IDN':
+                state[header] = arg
+            else:
+                self._errs |= 2
+        return replies
+
+
+class SimGauge(_SimHandle):
+    ''' Simulated CENTER TWO pressure gauge. A mnemonic is acknowledged by
+        <ACK>, then <ENQ> reads the values.
+    '''
+
+    interface_type = pyvisa.constants.InterfaceType.asrl
+    interface_number = 1
+
+    def __init__(self, bench, resource_name, key):
+
+        super().__init__(bench, resource_name, key)
+        self._mnemonic = ''
+
+    def _execute(self, message):
+
+        bench = self.bench
+        if message == '\x05':
+            if self._mnemonic in ('PR1', 'PR2'):
+                p = bench.pressure(int(self._mnemonic[-1]))
+                return ['0,{:+.4E}'.format(p)]
+            elif self._mnemonic == 'PRX':
+                return ['0,{:+.4E},0,{:+.4E}'.format(bench.pressure(1),
+                                                     bench.pressure(2))]
+            elif self._mnemonic == 'UNI':
+                return [str(bench.pres_unit)]
+            else:
+                return ['\x15']
+        elif message in ('PR1', 'PR2', 'PRX', 'UNI'):
+            self._mnemonic = message
+            return ['\x06']
+        elif re.fullmatch(r'UNI,[0-3]', message):
+            bench.pres_unit = int(message[-1])
+            self._mnemonic = 'UNI'
+            return ['\x06']
+        else:
+            self._mnemonic = ''
+            return ['\x15']
+
+
+# default bench used by api.general
+BENCH = SimBench()
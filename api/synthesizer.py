@@ -1,8 +1,29 @@
 #! encoding = utf-8
 import pyvisa
+from api import general as api_gen
 
 MOD_MODE_LIST = ['NONE', 'AM', 'FM']
 
+# setting queries, shared by the read_* functions and read_snapshot.
+# keys are the attribute names of gui.SharedWidgets.SynInfo; modulation
+# keys are suffixes of '<mod><chn>', e.g. 'AM1Freq', and are formatted
+# with mod ('AM', 'FM', 'PM') & chn (1, 2)
+_QUERY = {'instRemoteDisp': ':DISP:REM?',
+          'rfToggle': ':OUTP?',
+          'synPower': ':POW?',
+          'synFreq': ':FREQ:CW?',
+          'modToggle': ':OUTP:MOD?',
+          'Toggle': ':{mod:s}{chn:d}:STAT?',
+          'Freq': ':{mod:s}{chn:d}:INT{chn:d}:FREQ?',
+          'DepthPercent': ':{mod:s}{chn:d}:DEPT?',
+          'DepthDbm': ':{mod:s}{chn:d}:DEPT:EXP?',
+          'Dev': ':{mod:s}{chn:d}:DEV?',
+          'Src': ':{mod:s}{chn:d}:SOUR?',
+          'Wave': ':{mod:s}{chn:d}:INT{chn:d}:FUNC:SHAP?',
+          'LFToggle': ':LFO:STAT?',
+          'LFVoltage': ':LFO:AMPL?',
+          'LFSrc': ':LFO:SOUR?'}
+
 
 def ramp_up(start, stop):
     ''' A integer list generator. start < stop '''
@@ -52,7 +73,7 @@ def read_power_toggle(synHandle):
     '''
 
     try:
-        text = synHandle.query(':OUTP?')
+        text = synHandle.query(_QUERY['rfToggle'])
         status = bool(int(text.strip()))
         return status
     except:
@@ -80,7 +101,7 @@ def read_syn_power(synHandle):
     '''
 
     try:
-        text = synHandle.query(':POW?')
+        text = synHandle.query(_QUERY['synPower'])
         return float(text.strip())
     except:
         return -20
@@ -112,7 +133,7 @@ def read_syn_freq(synHandle):
     '''
 
     try:
-        text = synHandle.query(':FREQ:CW?')
+        text = synHandle.query(_QUERY['synFreq'])
         current_freq = float(text.strip())
         return current_freq
     except:
@@ -160,7 +181,7 @@ def read_mod_toggle(synHandle):
     '''
 
     try:
-        text = synHandle.query(':OUTP:MOD?')
+        text = synHandle.query(_QUERY['modToggle'])
         return bool(int(text.strip()))
     except:
         return False
@@ -189,11 +210,11 @@ def read_am_par(synHandle):
     '''
 
     try:
-        text = synHandle.query(':AM1:INT1:FREQ?')
+        text = synHandle.query(_QUERY['Freq'].format(mod='AM', chn=1))
         freq = float(text.strip())
-        text = synHandle.query(':AM1:DEPT?')
+        text = synHandle.query(_QUERY['DepthPercent'].format(mod='AM', chn=1))
         depth = float(text.strip()) * 1e2
-        text = synHandle.query(':AM1:STAT?')
+        text = synHandle.query(_QUERY['Toggle'].format(mod='AM', chn=1))
         status = bool(int(text.strip()))
         return freq, depth, status
     except:
@@ -209,7 +230,7 @@ def read_am_source(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':AM{:d}:SOUR?'.format(channel))
+        text = synHandle.query(_QUERY['Src'].format(mod='AM', chn=channel))
         return text.strip()
     except:
         return 'N.A.'
@@ -224,7 +245,7 @@ def read_am_state(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':AM{:d}:STAT?'.format(channel))
+        text = synHandle.query(_QUERY['Toggle'].format(mod='AM', chn=channel))
         return bool(int(text.strip()))
     except:
         return False
@@ -241,9 +262,9 @@ def read_am_depth(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':AM{:d}:DEPT?'.format(channel))
+        text = synHandle.query(_QUERY['DepthPercent'].format(mod='AM', chn=channel))
         depth_linear = float(text.strip())
-        text = synHandle.query(':AM{:d}:DEPT:EXP?'.format(channel))
+        text = synHandle.query(_QUERY['DepthDbm'].format(mod='AM', chn=channel))
         depth_exp = float(text.strip())
         return depth_linear, depth_exp
     except:
@@ -259,7 +280,7 @@ def read_am_freq(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':AM{:d}:INT{:d}:FREQ?'.format(channel, channel))
+        text = synHandle.query(_QUERY['Freq'].format(mod='AM', chn=channel))
         return float(text.strip())
     except:
         return 0
@@ -274,7 +295,7 @@ def read_am_waveform(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':AM{:d}:INT{:d}:FUNC:SHAP?'.format(channel, channel))
+        text = synHandle.query(_QUERY['Wave'].format(mod='AM', chn=channel))
         return text.strip()
     except:
         return 'N.A.'
@@ -308,11 +329,11 @@ def read_fm_par(synHandle):
     '''
 
     try:
-        text = synHandle.query(':FM1:INT1:FREQ?')
+        text = synHandle.query(_QUERY['Freq'].format(mod='FM', chn=1))
         freq = float(text.strip())
-        text = synHandle.query(':FM1:DEV?')
+        text = synHandle.query(_QUERY['Dev'].format(mod='FM', chn=1))
         depth = float(text.strip())
-        text = synHandle.query(':FM1:STAT?')
+        text = synHandle.query(_QUERY['Toggle'].format(mod='FM', chn=1))
         status = bool(int(text.strip()))
         return freq, depth, status
     except:
@@ -328,7 +349,7 @@ def read_fm_source(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':FM{:d}:SOUR?'.format(channel))
+        text = synHandle.query(_QUERY['Src'].format(mod='FM', chn=channel))
         return text.strip()
     except:
         return 'N.A.'
@@ -343,7 +364,7 @@ def read_fm_state(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':FM{:d}:STAT?'.format(channel))
+        text = synHandle.query(_QUERY['Toggle'].format(mod='FM', chn=channel))
         return bool(int(text.strip()))
     except:
         return False
@@ -358,7 +379,7 @@ def read_fm_dev(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':FM{:d}:DEV?'.format(channel))
+        text = synHandle.query(_QUERY['Dev'].format(mod='FM', chn=channel))
         return float(text.strip())
     except:
         return 0
@@ -373,7 +394,7 @@ def read_fm_freq(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':FM{:d}:INT{:d}:FREQ?'.format(channel, channel))
+        text = synHandle.query(_QUERY['Freq'].format(mod='FM', chn=channel))
         return float(text.strip())
     except:
         return 0
@@ -388,7 +409,7 @@ def read_fm_waveform(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':FM{:d}:INT{:d}:FUNC:SHAP?'.format(channel, channel))
+        text = synHandle.query(_QUERY['Wave'].format(mod='FM', chn=channel))
         return text.strip()
     except:
         return 'N.A.'
@@ -422,7 +443,7 @@ def read_pm_source(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':PM{:d}:SOUR?'.format(channel))
+        text = synHandle.query(_QUERY['Src'].format(mod='PM', chn=channel))
         return text.strip()
     except:
         return 'N.A.'
@@ -437,7 +458,7 @@ def read_pm_state(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':PM{:d}:STAT?'.format(channel))
+        text = synHandle.query(_QUERY['Toggle'].format(mod='PM', chn=channel))
         return bool(int(text.strip()))
     except:
         return False
@@ -452,7 +473,7 @@ def read_pm_dev(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':PM{:d}:DEV?'.format(channel))
+        text = synHandle.query(_QUERY['Dev'].format(mod='PM', chn=channel))
         return float(text.strip())
     except:
         return 0
@@ -468,7 +489,7 @@ def read_pm_freq(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':PM{:d}:INT{:d}:FREQ?'.format(channel, channel))
+        text = synHandle.query(_QUERY['Freq'].format(mod='PM', chn=channel))
         return float(text)
     except:
         return 0
@@ -484,7 +505,7 @@ def read_pm_waveform(synHandle, channel):
     '''
 
     try:
-        text = synHandle.query(':PM{:d}:INT{:d}:FUNC:SHAP?'.format(channel, channel))
+        text = synHandle.query(_QUERY['Wave'].format(mod='PM', chn=channel))
         return text.strip()
     except:
         return 'N.A.'
@@ -497,7 +518,7 @@ def read_lf_toggle(synHandle):
     '''
 
     try:
-        text = synHandle.query(':LFO:STAT?')
+        text = synHandle.query(_QUERY['LFToggle'])
         status = bool(int(text.strip()))
         return status
     except:
@@ -511,7 +532,7 @@ def read_lf_voltage(synHandle):
     '''
 
     try:
-        text = synHandle.query(':LFO:AMPL?')
+        text = synHandle.query(_QUERY['LFVoltage'])
         vol = float(text.strip())
         return vol
     except:
@@ -524,7 +545,7 @@ def read_lf_source(synHandle):
     '''
 
     try:
-        text = synHandle.query(':LFO:SOUR?')
+        text = synHandle.query(_QUERY['LFSrc'])
         return text.strip()
     except:
         return 'N.A.'
@@ -571,14 +592,69 @@ def query_err_msg(synHandle):
         return 'N.A.'
 
 
+def has_error(synHandle):
+    ''' Check if the synthesizer error queue has any error. Reading it
+        removes the most recent error from the queue.
+        Returns status (bool)
+    '''
+
+    msg = query_err_msg(synHandle)
+    try:
+        return bool(int(msg.split(',')[0]))
+    except ValueError:
+        return True
+
+
 def read_remote_disp(synHandle):
     ''' Read remote display setting.
         Returns status (bool)
     '''
 
     try:
-        text = synHandle.query(':DISP:REM?')
+        text = synHandle.query(_QUERY['instRemoteDisp'])
         status = bool(int(text.strip()))
         return status
     except:
         return False
+
+
+def _int_bool(text):
+    return bool(int(text))
+
+
+def _str(text):
+    return text
+
+
+# synthesizer settings in the snapshot: (key, query, parse_func, default)
+_SNAPSHOT_ITEMS = [('instRemoteDisp', _QUERY['instRemoteDisp'], _int_bool, False),
+                   ('rfToggle', _QUERY['rfToggle'], _int_bool, False),
+                   ('synPower', _QUERY['synPower'], float, -20),
+                   ('synFreq', _QUERY['synFreq'], float, 0),
+                   ('modToggle', _QUERY['modToggle'], _int_bool, False)]
+for _mod, _items in (('AM', [('Toggle', _int_bool, False), ('Freq', float, 0),
+                             ('DepthPercent', float, 0), ('DepthDbm', float, 0),
+                             ('Src', _str, 'N.A.'), ('Wave', _str, 'N.A.')]),
+                     ('FM', [('Toggle', _int_bool, False), ('Freq', float, 0),
+                             ('Dev', float, 0), ('Src', _str, 'N.A.'),
+                             ('Wave', _str, 'N.A.')]),
+                     ('PM', [('Toggle', _int_bool, False), ('Freq', float, 0),
+                             ('Dev', float, 0), ('Src', _str, 'N.A.'),
+                             ('Wave', _str, 'N.A.')])):
+    for _chn in (1, 2):
+        _SNAPSHOT_ITEMS += [('{:s}{:d}{:s}'.format(_mod, _chn, _key),
+                             _QUERY[_key].format(mod=_mod, chn=_chn), _parse, _default)
+                            for _key, _parse, _default in _items]
+_SNAPSHOT_ITEMS += [('LFToggle', _QUERY['LFToggle'], _int_bool, False),
+                    ('LFVoltage', _QUERY['LFVoltage'], float, 0),
+                    ('LFSrc', _QUERY['LFSrc'], _str, 'N.A.')]
+
+
+def read_snapshot(synHandle):
+    ''' Read all synthesizer settings shown on the status panel, using
+        compound SCPI queries (10 queries per message).
+        Returns
+            snapshot: dict {SynInfo attribute name: value}
+    '''
+
+    return api_gen.query_snapshot(synHandle, _SNAPSHOT_ITEMS)
@@ -0,0 +1,196 @@
+#! encoding = utf-8
+
+''' Instrument I/O tracing.
+    Handles returned by api.general.open_inst are wrapped by TracedHandle.
+    When TRACER is enabled, every write/read/query is timed and recorded,
+    with the exception it raised if any, so that the failures swallowed by
+    the api functions and the slow transactions can be found.
+    Recording is off by default.
+    TracedHandle also serializes the I/O of its resource, so that the scan
+    thread and the GUI thread can share the same handle.
+'''
+
+import re
+import time
+import threading
+import collections
+import numpy as np
+
+
+# latency histogram bins (s), log spaced from 10 us to 100 s, 20 bins per decade
+_BIN_EDGES = np.logspace(-5, 2, 141)
+
+
+def _mnemonic(command):
+    ''' Strip the arguments from a command, so that all settings of the
+        same command share the same key. ':FREQ:CW 1.000HZ' -> ':FREQ:CW',
+        'SENS17' -> 'SENS', 'OUTP?1' -> 'OUTP?'. Compound commands are
+        stripped part by part.
+    '''
+
+    heads = []
+    for part in command.strip().split(';'):
+        head = part.strip().split(' ')[0]
+        if ':' not in head:
+            match = re.match(r'\*?[A-Za-z]+\??', head)
+            if match:
+                head = match.group()
+        heads.append(head)
+    return ';'.join(heads)
+
+
+class Tracer():
+    ''' Records instrument transactions.
+        The last capacity transactions are kept in a ring buffer; the
+        latency histogram of each (instrument, operation, command) is kept
+        for the whole session until clear().
+    '''
+
+    def __init__(self, capacity=10000):
+
+        self.enabled = False
+        self.lock = threading.Lock()
+        # (time stamp, instrument, operation, command, duration (s), error)
+        self.records = collections.deque(maxlen=capacity)
+        # (instrument, operation, command): [histogram counts, number of
+        # errors, total time, max time]
+        self.stats = {}
+
+    def record(self, inst, op, command, t_start, duration, error):
+
+        key = (inst, op, _mnemonic(command))
+        idx = min(max(np.searchsorted(_BIN_EDGES, duration) - 1, 0),
+                  len(_BIN_EDGES) - 2)
+        with self.lock:
+            self.records.append((t_start, inst, op, command, duration, error))
+            if key not in self.stats:
+                self.stats[key] = [np.zeros(len(_BIN_EDGES) - 1, dtype=int), 0, 0, 0]
+            stat = self.stats[key]
+            stat[0][idx] += 1
+            stat[1] += bool(error)
+            stat[2] += duration
+            stat[3] = max(stat[3], duration)
+
+    def clear(self):
+
+        with self.lock:
+            self.records.clear()
+            self.stats = {}
+
+    def summary(self):
+        ''' Latency summary of each command, slowest total time first.
+            Returns
+                list of (instrument, operation, command, count, errors,
+                         total (s), p50, p95, p99, max (s))
+            Percentiles are the upper edges of the histogram bins, about
+            12% resolution.
+        '''
+
+        with self.lock:
+            items = [(key, stat[0].copy(), stat[1], stat[2], stat[3])
+                     for key, stat in self.stats.items()]
+        rows = []
+        for key, counts, errors, total, t_max in items:
+            cum = np.cumsum(counts)
+            p = [min(_BIN_EDGES[np.searchsorted(cum, q * cum[-1]) + 1], t_max)
+                 for q in (0.5, 0.95, 0.99)]
+            rows.append(key + (int(cum[-1]), errors, total) + tuple(p) + (t_max,))
+        rows.sort(key=lambda row: row[5], reverse=True)
+        return rows
+
+    def dump(self, filename):
+        ''' Write the latency summary and the recorded transactions to a
+            text file. Times are in ms.
+        '''
+
+        rows = self.summary()
+        with self.lock:
+            records = list(self.records)
+
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write('# Latency summary, slowest total time first\n')
+            f.write('# instrument\toperation\tcommand\tcount\terrors\ttotal\tp50\tp95\tp99\tmax\n')
+            for row in rows:
+                f.write('{:s}\t{:s}\t{!r}\t{:d}\t{:d}\t{:.3f}\t{:.3f}\t{:.3f}\t{:.3f}\t{:.3f}\n'.format(
+                        *row[:5], *(t * 1e3 for t in row[5:])))
+            f.write('\n# Transactions, oldest first\n')
+            f.write('# time\tinstrument\toperation\tcommand\tduration\terror\n')
+            for t_start, inst, op, command, duration, error in records:
+                f.write('{:s}.{:03d}\t{:s}\t{:s}\t{!r}\t{:.3f}\t{:s}\n'.format(
+                        time.strftime('%H:%M:%S', time.localtime(t_start)),
+                        int(t_start % 1 * 1000), inst, op, command,
+                        duration * 1e3, error))
+
+
+# session tracer used by all traced handles
+TRACER = Tracer()
+
+
+class TracedHandle():
+    ''' Proxy of a pyvisa resource that records its transactions in tracer.
+        Attributes other than the I/O methods are passed to the resource.
+        Each I/O method holds io_lock; hold it as well over a write & read
+        sequence that must not be interleaved with another thread.
+    '''
+
+    def __init__(self, handle, tracer=TRACER):
+
+        # bypass __setattr__, which passes attributes to the resource
+        object.__setattr__(self, '_handle', handle)
+        object.__setattr__(self, '_tracer', tracer)
+        # reads are recorded under the last written command
+        object.__setattr__(self, '_last', '')
+        # reentrant, so that a locked sequence can call the I/O methods
+        object.__setattr__(self, 'io_lock', threading.RLock())
+
+    def __getattr__(self, name):
+
+        return getattr(self._handle, name)
+
+    def __setattr__(self, name, value):
+
+        setattr(self._handle, name, value)
+
+    def _call(self, op, func, command, *args):
+
+        if not self._tracer.enabled:
+            return func(*args)
+        t_start = time.time()
+        t = time.perf_counter()
+        try:
+            result = func(*args)
+        except Exception as err:
+            self._tracer.record(self._handle.resource_name, op, command, t_start,
+                                time.perf_counter() - t,
+                                '{:s}: {:s}'.format(type(err).__name__, str(err)))
+            raise
+        self._tracer.record(self._handle.resource_name, op, command, t_start,
+                            time.perf_counter() - t, '')
+        return result
+
+    def write(self, message):
+
+        with self.io_lock:
+            object.__setattr__(self, '_last', message)
+            return self._call('write', self._handle.write, message, message)
+
+    def query(self, message):
+
+        with self.io_lock:
+            object.__setattr__(self, '_last', message)
+            return self._call('query', self._handle.query, message, message)
+
+    def read(self):
+
+        with self.io_lock:
+            return self._call('read', self._handle.read, self._last)
+
+    def read_raw(self):
+
+        with self.io_lock:
+            return self._call('read_raw', self._handle.read_raw, self._last)
+
+    def clear(self):
+
+        with self.io_lock:
+            return self._handle.clear()
@@ -311,13 +311,13 @@ def val_monitor_sample_len(len_text):
     ''' Validate sample length for real-time monitor.
         Arguments
             len_text: str, samplen length user input
-        Safe range: [20, 200]
-        Warning range: > (0, 500]
+        Safe range: [20, 100000]
+        Warning range: > (0, 1000000]
     '''
 
-    code, slen = val_int(len_text, safe=[('>=', 20), ('<=', 200)],
-                         warning=[('>', 0), ('<=', 500)])
-    if slen > 500:
+    code, slen = val_int(len_text, safe=[('>=', 20), ('<=', 100000)],
+                         warning=[('>', 0), ('<=', 1000000)])
+    if slen > 1000000:
         slen = 0
     else:
         pass
@@ -4,13 +4,23 @@
 
 
 from PyQt5 import QtGui, QtCore
+import os
+import threading
+import time
 import numpy as np
 from math import ceil
 import pyqtgraph as pg
 import datetime
 from gui import SharedWidgets as Shared
+from api import general as api_gen
 from api import validator as api_val
 from api import pressure as api_pres
+from data import buffer
+
+
+# default directory of the pressure logs
+LOG_DIR = os.path.join(os.path.expanduser('~'), 'PySpec', 'PressureLog')
+
 
 class PresReaderWindow(QtGui.QDialog):
     '''
@@ -27,7 +37,10 @@ class PresReaderWindow(QtGui.QDialog):
         self.setWindowTitle('CENTER TWO pressure reader')
         self.setMinimumSize(900, 600)
         self.setModal(False)
-        self.data = np.array([0, 0])    # initiate the data array
+        self.log = None     # pressure log, streamed to a binary file
+        self.log_dir = LOG_DIR
+        self.pyramids = []  # decimated log of each channel for plotting
+        self.current_p = []     # latest readings of the polled channel(s)
         self.data_collecting = False    # store data collection status
         self.msgcode = 2
 
@@ -54,7 +67,7 @@ class PresReaderWindow(QtGui.QDialog):
         rdCtrl = QtGui.QGroupBox(self)
         rdCtrl.setTitle('Readout Control')
         self.channelSel = QtGui.QComboBox()
-        self.channelSel.addItems(['1', '2'])
+        self.channelSel.addItems(['1', '2', 'Both'])
         self.current_chn_index = 0
         self.pUnitSel = QtGui.QComboBox()
         self.pUnitSel.addItems(['mBar', 'Torr', 'Pascal', 'μmHg'])
@@ -64,6 +77,11 @@ class PresReaderWindow(QtGui.QDialog):
         rdCtrlLayout = QtGui.QFormLayout()
         rdCtrlLayout.addRow(QtGui.QLabel('Select Channel'), self.channelSel)
         rdCtrlLayout.addRow(QtGui.QLabel('Select Pressure Unit'), self.pUnitSel)
+        self.logDirButton = QtGui.QPushButton('Log Directory')
+        self.logDirButton.setToolTip('Directory of the binary pressure logs, written as data come in')
+        self.logLabel = QtGui.QLabel(self.log_dir)
+        self.logLabel.setWordWrap(True)
+        rdCtrlLayout.addRow(self.logDirButton, self.logLabel)
         rdCtrl.setLayout(rdCtrlLayout)
 
         # this is to select the data update rate, cannot be quicker than /0.1 s
@@ -112,6 +130,11 @@ class PresReaderWindow(QtGui.QDialog):
         self.pgPlot.setLogMode(x=None, y=True)
         self.pgPlot.showGrid(x=True, y=True, alpha=0.5)
         self.curve = self.pgPlot.plot()
+        self.curve2 = self.pgPlot.plot(pen=pg.mkPen(219, 112, 147))
+        for curve in (self.curve, self.curve2):
+            curve.setClipToView(True)
+            curve.setDownsampling(auto=True, method='peak')
+        self.refresher = Shared.PlotRefresher(self)
         rightColumnLayout = QtGui.QVBoxLayout()
         rightColumnLayout.setAlignment(QtCore.Qt.AlignTop)
         rightColumnLayout.addWidget(self.pgPlot)
@@ -125,11 +148,9 @@ class PresReaderWindow(QtGui.QDialog):
         mainLayout.addWidget(rightColumn)
         self.setLayout(mainLayout)
 
-        # set up timer & default value
+        # set up polling thread & default value
         self.waittime = 1
-        self.timer = QtCore.QTimer()
-        self.timer.setInterval(1000)
-        self.timer.start()
+        self.worker = PresWorker(self)
 
         # trigger settings
         self.channelSel.activated.connect(self.set_channel)
@@ -139,15 +160,33 @@ class PresReaderWindow(QtGui.QDialog):
         self.startButton.clicked.connect(self.start)
         self.stopButton.clicked.connect(self.stop)
         self.saveButton.clicked.connect(self.save)
+        self.logDirButton.clicked.connect(self.set_log_dir)
         self.savepButton.clicked.connect(self.save_and_continue)
-        self.timer.timeout.connect(self.daq)
+        self.pgPlot.sigXRangeChanged.connect(self.redraw)
+        self.worker.reading.connect(self.daq)
 
         # set default unit to Torr on the read out
         self.set_p_unit()
+        self.start_polling()
+
+    def start_polling(self):
+        ''' (Re)start the polling thread with the gauge & test mode currently
+            selected in the main window, which may have changed since the
+            window was opened. Polling does not start without a gauge.
+        '''
+
+        test_mode = self.main.testModeAction.isChecked()
+        if self.main.pressureHandle is None and not test_mode:
+            self.worker.stop()
+            self.currentStatus.setText('No gauge connected')
+            self.currentStatus.setStyleSheet('color: {:s}'.format(Shared.msgcolor(0)))
+            return None
+        self.worker.setup(self.main.pressureHandle, test_mode,
+                          self.channelSel.currentText(), self.worker.interval)
+        self.worker.start()
 
     def start(self):
 
-        # avoid connecting to the timer multiple times
         self.stop()
         # check if update period is legal. Won't start if illegal
         if self.msgcode == 2:
@@ -158,24 +197,37 @@ class PresReaderWindow(QtGui.QDialog):
             self.updateRate.setStyleSheet('color: grey')
             # store start time (for file saving)
             self.data_start_time = datetime.datetime.today()
-            # restart QtTimer
-            self.timer.start()
-            # initiate data array
-            self.data = np.array([0, self.current_p])
+            # initiate a new log file, data are written as they come.
+            # columns: time, pressure of each polled channel
+            if self.channelSel.currentText() == 'Both':
+                chn_num = 2
+            else:
+                chn_num = 1
+            if self.log is not None:
+                self.log.close()
+                self.log = None
+            try:
+                os.makedirs(self.log_dir, exist_ok=True)
+                self.log = buffer.TimeSeriesLog(os.path.join(self.log_dir,
+                                'pressure_{:s}.bin'.format(
+                                self.data_start_time.strftime('%Y%m%d_%H%M%S'))),
+                                ncol=chn_num+1)
+            except OSError as err:
+                self.stop()
+                msg = Shared.MsgError(self, 'Cannot create the log file!', str(err))
+                msg.exec_()
+                return None
+            self.logLabel.setText(self.log.filename)
+            self.pyramids = [buffer.MinMaxPyramid() for i in range(chn_num)]
+            self.refresher.set_data(self.curve2, None, np.zeros(0))
             self.counter = 0
-            # connect QtTimer to update plot
-            self.timer.timeout.connect(self.update_plot)
+            # restart polling
+            self.start_polling()
         else:
             pass
 
     def stop(self):
 
-        # can't find the correct way to check if the timer is connected,
-        # this is a cheat
-        try:
-            self.timer.timeout.disconnect(self.update_plot)
-        except TypeError:
-            pass
         self.data_collecting = False    # turn data collection status off
         # enable update rate QLineEdit
         self.updateRate.setReadOnly(False)
@@ -229,7 +281,7 @@ class PresReaderWindow(QtGui.QDialog):
         if self.msgcode == 2:
             self.pgPlot.setLabel('bottom', text='Time',
                                  units=self.updateRateUnitSel.currentText())
-            self.timer.setInterval(self.waittime*tscalar*1000)
+            self.worker.interval = self.waittime*tscalar
         else:
             pass
 
@@ -259,11 +311,13 @@ class PresReaderWindow(QtGui.QDialog):
     def set_p_unit(self):
         ''' Set pressure unit '''
 
-        if self.main.testModeAction.isChecked():
+        if self.main.testModeAction.isChecked() or self.main.pressureHandle is None:
             unit_txt = self.pUnitSel.currentText()
         else:
-            _, unit_txt = api_pres.set_query_p_unit(self.main.pressureHandle,
-                                                    self.pUnitSel.currentIndex())
+            # the polling thread uses the same gauge
+            with api_gen.io_lock(self.main.pressureHandle):
+                _, unit_txt = api_pres.set_query_p_unit(self.main.pressureHandle,
+                                                        self.pUnitSel.currentIndex())
         # update real time monitor panel
         self.currentUnit.setText(unit_txt)
         # update plot label
@@ -288,6 +342,7 @@ class PresReaderWindow(QtGui.QDialog):
                 if q == QtGui.QMessageBox.Yes:
                     self.current_chn_index = idx
                     self.currentChannel.setText(self.channelSel.currentText())
+                    self.worker.chn = self.channelSel.currentText()
                     # restart data collection
                     self.start()
                 else:
@@ -297,42 +352,67 @@ class PresReaderWindow(QtGui.QDialog):
                 self.current_chn_index = idx
                 self.currentChannel.setText(self.channelSel.currentText())
                 # restart daq
-                self.timer.start()
-
-    def daq(self):
-
-        if self.main.testModeAction.isChecked():
-            self.current_p = np.random.rand()
-            msgcode = 2
-            status_txt = 'Okay'
-        else:
-            msgcode, status_txt, self.current_p = api_pres.query_p(self.main.pressureHandle,
-                                                    self.channelSel.currentText())
-
-        self.currentP.setText('{:.3e}'.format(self.current_p))
-        self.currentStatus.setText(status_txt)
+                self.start_polling()
+
+    def daq(self, readings):
+        ''' Update the monitor with the readings from the polling thread,
+            and log them if data is under collection.
+            readings: [(msgcode, status_txt, p), ...] of the polled channel(s)
+        '''
+
+        self.current_p = [p for _, _, p in readings]
+        msgcode = min(code for code, _, _ in readings)
+        self.currentP.setText(', '.join('{:.3e}'.format(p) for p in self.current_p))
+        self.currentStatus.setText(', '.join(txt for _, txt, _ in readings))
         self.currentStatus.setStyleSheet('color: {:s}'.format(Shared.msgcolor(msgcode)))
 
-        if not msgcode: # if fatal, stop daq
-            self.timer.stop()
+        # readings polled before a channel change do not fit the log
+        if self.data_collecting and len(readings) == len(self.pyramids):
+            self.update_plot()
         else:
             pass
 
     def update_plot(self):
-        self.counter += 1
         t = self.counter * self.waittime
-        self.data = np.row_stack((self.data, np.array([t, self.current_p])))
-        self.curve.setData(self.data)
+        self.counter += 1
+        self.log.append([t] + self.current_p)
+        for pyramid, p in zip(self.pyramids, self.current_p):
+            pyramid.append(t, p)
+        self.redraw()
+
+    def redraw(self, *args):
+        ''' Draw the min/max decimated log in the current view range,
+            about one point per pixel.
+        '''
+
+        if self.log is None:
+            return
+        data = self.log.read()
+        if self.pgPlot.getViewBox().autoRangeEnabled()[0]:
+            # x range follows the data
+            x_lo = x_hi = None
+        else:
+            x_lo, x_hi = self.pgPlot.getViewBox().viewRange()[0]
+        for i, curve in enumerate((self.curve, self.curve2)[:len(self.pyramids)]):
+            x, y = self.pyramids[i].decimate(data[:, 0], data[:, i+1], x_lo, x_hi,
+                                             npts=max(self.pgPlot.width(), 100))
+            self.refresher.set_data(curve, x, y)
 
     def save_data(self):
         try:
             filename, _ = QtGui.QFileDialog.getSaveFileName(self, 'Save Data',
                                     './test_pressure.txt', 'Data File (*.txt)')
             if filename:
-                np.savetxt(filename, self.data, comments='#', fmt=['%g', '%.3e'],
-                           header='Data collection starts at {:s} \ntime({:s}) pressure({:s})'.format(
+                if self.log.ncol == 3:
+                    col_txt = 'pressure_1({0:s}) pressure_2({0:s})'
+                else:
+                    col_txt = 'pressure({0:s})'
+                np.savetxt(filename, self.log.read(), comments='#',
+                           fmt=['%g'] + ['%.3e']*(self.log.ncol-1),
+                           header='Data collection starts at {:s} \ntime({:s}) {:s}'.format(
                            self.data_start_time.strftime('%I:%M:%S %p, %m-%d-%Y (%a)'),
-                           self.updateRateUnitSel.currentText(), self.currentUnit.text()))
+                           self.updateRateUnitSel.currentText(),
+                           col_txt.format(self.currentUnit.text())))
             else:
                 pass
         except AttributeError:
@@ -340,20 +420,120 @@ class PresReaderWindow(QtGui.QDialog):
                                   'No data has been collected!')
             msg.exec_()
 
-    # stop timer before close
+    def set_log_dir(self):
+        ''' Select the directory of the pressure logs. Takes effect at the
+            next (re)start
+        '''
+
+        log_dir = QtGui.QFileDialog.getExistingDirectory(self,
+                                'Select directory of the pressure logs', self.log_dir)
+        if log_dir:
+            self.log_dir = log_dir
+            if not self.data_collecting:
+                self.logLabel.setText(self.log_dir)
+            else:
+                pass
+        else:
+            pass
+
+    def shutdown(self):
+        ''' Stop polling & data collection and close the log.
+            Polling is restarted by start_polling() when the window is
+            reopened; data collection needs a new (re)start.
+        '''
+
+        self.stop()
+        self.worker.stop()
+        self.refresher.stop()
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+        self.pyramids = []
+
+    # stop polling before close
     def closeEvent(self, event):
         q = QtGui.QMessageBox.question(self, 'Exit Pressure Reader?',
                     'Pressure query will pause. Make sure you save your pressure readings!',
                     QtGui.QMessageBox.Yes | QtGui.QMessageBox.No, QtGui.QMessageBox.Yes)
         if q == QtGui.QMessageBox.Yes:
-            self.timer.stop()
-            self.close()
+            self.shutdown()
+            event.accept()
         else:
             event.ignore()
 
     def keyPressEvent(self, event):
         if event.key() == QtCore.Qt.Key_Escape:
-            self.timer.stop()
+            # same confirmation & shutdown as closing the window
             self.close()
         else:
             event.ignore()
+
+
+class PresWorker(QtCore.QThread):
+    ''' Pressure polling thread. Polls the selected channel, or both
+        channels in one exchange, every self.interval seconds. The next poll
+        is scheduled from the start of the previous one, so the gauge
+        response time does not add to the interval.
+    '''
+
+    # [(msgcode, status_txt, p), ...] of the polled channel(s), every poll
+    reading = QtCore.pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        QtCore.QThread.__init__(self, parent)
+
+        self.pressureHandle = None
+        self.test_mode = False
+        self.chn = '1'          # '1', '2' or 'Both'
+        self.interval = 1       # s
+        self._stop_event = threading.Event()
+
+    def setup(self, pressureHandle, test_mode, chn, interval):
+
+        self.pressureHandle = pressureHandle
+        self.test_mode = test_mode
+        self.chn = chn
+        self.interval = interval
+
+    def start(self):
+        ''' Start polling. Ignored if already running '''
+
+        self._stop_event.clear()
+        QtCore.QThread.start(self)
+
+    def stop(self):
+        ''' Stop polling and wait for the thread to return '''
+
+        self._stop_event.set()
+        self.wait()
+
+    def run(self):
+
+        deadline = time.perf_counter()
+        while not self._stop_event.wait(max(deadline - time.perf_counter(), 0)):
+            deadline += self.interval
+            readings = self.poll()
+            self.reading.emit(readings)
+            if not min(code for code, _, _ in readings):
+                # if fatal, stop daq
+                break
+            # do not try to catch up if a poll took longer than the interval
+            deadline = max(deadline, time.perf_counter())
+
+    def poll(self):
+        ''' Query the pressure of the selected channel(s) '''
+
+        if self.chn == 'Both':
+            chn_list = ['1', '2']
+        else:
+            chn_list = [self.chn]
+
+        if self.test_mode:
+            return [(2, 'Okay', np.random.rand()) for chn in chn_list]
+        else:
+            # query & enquiry must not be interleaved with the GUI thread
+            with api_gen.io_lock(self.pressureHandle):
+                if self.chn == 'Both':
+                    return api_pres.query_p_all(self.pressureHandle)
+                else:
+                    return [api_pres.query_p(self.pressureHandle, self.chn)]
@@ -4,6 +4,8 @@
 
 
 from PyQt5 import QtGui, QtCore
+import threading
+import time
 import numpy as np
 from math import ceil
 import pyqtgraph as pg
@@ -310,8 +312,9 @@ class JPLScanWindow(QtGui.QDialog):
 
     def stop_timers(self):
 
-        # stop timers
-        self.singleScan.waitTimer.stop()
+        # stop acquisition thread
+        self.singleScan.worker.stop()
+        self.singleScan.refresher.stop()
 
     def finish(self):
 
@@ -387,6 +390,247 @@ class JPLBatchListWidget(QtGui.QWidget):
         self.setLayout(self.batchLayout)
 
 
+class ScanWorker(QtCore.QThread):
+    ''' Acquisition loop of a single scan window.
+        The tune -> wait -> read cycle runs in this thread, so that GUI
+        events (redraws, dialogs, window resizes) do not stretch the dwell
+        time. Data are handed to the GUI by signals. Arrays are replaced
+        rather than modified once handed over, so the GUI can plot them
+        directly. Use lock to read y_sum & acquired_avg consistently.
+        The state is only modified by the GUI while the thread is stopped.
+        The instrument handles are shared with the GUI (status panel,
+        lockin monitor); their I/O is serialized by the handle's io_lock,
+        see api.trace.TracedHandle.
+    '''
+
+    # y array of the current sweep, index of the point (-1 if the whole sweep
+    # is read at once) & number of points taken, after each read
+    point_acquired = QtCore.pyqtSignal(object, int, int)
+    # y_sum array, after each finished sweep
+    sweep_finished = QtCore.pyqtSignal(object)
+    # probe frequency (Hz), after each synthesizer tune
+    freq_tuned = QtCore.pyqtSignal(float)
+    # target averages reached
+    scan_finished = QtCore.pyqtSignal()
+    # lockin buffer transfer failed or missed a trigger, buffer is switched off
+    buffer_failed = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        QtCore.QThread.__init__(self, parent)
+
+        self.synHandle = None
+        self.liaHandle = None
+        self.multiplier = 1
+        self.test_mode = False
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.y_sum = np.zeros(0)
+        self.current_x_index = 0
+        self.acquired_avg = 0
+        self.target_avg = 0
+        self.waittime = 60
+        self.pts_taken = 0
+        # measured time per point (s)
+        self.point_time = 0
+        self._t_prev = None
+        # use the lockin data buffer. Takes effect at the next sweep
+        self.use_buffer = False
+        self._buffered = False      # current sweep uses the buffer
+        self._buffer_pts = 0        # points triggered in the current sweep
+        self.lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def setup(self, x, target_avg, waittime, synHandle, liaHandle, multiplier, test_mode):
+        ''' Set up a new scan window. Call only when the thread is stopped '''
+
+        self.synHandle = synHandle
+        self.liaHandle = liaHandle
+        self.multiplier = multiplier
+        self.test_mode = test_mode
+        self.x = x
+        self.target_avg = target_avg
+        self.waittime = waittime
+        self.reset()
+
+    def reset(self):
+        ''' Erase all averages. Call only when the thread is stopped '''
+
+        with self.lock:
+            self.current_x_index = 0
+            self.acquired_avg = 0
+            self.pts_taken = 0
+            self.y = np.zeros_like(self.x)
+            self.y_sum = np.zeros_like(self.x)
+        self.restart_sweep()
+
+    def restart_sweep(self):
+        ''' Erase the current sweep and go back to its first point.
+            Call only when the thread is stopped
+        '''
+
+        if self.acquired_avg % 2:   # even sweep, sweep down
+            self.current_x_index = len(self.x) - 1
+        else:                       # odd sweep, sweep up
+            self.current_x_index = 0
+        self.y = np.zeros_like(self.x)
+        self._buffered = False
+        self._buffer_pts = 0
+
+    def start(self):
+        ''' Start (or resume) acquisition from the current point '''
+
+        self._stop_event.clear()
+        QtCore.QThread.start(self)
+
+    def stop(self):
+        ''' Stop acquisition and wait for the thread to return.
+            The waiting period is interrupted, an ongoing lockin read is not.
+        '''
+
+        self._stop_event.set()
+        self.wait()
+
+    def run(self):
+        ''' Acquisition loop. The synthesizer is tuned to the next point as
+            soon as the reading is latched, and the settling time is counted
+            from the tune, so that the dwell on each point equals waittime.
+            Buffer transfer, sum update and signals to the GUI all happen
+            while the synthesizer settles.
+        '''
+
+        self._t_prev = None
+        self.tune_syn_freq()
+        deadline = time.perf_counter() + self.waittime * 1e-3
+        while not self._stop_event.wait(max(deadline - time.perf_counter(), 0)):
+            self.time_point()
+            y = self.y
+            idx = self.current_x_index
+            self.query_lockin()
+            sweep_done = self.next_freq()
+            finished = sweep_done and self.acquired_avg + 1 == self.target_avg
+            if not finished:
+                # tune syn to the next freq
+                self.tune_syn_freq()
+                deadline = time.perf_counter() + self.waittime * 1e-3
+
+            # bookkeeping during the settling time
+            if sweep_done:
+                if self._buffered and not self.read_buffer():
+                    # buffer transfer failed or missed a trigger, redo this sweep point by point
+                    self.use_buffer = False
+                    self.buffer_failed.emit()
+                    self.restart_sweep()
+                    self.tune_syn_freq()
+                    deadline = time.perf_counter() + self.waittime * 1e-3
+                    continue
+                elif self._buffered:
+                    idx = -1
+                self.update_ysum()
+            self.point_acquired.emit(y, idx, self.pts_taken)
+
+            # if done
+            if finished:
+                self.scan_finished.emit()
+                break
+
+    def time_point(self):
+        ''' Measure the actual time per point (read to read), averaged
+            over about the last 10 points. Pauses are not counted.
+        '''
+
+        now = time.perf_counter()
+        if self._t_prev is not None:
+            dt = now - self._t_prev
+            if self.point_time:
+                self.point_time = 0.9 * self.point_time + 0.1 * dt
+            else:
+                self.point_time = dt
+        self._t_prev = now
+
+    def tune_syn_freq(self):
+        ''' Simply tune synthesizer frequency '''
+
+        prob_freq = self.x[self.current_x_index] * 1e6
+        if not self.test_mode:
+            api_syn.set_syn_freq(self.synHandle, prob_freq / self.multiplier)
+        self.freq_tuned.emit(prob_freq)
+
+    def query_lockin(self):
+        ''' Query lockin data at the current point.
+            In buffered mode, the lockin only stores the point on a trigger,
+            and the whole sweep is read from the buffer after its last point.
+        '''
+
+        # decide whether to use the lockin buffer at the start of a sweep
+        if not self._buffer_pts:
+            self._buffered = (self.use_buffer and not self.test_mode and
+                              len(self.x) <= api_lia.BUFFER_SIZE)
+            if self._buffered:
+                api_lia.start_buffer(self.liaHandle)
+
+        if self.test_mode:
+            self.y[self.current_x_index] = np.random.random_sample()
+        elif self._buffered:
+            api_lia.send_trigger(self.liaHandle)
+            self._buffer_pts += 1
+        else:
+            self.y[self.current_x_index] = api_lia.query_single_x(self.liaHandle)
+
+    def read_buffer(self):
+        ''' Read the whole sweep from the lockin buffer into y.
+            The buffer must hold exactly one point per trigger sent, so
+            that a missed trigger does not shift the sweep.
+            Returns True if successful
+        '''
+
+        triggered = self._buffer_pts
+        self._buffer_pts = 0
+        api_lia.pause_buffer(self.liaHandle)
+        if api_lia.query_buffer_len(self.liaHandle) != triggered:
+            return False
+        data = api_lia.query_buffer(self.liaHandle, 0, len(self.x))
+        if len(data) == len(self.x):
+            # points are stored in sweep order
+            if self.acquired_avg % 2:
+                self.y[:] = data[::-1]
+            else:
+                self.y[:] = data
+            return True
+        else:
+            return False
+
+    def next_freq(self):
+        ''' move to the next frequency point.
+            Returns True if the current sweep is finished
+        '''
+
+        # current sweep is even average, decrease index (sweep backward)
+        if self.acquired_avg % 2:
+            self.pts_taken = (self.acquired_avg+1)*len(self.x) - self.current_x_index
+            if self.current_x_index > 0:
+                self.current_x_index -= 1
+                return False
+            else:
+                return True
+        # current sweep is odd average, increase index (sweep forward)
+        else:
+            self.pts_taken = self.acquired_avg*len(self.x) + self.current_x_index
+            if self.current_x_index < len(self.x)-1:
+                self.current_x_index += 1
+                return False
+            else:
+                return True
+
+    def update_ysum(self):
+        ''' Add current sweep to y_sum and start a new sweep '''
+
+        with self.lock:
+            self.y_sum = self.y_sum + self.y
+            self.acquired_avg += 1
+        self.y = np.zeros_like(self.x)
+        self.sweep_finished.emit(self.y_sum)
+
+
 class SingleScan(QtGui.QWidget):
     ''' Take a scan in a single freq window '''
 
@@ -403,18 +647,23 @@ class SingleScan(QtGui.QWidget):
         self.multiplier = self.main.synInfo.vdiBandMultiplication
 
         # Initialize scan entry settings
-        self.start_rf_freq = 0
-        self.stop_rf_freq = 0
-        self.current_rf_freq = 0
-        self.acquired_avg = 0
+        self.x = np.zeros(0)
+        self.x_min = 0
         self.step = 0
         self.sens_index = 0
+        self.tc_index = 0
+        self.target_avg = 0
         self.waittime = 60
+        self.pts_taken = 0
+        self.sweep_y = np.zeros(0)     # y array shown on the current sweep plot
 
-        self.waitTimer = QtCore.QTimer()
-        self.waitTimer.setInterval(self.waittime)
-        self.waitTimer.setSingleShot(True)
-        self.waitTimer.timeout.connect(self.query_lockin)
+        # acquisition thread
+        self.worker = ScanWorker(self)
+        self.worker.point_acquired.connect(self.update_point)
+        self.worker.sweep_finished.connect(self.update_ysum)
+        self.worker.freq_tuned.connect(self.update_syn_freq)
+        self.worker.scan_finished.connect(self.finish_scan)
+        self.worker.buffer_failed.connect(lambda: self.bufferCheck.setChecked(False))
 
         # set up main layout
         buttons = QtGui.QWidget()
@@ -422,6 +671,8 @@ class SingleScan(QtGui.QWidget):
         abortAllButton = QtGui.QPushButton('Abort Batch Project')
         self.pauseButton = QtGui.QPushButton('Pause')
         self.pauseButton.setCheckable(True)
+        self.bufferCheck = QtGui.QCheckBox('Use Lockin Buffer')
+        self.bufferCheck.setToolTip('Store points in the lockin buffer and read the whole sweep at once. Takes effect at the next sweep.')
         redoButton = QtGui.QPushButton('Redo Current Sweep')
         restartWinButton = QtGui.QPushButton('Restart Current Batch')
         saveButton = QtGui.QPushButton('Save and Continue')
@@ -432,6 +683,9 @@ class SingleScan(QtGui.QWidget):
         buttonLayout.addWidget(saveButton, 1, 0)
         buttonLayout.addWidget(jumpButton, 1, 1)
         buttonLayout.addWidget(abortAllButton, 1, 2)
+        buttonLayout.addWidget(self.bufferCheck, 2, 0)
+        self.pointTimeLabel = QtGui.QLabel()
+        buttonLayout.addWidget(self.pointTimeLabel, 2, 1, 1, 2)
         buttons.setLayout(buttonLayout)
 
         pgWin = pg.GraphicsWindow(title='Live Monitor')
@@ -441,9 +695,11 @@ class SingleScan(QtGui.QWidget):
         self.ySumPlot = pgWin.addPlot(0, 0, title='Sum sweep')
         self.ySumPlot.setLabel('left', text='Intensity', units='V')
         self.yCurve = self.yPlot.plot()
+        self.yCurve.setClipToView(True)
         self.yCurve.setDownsampling(auto=True, method='peak')
         self.yCurve.setPen(pg.mkPen(220, 220, 220))
         self.ySumCurve = self.ySumPlot.plot()
+        self.ySumCurve.setClipToView(True)
         self.ySumCurve.setDownsampling(auto=True, method='peak')
         self.ySumCurve.setPen(pg.mkPen(219, 112, 147))
         self.ySumPlot.setXLink(self.yPlot)
@@ -452,7 +708,12 @@ class SingleScan(QtGui.QWidget):
         mainLayout.addWidget(buttons)
         self.setLayout(mainLayout)
 
+        # plots & progress bars are redrawn at a fixed frame rate
+        self.refresher = Shared.PlotRefresher(self)
+        self.refresher.refreshed.connect(self.update_progress)
+
         self.pauseButton.clicked.connect(self.pause_current)
+        self.bufferCheck.stateChanged.connect(self.toggle_buffer)
         redoButton.clicked.connect(self.redo_current)
         restartWinButton.clicked.connect(self.restart_avg)
         saveButton.clicked.connect(self.save_current)
@@ -467,24 +728,26 @@ class SingleScan(QtGui.QWidget):
              waittime <ms>, mod Mode index [int], mod freq <Hz>, mod Amp [float], harmonics [int], phase [float])
         '''
 
+        self.worker.stop()
+
         self.x = Shared.gen_x_array(*entry_setting[1:4])
         self.x_min = min(entry_setting[1], entry_setting[2])
         self.step = entry_setting[3]
-        self.current_x_index = 0
         self.target_avg = entry_setting[4]
-        self.acquired_avg = 0
         self.sens_index = entry_setting[5]
         self.tc_index = entry_setting[6]
         self.waittime = entry_setting[7]
-        self.waitTimer.setInterval(self.waittime)
         self.current_comment = entry_setting[0]
-        self.y = np.zeros_like(self.x)
-        self.y_sum = np.zeros_like(self.x)
-        self.ySumCurve.setData(self.x, self.y_sum)
-        total_pts =  len(self.x) * self.target_avg
+        self.worker.setup(self.x, self.target_avg, self.waittime,
+                          self.main.synHandle, self.main.liaHandle,
+                          self.multiplier, self.main.testModeAction.isChecked())
+        self.worker.use_buffer = self.bufferCheck.isChecked()
         self.pts_taken = 0
+        self.reset_sweep_plot()
+        self.refresher.set_data(self.ySumCurve, self.x, self.worker.y_sum)
+        total_pts =  len(self.x) * self.target_avg
         self.parent.currentProgBar.setRange(0, ceil(total_pts * self.waittime * 1e-3))
-        self.parent.currentProgBar.setValue(ceil(self.pts_taken * self.waittime * 1e-3))
+        self.parent.currentProgBar.setValue(0)
 
         # tune instrument
         self.tune_inst(entry_setting)
@@ -493,8 +756,8 @@ class SingleScan(QtGui.QWidget):
         self.main.synStatus.print_info()
         self.main.liaStatus.print_info()
 
-        # start daq timer
-        self.waitTimer.start()
+        # start daq thread
+        self.worker.start()
 
     def tune_inst(self, entry_setting):
         ''' Tune instrument '''
@@ -505,7 +768,7 @@ class SingleScan(QtGui.QWidget):
         self.main.synInfo.modAmp = entry_setting[10]
 
         if self.main.testModeAction.isChecked():
-            self.main.synInfo.probFreq = self.x[self.current_x_index] * 1e6
+            self.main.synInfo.probFreq = self.x[0] * 1e6
             self.main.synInfo.synFreq = self.main.synInfo.probFreq/self.multiplier
             if self.main.synInfo.modModeIndex == 1:
                 self.main.synInfo.modToggle = True
@@ -525,91 +788,108 @@ class SingleScan(QtGui.QWidget):
             self.main.liaInfo.refHarmText = str(entry_setting[11])
             self.main.liaInfo.refPhase = entry_setting[12]
         else:
-            api_syn.set_syn_freq(self.main.synHandle, self.x[self.current_x_index]/self.multiplier)
-            api_syn.set_mod_mode(self.main.synHandle, entry_setting[8])
+            synHandle = self.main.synHandle
+            liaHandle = self.main.liaHandle
+            syn_cache = self.main.synCache
+            lia_cache = self.main.liaCache
+            # read current settings (they may be changed on the front panel),
+            # and only send what is different
+            self.main.synInfo.full_info_query(synHandle)
+            syn_cache.validate()
+            self.main.liaInfo.full_info_query(liaHandle)
+            lia_cache.validate()
+
+            api_syn.set_syn_freq(synHandle, self.x[0]/self.multiplier)
+            syn_cache.set(synHandle, api_syn.set_mod_mode,
+                          {'AM1Toggle': entry_setting[8] == 1,
+                           'FM1Toggle': entry_setting[8] == 2}, entry_setting[8])
             if self.main.synInfo.modModeIndex == 1:
-                api_syn.set_am(self.main.synHandle, entry_setting[9], entry_setting[10], True)
+                syn_cache.set(synHandle, api_syn.set_am,
+                              {'modToggle': True, 'AM1Freq': entry_setting[9],
+                               'AM1DepthPercent': entry_setting[10]},
+                              entry_setting[9], entry_setting[10], True)
             elif self.main.synInfo.modModeIndex == 2:
-                api_syn.set_fm(self.main.synHandle, entry_setting[9], entry_setting[10], True)
+                syn_cache.set(synHandle, api_syn.set_fm,
+                              {'modToggle': True, 'FM1Freq': entry_setting[9],
+                               'FM1Dev': entry_setting[10]},
+                              entry_setting[9], entry_setting[10], True)
             else:
                 pass
-            api_lia.set_sens(self.main.liaHandle, self.sens_index)
-            api_lia.set_tc(self.main.liaHandle, self.tc_index)
-            api_lia.set_harm(self.main.liaHandle, entry_setting[11])
-            api_lia.set_phase(self.main.liaHandle, entry_setting[12])
-
-            self.main.synInfo.full_info_query(self.main.synHandle)
-            self.main.liaInfo.full_info_query(self.main.liaHandle)
-
-    def tune_syn_freq(self):
-            ''' Simply tune synthesizer frequency '''
-
-            self.main.synInfo.probFreq = self.x[self.current_x_index] * 1e6
-            self.main.synInfo.synFreq = self.main.synInfo.probFreq / self.multiplier
-            self.main.synStatus.print_info()
-
-            if self.main.testModeAction.isChecked():
+            lia_cache.set(liaHandle, api_lia.set_sens,
+                          {'sensIndex': self.sens_index}, self.sens_index)
+            lia_cache.set(liaHandle, api_lia.set_tc,
+                          {'tcIndex': self.tc_index}, self.tc_index)
+            lia_cache.set(liaHandle, api_lia.set_harm,
+                          {'refHarm': entry_setting[11]}, entry_setting[11])
+            lia_cache.set(liaHandle, api_lia.set_phase,
+                          {'refPhase': round(entry_setting[12], 2)}, entry_setting[12])
+
+            # read back if anything has been sent or went wrong
+            if syn_cache.check_error(synHandle) or syn_cache.changed:
+                self.main.synInfo.full_info_query(synHandle)
+                syn_cache.validate()
+            else:
                 pass
+            if lia_cache.check_error(liaHandle) or lia_cache.changed:
+                self.main.liaInfo.full_info_query(liaHandle)
+                lia_cache.validate()
             else:
-                api_syn.set_syn_freq(self.main.synHandle, self.main.synInfo.synFreq)
+                pass
 
-            self.waitTimer.start()
+    def update_syn_freq(self, prob_freq):
+        ''' Update synthesizer status after the worker tunes the frequency '''
 
-    def query_lockin(self):
-        ''' Query lockin data. Triggered by waitTimer.timeout() '''
+        self.main.synInfo.probFreq = prob_freq
+        self.main.synInfo.synFreq = prob_freq / self.multiplier
+        self.main.synStatus.print_info()
 
-        # append data to data list
-        if self.main.testModeAction.isChecked():
-            self.y[self.current_x_index] = np.random.random_sample()
-        else:
-            self.y[self.current_x_index] = api_lia.query_single_x(self.main.liaHandle)
-        # update plot
-        self.yCurve.setData(self.x, self.y)
-        # move to the next frequency, update freq index and average counter
-        self.next_freq()
-        # if done
-        if self.acquired_avg == self.target_avg:
-            self.save_data()
-            self.parent.batch_time_taken += ceil(len(self.x) * self.target_avg * self.waittime * 1e-3)
-            self.parent.next_entry_signal.emit()
-        else:
-            # tune syn to the next freq
-            self.tune_syn_freq()
+    def reset_sweep_plot(self):
+        ''' Clear the current sweep plot. Call only when the worker is stopped '''
 
-    def next_freq(self):
-        ''' move to the next frequency point '''
+        self.sweep_y = self.worker.y
+        self.refresher.set_data(self.yCurve, self.x, self.sweep_y, shown=False)
 
-        # current sweep is even average, decrease index (sweep backward)
-        if self.acquired_avg % 2:
-            self.pts_taken = (self.acquired_avg+1)*len(self.x) - self.current_x_index
-            if self.current_x_index > 0:
-                self.current_x_index -= 1
-            else:
-                self.acquired_avg += 1
-                self.update_ysum()
-                self.y = np.zeros_like(self.x)
-        # current sweep is odd average, increase index (sweep forward)
+    def update_point(self, y, idx, pts_taken):
+        ''' Mark the new point for the next plot refresh after each lockin read.
+            idx = -1 if the whole sweep is read at once.
+        '''
+
+        if y is not self.sweep_y:
+            # a new sweep has started
+            self.sweep_y = y
+            self.refresher.set_data(self.yCurve, self.x, y, shown=False)
+        if idx < 0:
+            self.refresher.update(self.yCurve)
         else:
-            self.pts_taken = self.acquired_avg*len(self.x) + self.current_x_index
-            if self.current_x_index < len(self.x)-1:
-                self.current_x_index += 1
-            else:
-                self.acquired_avg += 1
-                self.update_ysum()
-                self.y = np.zeros_like(self.x)
+            self.refresher.update(self.yCurve, idx, idx+1)
+        self.pts_taken = pts_taken
+
+    def update_progress(self):
+        ''' Update progress bar, following the plot refresh '''
 
-        # update progress bar
         self.parent.currentProgBar.setValue(ceil(self.pts_taken * self.waittime * 1e-3))
         self.parent.totalProgBar.setValue(self.parent.batch_time_taken +
                                           ceil(self.pts_taken * self.waittime * 1e-3))
 
-    def update_ysum(self):
-        ''' Update sum plot '''
+    def update_ysum(self, y_sum):
+        ''' Update sum plot and the measured time per point '''
+
+        self.refresher.set_data(self.ySumCurve, self.x, y_sum)
+        self.pointTimeLabel.setText('Time per point: {:.1f} ms (wait time {:g} ms)'.format(
+                                    self.worker.point_time * 1e3, self.waittime))
 
-        # add current y array to y_sum
-        self.y_sum += self.y
-        # update plot
-        self.ySumCurve.setData(self.x, self.y_sum)
+    def finish_scan(self):
+        ''' Save data and move to the next entry once target averages are reached '''
+
+        # the worker may have finished just before the user jumped to the next entry
+        if self.worker.acquired_avg == self.target_avg:
+            self.worker.wait()
+            self.refresher.flush()
+            self.save_data()
+            self.parent.batch_time_taken += ceil(len(self.x) * self.target_avg * self.waittime * 1e-3)
+            self.parent.next_entry_signal.emit()
+        else:
+            pass
 
     def save_data(self):
         ''' Save data array '''
@@ -617,6 +897,12 @@ class SingleScan(QtGui.QWidget):
         # Grab current comment (in case edited during the scan) before saving data
         entry = self.parent.batchListWidget.entryList[self.parent.current_entry_index]
 
+        # take a consistent copy of the data, the scan may still be running
+        with self.worker.lock:
+            y_sum = self.worker.y_sum
+            acquired_avg = self.worker.acquired_avg
+            y = self.worker.y.copy()
+
         if self.main.synInfo.modModeIndex == 2:
             mod_amp = self.main.synInfo.modAmp * 1e-3
         elif self.main.synInfo.modModeIndex == 1:
@@ -631,14 +917,14 @@ class SingleScan(QtGui.QWidget):
                   self.main.synInfo.modFreq * 1e-3, mod_amp,
                   self.main.synInfo.modModeText,
                   self.main.liaInfo.refHarm, self.main.liaInfo.refPhase,
-                  self.x_min, self.step, self.acquired_avg,
+                  self.x_min, self.step, acquired_avg,
                   entry.commentFill.text())
 
         # if already finishes at least one sweep
-        if self.acquired_avg > 0:
-            save.save_lwa(self.filename, self.y_sum / self.acquired_avg, h_info)
+        if acquired_avg > 0:
+            save.save_lwa(self.filename, y_sum / acquired_avg, h_info)
         else:
-            save.save_lwa(self.filename, self.y, h_info)
+            save.save_lwa(self.filename, y, h_info)
 
     def pause_current(self, btn_pressed):
         ''' Pause/resume data acquisition '''
@@ -646,29 +932,35 @@ class SingleScan(QtGui.QWidget):
         if btn_pressed:
             self.pauseButton.setText('Resume')
             #print('pause')
-            self.waitTimer.stop()
+            self.worker.stop()
         else:
             self.pauseButton.setText('Pause')
             #print('resume')
-            self.waitTimer.start()
+            self.worker.start()
 
-    def redo_current(self):
-        ''' Erase current y array and restart a scan '''
+    def toggle_buffer(self, state):
+        ''' Switch lockin buffer acquisition for the next sweep '''
+
+        self.worker.use_buffer = (state == QtCore.Qt.Checked)
+
+    def _unpause(self):
+        ''' Reset pause button without resuming the acquisition '''
 
-        #print('redo current')
-        self.waitTimer.stop()
         if self.pauseButton.isChecked():
-            self.pauseButton.click()
+            self.pauseButton.setChecked(False)
+            self.pauseButton.setText('Pause')
         else:
             pass
 
-        if self.acquired_avg % 2:   # even sweep, sweep down
-            self.current_x_index = len(self.x) - 1
-        else:                       # odd sweep, sweep up
-            self.current_x_index = 0
+    def redo_current(self):
+        ''' Erase current y array and restart a scan '''
 
-        self.y = np.zeros_like(self.x)
-        self.tune_syn_freq()
+        #print('redo current')
+        self.worker.stop()
+        self._unpause()
+        self.worker.restart_sweep()
+        self.reset_sweep_plot()
+        self.worker.start()
 
     def restart_avg(self):
         ''' Erase all current averages and start over '''
@@ -679,22 +971,19 @@ class SingleScan(QtGui.QWidget):
 
         if q == QtGui.QMessageBox.Yes:
             #print('restart average')
-            self.waitTimer.stop()
-            self.acquired_avg = 0
-            self.current_x_index = 0
-            self.y = np.zeros_like(self.x)
-            self.y_sum = np.zeros_like(self.x)
-            self.ySumCurve.setData(self.x, self.y_sum)
-            self.tune_syn_freq()
+            self.worker.stop()
+            self._unpause()
+            self.worker.reset()
+            self.reset_sweep_plot()
+            self.refresher.set_data(self.ySumCurve, self.x, self.worker.y_sum)
+            self.worker.start()
         else:
             pass
 
     def save_current(self):
         ''' Save what's got so far and continue '''
 
-        self.waitTimer.stop()
         self.save_data()
-        self.waitTimer.start()
 
     def jump(self):
         ''' Jump to next batch item '''
@@ -705,13 +994,15 @@ class SingleScan(QtGui.QWidget):
 
         if q == QtGui.QMessageBox.Yes:
             #print('abort current')
-            self.waitTimer.stop()
+            self.worker.stop()
+            self._unpause()
             self.parent.batch_time_taken += ceil(len(self.x) * self.target_avg * self.waittime * 1e-3)
             self.save_data()
             self.parent.next_entry_signal.emit()
         elif q == QtGui.QMessageBox.No:
             #print('abort current')
-            self.waitTimer.stop()
+            self.worker.stop()
+            self._unpause()
             self.parent.batch_time_taken += ceil(len(self.x) * self.target_avg * self.waittime * 1e-3)
             self.parent.next_entry_signal.emit()
         else:
@@ -0,0 +1,226 @@
+#! encoding = utf-8
+
+''' Data buffers for real-time monitors '''
+
+
+import numpy as np
+
+
+class RingBuffer():
+    ''' Fixed capacity ring buffer. Once full, the oldest sample is dropped
+        on each append.
+        Every sample is written twice, at i and i + capacity of an array of
+        2 * capacity, so that the latest samples are always a contiguous
+        slice of the array: reading them never copies data.
+    '''
+
+    def __init__(self, capacity, dtype=np.float64):
+
+        self.capacity = int(capacity)
+        self._buf = np.zeros(2 * self.capacity, dtype=dtype)
+        self._head = 0      # index of the next sample, [0, capacity)
+        self._size = 0      # number of samples stored
+
+    def __len__(self):
+
+        return self._size
+
+    def is_full(self):
+
+        return self._size == self.capacity
+
+    def append(self, value):
+        ''' Append a sample. O(1) '''
+
+        self._buf[self._head] = value
+        self._buf[self._head + self.capacity] = value
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def extend(self, values):
+        ''' Append an array of samples '''
+
+        values = np.asarray(values)[-self.capacity:]
+        idx = (self._head + np.arange(len(values))) % self.capacity
+        self._buf[idx] = values
+        self._buf[idx + self.capacity] = values
+        self._head = (self._head + len(values)) % self.capacity
+        self._size = min(self._size + len(values), self.capacity)
+
+    def update_last(self, value):
+        ''' Replace the last sample '''
+
+        i = (self._head - 1) % self.capacity
+        self._buf[i] = value
+        self._buf[i + self.capacity] = value
+
+    def view(self, n=None):
+        ''' Return the last n samples (default all), oldest first.
+            The returned array is a view into the buffer, it changes with
+            the following appends. Copy it if it is kept.
+        '''
+
+        if n is None or n > self._size:
+            n = self._size
+        end = self._head + self.capacity
+        return self._buf[end-n:end]
+
+    def clear(self):
+        ''' Remove all samples '''
+
+        self._head = 0
+        self._size = 0
+
+
+class TimeSeriesLog():
+    ''' Append-only time series log streamed to disk.
+        Each row of ncol float64 numbers is written to the binary file as soon
+        as it is appended, so a crash loses at most the current row. The file
+        is headerless, rows of little-endian float64, and can be read back by
+            np.fromfile(filename, dtype='<f8').reshape(-1, ncol)
+        The history is not kept in memory: read() maps the file.
+    '''
+
+    def __init__(self, filename, ncol=2):
+
+        self.filename = filename
+        self.ncol = ncol
+        self._row = np.zeros(ncol, dtype='<f8')
+        self._size = 0
+        self._map = None
+        self._file = open(filename, 'wb')
+
+    def __len__(self):
+
+        return self._size
+
+    def append(self, row):
+        ''' Append a row and write it to the file. O(1) '''
+
+        self._row[:] = row
+        self._file.write(self._row.tobytes())
+        self._file.flush()
+        self._size += 1
+
+    def read(self, start=0, stop=None):
+        ''' Return rows [start, stop) as a read-only (n, ncol) array mapped
+            from the file. The map is renewed only when the log has grown.
+        '''
+
+        if not self._size:
+            return np.zeros((0, self.ncol))
+        if self._map is None or len(self._map) != self._size:
+            self._map = np.memmap(self.filename, dtype='<f8', mode='r',
+                                  shape=(self._size, self.ncol))
+        return self._map[start:stop]
+
+    def close(self):
+
+        self._map = None
+        self._file.close()
+
+
+class MinMaxPyramid():
+    ''' Multi-resolution min/max decimation of a growing time series.
+        Level k keeps the min & max of every bucket of factor**k samples,
+        and the x of the first sample in the bucket. Buckets are updated
+        incrementally on each append. The raw data (level 0) is not kept
+        here, it is passed to decimate() by the owner.
+        Each level keeps its last capacity buckets in ring buffers, so the
+        memory is bounded: the finer levels only cover the recent data,
+        and older data are drawn from the coarser levels.
+        Drawing the min & max of each bucket keeps every spike visible,
+        with only about 2 points per bucket.
+    '''
+
+    def __init__(self, factor=8, capacity=65536):
+
+        self.factor = factor
+        self.capacity = capacity
+        self._size = 0
+        # per level: [x, ymin, ymax (RingBuffer), total number of buckets]
+        self._levels = []
+
+    def __len__(self):
+
+        return self._size
+
+    def clear(self):
+
+        self._size = 0
+        self._levels = []
+
+    def append(self, x, y):
+        ''' Add a raw sample to every level '''
+
+        for k, level in enumerate(self._levels, start=1):
+            if self._size % self.factor**k:
+                # merge into the last bucket
+                level[1].update_last(min(level[1].view(1)[0], y))
+                level[2].update_last(max(level[2].view(1)[0], y))
+            else:
+                # start a new bucket
+                level[0].append(x)
+                level[1].append(y)
+                level[2].append(y)
+                level[3] += 1
+        self._size += 1
+
+    def _add_level(self, x, y):
+        ''' Build a new top level from the raw data x, y '''
+
+        k = len(self._levels) + 1
+        idx = np.arange(0, len(y), self.factor**k)
+        n = len(idx)
+        # only the last capacity buckets are kept
+        idx = idx[-self.capacity:]
+        level = [RingBuffer(self.capacity), RingBuffer(self.capacity),
+                 RingBuffer(self.capacity), n]
+        if n:
+            level[0].extend(x[idx])
+            level[1].extend(np.minimum.reduceat(y[idx[0]:], idx - idx[0]))
+            level[2].extend(np.maximum.reduceat(y[idx[0]:], idx - idx[0]))
+        self._levels.append(level)
+
+    def decimate(self, x, y, x_lo=None, x_hi=None, npts=1000):
+        ''' Return x, y arrays to draw in [x_lo, x_hi] with about npts points.
+            Arguments
+                x: raw x data, increasing, np.array (memmap is fine)
+                y: raw y data, np.array, len(y) == len(self)
+                x_lo, x_hi: x range. None for the data bounds. The range
+                            may extend beyond the data
+                npts: number of points to draw, ~ pixels of the plot width
+        '''
+
+        # add coarser levels as the data grow, until the top level fits
+        while len(y) // self.factor**len(self._levels) > npts // 2:
+            self._add_level(x, y)
+
+        # raw index range, one more point on each side to reach the edges
+        lo = 0 if x_lo is None else max(np.searchsorted(x, x_lo) - 1, 0)
+        hi = len(y) if x_hi is None else min(np.searchsorted(x, x_hi) + 1, len(y))
+        if hi <= lo:
+            return x[lo:hi], y[lo:hi]
+        # pick the finest level that gives no more than npts points
+        k = 0
+        while (hi - lo) // self.factor**k > npts // 2:
+            k += 1
+        if not k or (hi - lo) <= npts:
+            return x[lo:hi], y[lo:hi]
+
+        # go to coarser levels until one still holds the first bucket
+        while True:
+            if k > len(self._levels):
+                self._add_level(x, y)
+            level = self._levels[k-1]
+            b = self.factor**k
+            first = level[3] - len(level[0])
+            if lo // b >= first:
+                break
+            k += 1
+        b_lo = lo // b - first
+        b_hi = min(-(-hi // b), level[3]) - first
+        x_out = np.repeat(level[0].view()[b_lo:b_hi], 2)
+        y_out = np.column_stack((level[1].view()[b_lo:b_hi],
+                                 level[2].view()[b_lo:b_hi])).ravel()
+        return x_out, y_out
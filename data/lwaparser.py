@@ -2,8 +2,32 @@
 
 ''' LWA file parser '''
 
+import os
 import re
+import mmap
+import locale
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+# Byte-offset index of scans in a lwa file, one record per scan:
+#   hd: offset of the header (DATE line)
+#   data: offset of the first data line
+#   end: offset of the end of the scan (next header or EOF)
+#   pts, sens, start, step: copied from the header
+# The index is saved alongside the lwa file as filename + '.idx':
+# an IDX_HEADER_DTYPE header with the size & mtime of the lwa file it
+# indexes, followed by the raw little-endian records.
+IDX_DTYPE = np.dtype([('hd', '<i8'), ('data', '<i8'), ('end', '<i8'),
+                      ('pts', '<i8'), ('sens', '<f8'), ('start', '<f8'),
+                      ('step', '<f8')])
+IDX_HEADER_DTYPE = np.dtype([('magic', 'S8'), ('size', '<i8'), ('mtime_ns', '<i8')])
+_IDX_MAGIC = b'LWAIDX01'
+
+_RE_HEADER = re.compile(rb'^DATE', re.M)
+
+# text encoding of the lwa headers (scan comments), same as a text mode open()
+ENCODING = locale.getpreferredencoding(False)
 
 def _file_filter(file_list, pattern):
     ''' Filter out file names with a given pattern '''
@@ -29,223 +53,347 @@ def _flatten(nested_list):
     return flat
 
 
+def _index_scans(buffer, offset=0):
+    ''' Index scans in the buffer, starting at byte offset.
+    A scan whose 3 header lines are not complete yet is not indexed.
+    Returns a list of index record tuples.
+    '''
+
+    hd_list = [m.start() for m in _RE_HEADER.finditer(buffer, offset)]
+    hd_list.append(len(buffer))
+    records = []
+    for i in range(len(hd_list)-1):
+        hd = hd_list[i]
+        # find the end of the 3 header lines
+        eol_1 = buffer.find(b'\n', hd)
+        eol_2 = buffer.find(b'\n', eol_1+1)
+        eol_3 = buffer.find(b'\n', eol_2+1)
+        if eol_1 < 0 or eol_2 < 0 or eol_3 < 0 or eol_3 > hd_list[i+1]:
+            continue
+        try:
+            sens = float(buffer[hd:eol_1].split()[9])
+            _temp_list = buffer[eol_2+1:eol_3].split()
+            start = float(_temp_list[0])
+            step = float(_temp_list[1])
+            pts = int(_temp_list[2])
+        except (IndexError, ValueError):
+            continue
+        records.append((hd, eol_3+1, hd_list[i+1], pts, sens, start, step))
+
+    return records
+
+
+def build_index(filename, index=None):
+    ''' Build the byte-offset index of the lwa file in one pass.
+    If the index of the beginning of the file is given, only the remaining
+    part is scanned. The last indexed scan is always scanned again in case
+    more data has been appended to it.
+    Returns index array, None if the file cannot be read.
+    '''
+
+    if index is not None and len(index):
+        offset = int(index['hd'][-1])
+        index = index[:-1]
+    else:
+        offset = 0
+        index = np.empty(0, dtype=IDX_DTYPE)
+
+    try:
+        with open(filename, 'rb') as a_file:
+            if os.fstat(a_file.fileno()).st_size == 0:
+                return index
+            with mmap.mmap(a_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                records = _index_scans(buffer, offset)
+    except (OSError, ValueError):
+        return None
+
+    return np.concatenate((index, np.array(records, dtype=IDX_DTYPE)))
+
+
+def _stamp(st):
+    ''' Index file header of the lwa file with os.stat result st '''
+
+    return np.array([(_IDX_MAGIC, st.st_size, st.st_mtime_ns)], dtype=IDX_HEADER_DTYPE)
+
+
+def save_index(filename, index, st):
+    ''' Save index alongside the lwa file, stamped with the os.stat result
+    st of the lwa file taken before it was indexed. Silently pass if not
+    writable
+    '''
+
+    try:
+        with open(filename + '.idx', 'wb') as idx_file:
+            idx_file.write(_stamp(st).tobytes() + index.tobytes())
+    except OSError:
+        pass
+
+
+def _read_index(filename, st):
+    ''' Read the index saved alongside the lwa file.
+    Returns index array, None if missing, corrupted, or if its stamp does
+    not match the os.stat result st of the lwa file.
+    '''
+
+    try:
+        with open(filename + '.idx', 'rb') as idx_file:
+            buffer = idx_file.read()
+    except OSError:
+        return None
+
+    if (len(buffer) < IDX_HEADER_DTYPE.itemsize or
+            (len(buffer) - IDX_HEADER_DTYPE.itemsize) % IDX_DTYPE.itemsize):
+        return None
+    header = np.frombuffer(buffer, dtype=IDX_HEADER_DTYPE, count=1)
+    if header.tobytes() != _stamp(st).tobytes():
+        return None
+    return np.frombuffer(buffer, dtype=IDX_DTYPE, offset=IDX_HEADER_DTYPE.itemsize).copy()
+
+
+def load_index(filename):
+    ''' Load the index saved alongside the lwa file.
+    The saved index is only used if the size and mtime of the lwa file are
+    the ones it was saved with. Otherwise (the file has been appended to by
+    another program, rewritten or replaced) it is rebuilt from scratch.
+    Returns index array, None if the file cannot be read.
+    '''
+
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+
+    index = _read_index(filename, st)
+    if index is not None:
+        return index
+
+    index = build_index(filename)
+    if index is not None:
+        save_index(filename, index, st)
+    return index
+
+
+def append_index(filename, record, st_before):
+    ''' Append the index record of a scan just appended to the lwa file.
+    st_before is the os.stat result of the lwa file before the scan was
+    appended. The record is only appended if the saved index matched the
+    file at that time and ends exactly where the new scan starts. Otherwise
+    the saved index is left for load_index to rebuild.
+    '''
+
+    idx_name = filename + '.idx'
+    record = np.array([record], dtype=IDX_DTYPE)
+    try:
+        st = os.stat(filename)
+        if record['hd'][0] == 0:
+            # new lwa file, start a new index
+            save_index(filename, record, st)
+            return None
+        index = _read_index(filename, st_before)
+        if index is None or not len(index) or index['end'][-1] != record['hd'][0]:
+            return None
+        with open(idx_name, 'r+b') as idx_file:
+            idx_file.write(_stamp(st).tobytes())
+            idx_file.seek(0, os.SEEK_END)
+            idx_file.write(record.tobytes())
+    except OSError:
+        pass
+
+
+def update_index(filename, index):
+    ''' Pick up scans appended to the lwa file after index was loaded.
+    Records appended by data.save.save_lwa are read directly from the saved
+    index; the file is only scanned if it has been changed otherwise.
+    Returns the updated index array, None if the file cannot be read.
+    '''
+
+    return load_index(filename)
+
+
+def parse_block(block):
+    ''' Parse the data block of a scan (bytes) into a float64 array.
+    LWA data are written in fixed-width 10.3f fields, which are sliced
+    directly so that fields running into each other are still parsed.
+    Falls back to whitespace delimited parsing for other layouts.
+    '''
+
+    fields = block.replace(b'\n', b'')
+    if b'\r' in fields:
+        fields = fields.replace(b'\r', b'')
+    if not len(fields) % 10:
+        try:
+            return np.frombuffer(fields, dtype='S10').astype(np.float64)
+        except ValueError:
+            pass
+
+    return np.fromstring(block, dtype=np.float64, sep=' ')
+
+
+def read_scan(src, rec):
+    ''' Read one scan with a single seek and bulk parse.
+        Arguments
+            src: lwa file name
+            rec: index record of the scan, see IDX_DTYPE
+        Returns
+            x, frequency vector, unit in MHz
+            y, intensity vector, unit in V
+    '''
+
+    with open(src, 'rb') as srcfile:
+        srcfile.seek(int(rec['data']))
+        block = srcfile.read(int(rec['end'] - rec['data']))
+
+    x = np.linspace(rec['start'], rec['start'] + rec['step']*rec['pts'],
+                    num=rec['pts'], endpoint=False)
+    # full scale is 1e4
+    y = parse_block(block) * 1e-4 * rec['sens']
+
+    return x, y
+
+
 def scan_header(filename):
-    ''' Scan headers in the lwa file.
+    ''' Scan headers in the lwa file, using the byte-offset index.
     Returns
         entry_settings: list of entry setting tuples. Scan # starts at 1.
-        hd_line_num: start line number of each header in the file
+        index: byte-offset index array of scans, see IDX_DTYPE
     '''
 
     if filename:
-        re_header = re.compile('DATE')
-        # header's line number list
-        hd_line_num = []
-        # entry setting list
-        entry_settings = []
-
-        # open file
-        a_file = open(filename, 'r')
-        a_line = a_file.readline()
-        line_num = 1
-        scan_num = 0
-        while a_line:       # not EOF
-            # this is the header
-            if re_header.match(a_line):
-                scan_num += 1
-                hd_line_num.append(line_num)
-                _temp_list = a_line.split()
-                date = _temp_list[1]
-                time = _temp_list[3]
-                it = float(_temp_list[7])
-                sens = float(_temp_list[9])
-                tc = float(_temp_list[11])
-                mf = float(_temp_list[13])
-                ma = float(_temp_list[15])
-
-                # the following fields are newly introduced in PySpec
-                # make it compatible with old "standard" JPL LWA header
-                try:
-                    mmode = _temp_list[17]
-                    harm = int(_temp_list[19])
-                    phase = float(_temp_list[21])
-                except IndexError:
-                    mmode = 'UNKNOWN'
-                    harm = 0
-                    phase = 0
-
-                # move to next line to read comment
-                a_line = a_file.readline()
-                line_num += 1
-                comment = a_line.strip()    # remove the new line char
-
-                # move to next line to read freqs
-                a_line = a_file.readline()
-                line_num += 1
-                _temp_list = a_line.split()
-                startf = float(_temp_list[0])
-                step = float(_temp_list[1])
-                pts = int(_temp_list[2])
-                stopf = startf + step*pts
-                avg = int(_temp_list[3])
-
-                # append settings
-                entry_settings.append((scan_num, comment, date, time,
-                    it, sens, tc, mmode, mf, ma, startf, stopf,
-                    step, pts, avg, harm, phase))
-            else:
-                a_line = a_file.readline()
-                line_num += 1
-
-        a_file.close()
-        hd_line_num.sort()
+        index = load_index(filename)
     else:
-        entry_settings = None
-        hd_line_num = None
+        index = None
+    if index is None:
+        return None, None
 
-    return entry_settings, hd_line_num
+    return read_entry_settings(filename, index), index
 
 
-def export_lwa(id_list, hd_line_num, src='src.lwa', output='output.lwa'):
-    ''' Export partial LWA file to new LWA file,
-        based on scan id (id starts at 0) '''
+def read_entry_settings(filename, index, start=0):
+    ''' Read the settings of scans index[start:] from their headers, e.g.
+    of the scans added by update_index.
+    Returns
+        entry_settings: list of entry setting tuples. Scan # starts at 1.
+    '''
 
-    srcfile = open(src, 'r')
-    outputfile = open(output, 'w')
-
-    # get line number window to be copied
-    hd_line_num.append(0)   # add 0 for the last one
-    win = lambda id_, hd: list((hd[i], hd[i+1]-1) for i in id_)
-    line_num_win = win(id_list, hd_line_num)
-    # reverse list order for pop ups
-    line_num_win.reverse()
-
-    line_num = 1
-    a_line = srcfile.readline()
-    start, stop = line_num_win.pop()
-    # start read source file
-    while a_line:   # source file not EOF
-        if (line_num >= start) and ((line_num <= stop) or (stop == -1)):
-            # write this line to output file
-            outputfile.write(a_line)
-        elif line_num > stop and stop != -1:
-            # pop the next line number window
+    # entry setting list
+    entry_settings = []
+    with open(filename, 'rb') as a_file:
+        for scan_num, rec in enumerate(index[start:], start=start+1):
+            a_file.seek(int(rec['hd']))
+            hd_lines = a_file.read(int(rec['data'] - rec['hd'])).decode(ENCODING, 'replace').split('\n')
+
+            _temp_list = hd_lines[0].split()
+            date = _temp_list[1]
+            time = _temp_list[3]
+            it = float(_temp_list[7])
+            sens = float(_temp_list[9])
+            tc = float(_temp_list[11])
+            mf = float(_temp_list[13])
+            ma = float(_temp_list[15])
+
+            # the following fields are newly introduced in PySpec
+            # make it compatible with old "standard" JPL LWA header
             try:
-                start, stop = line_num_win.pop()
+                mmode = _temp_list[17]
+                harm = int(_temp_list[19])
+                phase = float(_temp_list[21])
             except IndexError:
-                break
-        # move to next line
-        a_line = srcfile.readline()
-        line_num += 1
+                mmode = 'UNKNOWN'
+                harm = 0
+                phase = 0
 
-    srcfile.close()
-    outputfile.close()
+            comment = hd_lines[1].strip()    # remove the new line char
 
+            _temp_list = hd_lines[2].split()
+            startf = float(_temp_list[0])
+            step = float(_temp_list[1])
+            pts = int(_temp_list[2])
+            stopf = startf + step*pts
+            avg = int(_temp_list[3])
 
-def export_xy(id_list, hd_line_num, src='src.lwa', output_dir='export/'):
-    ''' Export partial LWA file to new xy files,
+            # append settings
+            entry_settings.append((scan_num, comment, date, time,
+                it, sens, tc, mmode, mf, ma, startf, stopf,
+                step, pts, avg, harm, phase))
+
+    return entry_settings
+
+
+def export_lwa(id_list, index, src='src.lwa', output='output.lwa'):
+    ''' Export partial LWA file to new LWA file,
         based on scan id (id starts at 0) '''
 
-    global ylist, sens, x, out_name
-    ylist = []
-
-    # get line number window to be copied
-    hd_line_num.append(0)   # add 0 for the last one
-    win = lambda id_, hd: list((hd[i], hd[i+1]-1) for i in id_)
-    line_num_win = win(id_list, hd_line_num)
-    # reverse list order for pop ups
-    line_num_win.reverse()
-
-    line_num = 1
-    srcfile = open(src, 'r')
-    a_line = srcfile.readline()
-    start, stop = line_num_win.pop()
-    # start read source file
-    while a_line:   # source file not EOF
-        if (line_num >= start) and ((line_num <= stop) or (stop == -1)):
-            if line_num == start: # get 1st header for sensitivity
-                a_list = a_line.split()
-                sens = float(a_list[9])
-            elif line_num == start+1: # get comment and generate file name
-                comment = a_line.split()[0]
-                out_name = output_dir + '/' + 'Scan_{:d}_{:s}.csv'.format(len(line_num_win)+1, comment)
-            elif line_num == start+2: # get 3rd header line for x array
-                a_list = a_line.split()
-                xstart = float(a_list[0])
-                xstep = float(a_list[1])
-                pts = int(a_list[2])
-                x = np.linspace(xstart, xstart + xstep*pts, num=pts, endpoint=False)
-            else:   # data lines, read data
-                # add this line to y list
-                ylist.append(a_line.split())
-        elif line_num > stop and stop != -1:    # end of this scan entry
-            # save this entry
-            # column_stack array
-            y = [i for j in ylist for i in j]
-            np.savetxt(out_name,
-                np.column_stack((x, np.asarray(y, dtype=float)*1e-4*sens)),
-                delimiter=',', fmt=['%.3f', '%.6e'], comments='',
-                header='Frequency(MHz),LockinInten(V)')
-            # erase ylist
-            ylist = []
-            # pop the next line number window
+    with open(src, 'rb') as srcfile, open(output, 'wb') as outputfile:
+        for id_ in sorted(id_list):
+            srcfile.seek(int(index['hd'][id_]))
+            outputfile.write(srcfile.read(int(index['end'][id_] - index['hd'][id_])))
+
+
+def _export_scan(id_, index, src, output_dir):
+    ''' Export a single scan to a xy file. Returns the file name '''
+
+    rec = index[id_]
+    # get comment from the 2nd header line
+    with open(src, 'rb') as srcfile:
+        srcfile.seek(int(rec['hd']))
+        srcfile.readline()
+        comment = srcfile.readline().decode(ENCODING, 'replace').split()
+    comment = comment[0] if comment else ''
+    out_name = output_dir + '/' + 'Scan_{:d}_{:s}.csv'.format(id_+1, comment)
+
+    x, y = read_scan(src, rec)
+    # same layout as np.savetxt with fmt=['%.3f', '%.6e'], formatted in one go
+    xy = np.column_stack((x, y)).ravel().tolist()
+    with open(out_name, 'w') as outputfile:
+        outputfile.write('Frequency(MHz),LockinInten(V)\n')
+        outputfile.write(('%.3f,%.6e\n' * len(x)) % tuple(xy))
+
+    return out_name
+
+
+def export_xy(id_list, index, src='src.lwa', output_dir='export/',
+              workers=4, callback=None):
+    ''' Export partial LWA file to new xy files,
+        based on scan id (id starts at 0).
+        Files are named after the scan # (starts at 1) and the comment.
+        Scans are read and written concurrently in a thread pool.
+        Arguments
+            workers: number of threads
+            callback: callback(done, total) is called after each file is
+                      written. Return False to cancel the remaining scans.
+        Returns
+            list of file names written
+        The first failed scan cancels the remaining ones and its error is
+        raised.
+    '''
+
+    id_list = sorted(id_list)
+    total = len(id_list)
+    out_names = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(_export_scan, id_, index, src, output_dir)
+                for id_ in id_list]
+        for done, job in enumerate(as_completed(jobs), start=1):
             try:
-                start, stop = line_num_win.pop()
-            except IndexError:
+                out_names.append(job.result())
+            except:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+            if callback and callback(done, total) is False:
+                for job in jobs:
+                    job.cancel()
                 break
-        # move to next line
-        a_line = srcfile.readline()
-        line_num += 1
-
-    srcfile.close()
-
-    if ylist:   # if the last one is not saved yet
-        y = [i for j in ylist for i in j]
-        np.savetxt(out_name,
-            np.column_stack((x, np.asarray(y, dtype=float)*1e-4*sens)),
-            delimiter=',', fmt=['%.3f', '%.6e'], comments='',
-            header='Frequency(MHz),LockinInten(V)')
-    else:
-        pass
 
+    return out_names
 
-def preview(id_, hd_line_num, src='src.lwa'):
+
+def preview(id_, index, src='src.lwa'):
     ''' Preview the scan #id.
         Returns np.array (x, y)
             x, frequency vector, unit in Hz
             y, intensity vector
     '''
 
-    srcfile = open(src, 'r')
-    ylist = []
-
-    # get line number window to be copied
-    hd_line_num.append(0)   # add 0 for the last one
-    line_num = 1
-    start = hd_line_num[id_]
-    stop = hd_line_num[id_+1] - 1
-
-    # start reading
-    a_line = srcfile.readline()
-    while a_line:
-        if (line_num >= start+3) and ((line_num <= stop) or (stop == -1)):
-            # add this line to y list
-            ylist.append(a_line.split())
-        elif line_num == start: # get 1st header for sensitivity
-            a_list = a_line.split()
-            sens = float(a_list[9])
-        elif line_num == start+2: # get 3rd header line for x array
-            a_list = a_line.split()
-            xstart = float(a_list[0])
-            xstep = float(a_list[1])
-            pts = int(a_list[2])
-            x = np.linspace(xstart, xstart + xstep*pts, num=pts, endpoint=False)
-            pass
-        a_line = srcfile.readline()
-        line_num += 1
-
-    srcfile.close()
-
-    # flatten ylist
-    y = [i for j in ylist for i in j]
+    x, y = read_scan(src, index[id_])
 
-    return np.column_stack((x*1e6, np.asarray(y, dtype=float)*1e-4*sens))
+    return np.column_stack((x*1e6, y))
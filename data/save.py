@@ -3,8 +3,10 @@
 ''' Save data '''
 
 
+import os
 import numpy as np
 import datetime
+from data import lwaparser
 
 
 def save_lwa(filename, y, h_info):
@@ -19,6 +21,8 @@ def save_lwa(filename, y, h_info):
             DATE mm-dd-year TIME hh:mm:ss SH %d IT %g SENS %g TAU %g MF %.3f MA %.3f MOD [NONE|AM|FM] HARM %d PHA %.2f
             [COMMENT]
             [START FREQ MHZ %.3f] [STEP MHZ %.6f] [PTS %d] [AVG %d] 1 1 1.887 0.000 0 0 START
+        The scan is written with a single append, and its record is then
+        added to the lwaparser byte-offset index (filename + '.idx').
     '''
 
     d = datetime.datetime.today()
@@ -26,35 +30,42 @@ def save_lwa(filename, y, h_info):
     # rescale y based on sensitivity, full scale is 1e4
     y = y / sens * 1e4
 
-    with open(filename, 'a') as f:
-        # write first line
-        f.write('DATE ' + d.strftime('%m-%d-%Y'))
-        f.write(' TIME ' + d.strftime('%H:%M:%S'))
-        f.write(' SH {:d}'.format(synmulti))
-        f.write(' IT {:.3g}'.format(itgtime))
-        f.write(' SENS {:.3g}'.format(sens))
-        f.write(' TAU {:.3g}'.format(tc))
-        f.write(' MF {:.3f}'.format(mod_freq))
-        f.write(' MA {:.3f}'.format(mod_depth))
-        f.write(' MOD {:s}'.format(mod_mode))
-        f.write(' HARM {:d}'.format(lia_harm))
-        f.write(' PHA {:.2f}'.format(lia_phase))
-
-        # write second line
-        f.write('\n {:s}'.format(comment))
-
-        # write third line
-        f.write('\n {:.3f}   {:.6f}  {:d}'.format(start_freq, step, len(y)))
-        f.write(' {:d} 1 1  1.887  0.000 0 0 START\n'.format(avg))
-
-        # write y data
-        fmt = '{:10.3f}'*10     # 10 numbers each row
-        for i in range(len(y)//10):
-            f.write(fmt.format(*y[i*10:(i+1)*10]))
-            f.write('\n')
-        # for the last row which may not have 10 numbers. Avoid index error
-        for i in range(len(y) - len(y)//10*10):
-            f.write('{:10.3f}'.format(y[len(y)//10*10+i]))
-        f.write('\n')
+    # first line
+    header = ('DATE ' + d.strftime('%m-%d-%Y') +
+              ' TIME ' + d.strftime('%H:%M:%S') +
+              ' SH {:d}'.format(synmulti) +
+              ' IT {:.3g}'.format(itgtime) +
+              ' SENS {:.3g}'.format(sens) +
+              ' TAU {:.3g}'.format(tc) +
+              ' MF {:.3f}'.format(mod_freq) +
+              ' MA {:.3f}'.format(mod_depth) +
+              ' MOD {:s}'.format(mod_mode) +
+              ' HARM {:d}'.format(lia_harm) +
+              ' PHA {:.2f}'.format(lia_phase))
+    # second line
+    header += '\n {:s}'.format(comment)
+    # third line
+    header += '\n {:.3f}   {:.6f}  {:d}'.format(start_freq, step, len(y))
+    header += ' {:d} 1 1  1.887  0.000 0 0 START\n'.format(avg)
+
+    # y data, 10 numbers each row, formatted in one go.
+    # The last row may not have 10 numbers, and is followed by a newline
+    # even if it is empty.
+    full_rows = len(y) // 10
+    fmt = ('%10.3f'*10 + os.linesep) * full_rows + '%10.3f'*(len(y) - full_rows*10) + os.linesep
+    data = (fmt % tuple(y.tolist())).encode('ascii')
+
+    # same platform line ending & encoding as a text mode write
+    header = header.replace('\n', os.linesep).encode(lwaparser.ENCODING, 'replace')
+
+    with open(filename, 'ab') as f:
+        st_before = os.fstat(f.fileno())
+        offset = f.seek(0, os.SEEK_END)
+        f.write(header + data)
+
+    # the scan is on disk, now add it to the lwa index
+    lwaparser.append_index(filename, (offset, offset + len(header),
+                           offset + len(header) + len(data), len(y), sens,
+                           start_freq, step), st_before)
 
     return None
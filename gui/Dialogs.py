@@ -29,26 +29,21 @@ class SelInstDialog(QtGui.QDialog):
         cancelButton = QtGui.QPushButton(Shared.btn_label('reject'))
 
         self.availableInst = QtGui.QLabel()
-        instList, instStr = api_gen.list_inst()
-        self.availableInst.setText(instStr)
+        self.instList = []
+        self.instDict = {}
 
         selInst = QtGui.QWidget()
         selInstLayout = QtGui.QFormLayout()
         self.selSyn = QtGui.QComboBox()
         self.selSyn.addItems(['N.A.'])
-        self.selSyn.addItems(instList)
         self.selLockin = QtGui.QComboBox()
         self.selLockin.addItems(['N.A.'])
-        self.selLockin.addItems(instList)
         self.selScope = QtGui.QComboBox()
         self.selScope.addItems(['N.A.'])
-        self.selScope.addItems(instList)
         self.selMotor = QtGui.QComboBox()
         self.selMotor.addItems(['N.A.'])
-        self.selMotor.addItems(instList)
         self.selPressure = QtGui.QComboBox()
         self.selPressure.addItems(['N.A.'])
-        self.selPressure.addItems(instList)
         selInstLayout.addRow(QtGui.QLabel('Synthesizer'), self.selSyn)
         selInstLayout.addRow(QtGui.QLabel('Lock-in'), self.selLockin)
         selInstLayout.addRow(QtGui.QLabel('Oscilloscope'), self.selScope)
@@ -66,16 +61,37 @@ class SelInstDialog(QtGui.QDialog):
 
         self.setLayout(mainLayout)
 
+        # instruments are probed in the background, and the list is filled
+        # as they reply
+        self.probeWorker = InstProbeWorker(self)
+        self.probeWorker.listed.connect(self.update_list)
+        self.probeWorker.probed.connect(self.update_inst)
+
         refreshButton.clicked.connect(self.refresh)
         cancelButton.clicked.connect(self.reject)
         acceptButton.clicked.connect(self.accept)
 
+        self.refresh()
+
     def refresh(self):
         ''' Refresh instrument list '''
 
-        # refresh avaiable instrument list
-        instList, instStr = api_gen.list_inst()
-        self.availableInst.setText(instStr)
+        if self.probeWorker.isRunning():
+            pass
+        else:
+            self.availableInst.setText('Searching for instruments...')
+            self.probeWorker.start()
+
+    def update_list(self, instList):
+        ''' Fill in the instrument addresses, before they are probed '''
+
+        self.instDict = {}
+        if instList is None:
+            self.instList = []
+            self.availableInst.setText('Cannot open VISA library!')
+        else:
+            self.instList = instList
+            self.availableInst.setText(api_gen.format_inst_str(instList, self.instDict))
 
         # refresh QComboBoxes
         item_count = self.selSyn.count()
@@ -88,14 +104,29 @@ class SelInstDialog(QtGui.QDialog):
             self.selScope.removeItem(1)
             self.selMotor.removeItem(1)
             self.selPressure.removeItem(1)
-        self.selSyn.addItems(instList)
-        self.selLockin.addItems(instList)
-        self.selScope.addItems(instList)
-        self.selMotor.addItems(instList)
-        self.selPressure.addItems(instList)
+        self.selSyn.addItems(self.instList)
+        self.selLockin.addItems(self.instList)
+        self.selScope.addItems(self.instList)
+        self.selMotor.addItems(self.instList)
+        self.selPressure.addItems(self.instList)
+
+    def update_inst(self, inst, text):
+        ''' Show the description of an instrument as soon as it replies '''
+
+        self.instDict[inst] = text
+        self.availableInst.setText(api_gen.format_inst_str(self.instList, self.instDict))
+
+    def reject(self):
+
+        # probing opens the instruments, let it finish
+        self.probeWorker.wait()
+        QtGui.QDialog.reject(self)
 
     def accept(self):
 
+        # probing opens the instruments, let it finish
+        self.probeWorker.wait()
+
         # close old instrument handles
         api_gen.close_inst(self.parent.synHandle,
                            self.parent.liaHandle,
@@ -587,6 +618,9 @@ class LWAParserDialog(QtGui.QDialog):
         Dialog window for the LWA file previewer & parser.
     '''
 
+    # number of columns of the batch list
+    _N_COLUMNS = 19
+
     def __init__(self, parent, filename):
         QtGui.QDialog.__init__(self, parent)
         self.parent = parent
@@ -602,7 +636,7 @@ class LWAParserDialog(QtGui.QDialog):
         self.mainLayout.addWidget(QtGui.QLabel('Source file: {:s}'.format(filename)))
 
         # read lwa batch scan entry from file
-        self.entry_settings, self.hd_line_num = lwaparser.scan_header(filename)
+        self.entry_settings, self.lwa_index = lwaparser.scan_header(filename)
 
         if self.entry_settings:
             # set top buttons
@@ -613,9 +647,13 @@ class LWAParserDialog(QtGui.QDialog):
             self.exportXYButton.clicked.connect(self.export_xy)
             self.openFileButton = QtGui.QPushButton('Open New File')
             self.openFileButton.clicked.connect(self.open_new_file)
+            self.refreshButton = QtGui.QPushButton('Refresh')
+            self.refreshButton.setToolTip('Load scans saved to the file since it was opened')
+            self.refreshButton.clicked.connect(self.refresh)
             topButtonLayout = QtGui.QHBoxLayout()
             topButtonLayout.addWidget(self.exportLWAButton)
             topButtonLayout.addWidget(self.exportXYButton)
+            topButtonLayout.addWidget(self.refreshButton)
             topButtonLayout.addWidget(self.openFileButton)
             topButtons.setLayout(topButtonLayout)
             self.mainLayout.addWidget(topButtons)
@@ -654,32 +692,7 @@ class LWAParserDialog(QtGui.QDialog):
             self.batchLayout.addWidget(QtGui.QLabel('Mod Amp'), 0, 17)
             self.batchLayout.addWidget(QtGui.QLabel('Phase'), 0, 18)
 
-            for row in range(len(self.entry_settings)):
-                current_setting = self.entry_settings[row]
-                entry = Shared.LWAScanHdEntry(self, entry_setting=current_setting)
-                # add entry number checkbox to the button group
-                self.previewButtonGroup.addButton(entry.previewCheck, row)
-                self.exportLWAButtonGroup.addButton(entry.exportCheck, row)
-                # add widgets to the dispaly panel layout
-                self.batchLayout.addWidget(entry.previewCheck, row+1, 0)
-                self.batchLayout.addWidget(entry.exportCheck, row+1, 1)
-                self.batchLayout.addWidget(entry.scanNumLabel, row+1, 2)
-                self.batchLayout.addWidget(entry.commentLabel, row+1, 3)
-                self.batchLayout.addWidget(entry.dateLabel, row+1, 4)
-                self.batchLayout.addWidget(entry.timeLabel, row+1, 5)
-                self.batchLayout.addWidget(entry.startFreqLabel, row+1, 6)
-                self.batchLayout.addWidget(entry.stopFreqLabel, row+1, 7)
-                self.batchLayout.addWidget(entry.stepLabel, row+1, 8)
-                self.batchLayout.addWidget(entry.ptsLabel, row+1, 9)
-                self.batchLayout.addWidget(entry.avgLabel, row+1, 10)
-                self.batchLayout.addWidget(entry.sensLabel, row+1, 11)
-                self.batchLayout.addWidget(entry.tcLabel, row+1, 12)
-                self.batchLayout.addWidget(entry.itLabel, row+1, 13)
-                self.batchLayout.addWidget(entry.modModeLabel, row+1, 14)
-                self.batchLayout.addWidget(entry.harmLabel, row+1, 15)
-                self.batchLayout.addWidget(entry.modFreqLabel, row+1, 16)
-                self.batchLayout.addWidget(entry.modAmpLabel, row+1, 17)
-                self.batchLayout.addWidget(entry.phaseLabel, row+1, 18)
+            self.add_entries(self.entry_settings)
 
             self.batchListWidget.setLayout(self.batchLayout)
             self.mainLayout.addWidget(batchArea)
@@ -690,11 +703,76 @@ class LWAParserDialog(QtGui.QDialog):
 
         self.setLayout(self.mainLayout)
 
+    def add_entries(self, entry_settings):
+        ''' Add scan entries to the batch list. Rows follow the scan # '''
+
+        for current_setting in entry_settings:
+            row = current_setting[0] - 1
+            entry = Shared.LWAScanHdEntry(self, entry_setting=current_setting)
+            # add entry number checkbox to the button group
+            self.previewButtonGroup.addButton(entry.previewCheck, row)
+            self.exportLWAButtonGroup.addButton(entry.exportCheck, row)
+            # add widgets to the dispaly panel layout
+            self.batchLayout.addWidget(entry.previewCheck, row+1, 0)
+            self.batchLayout.addWidget(entry.exportCheck, row+1, 1)
+            self.batchLayout.addWidget(entry.scanNumLabel, row+1, 2)
+            self.batchLayout.addWidget(entry.commentLabel, row+1, 3)
+            self.batchLayout.addWidget(entry.dateLabel, row+1, 4)
+            self.batchLayout.addWidget(entry.timeLabel, row+1, 5)
+            self.batchLayout.addWidget(entry.startFreqLabel, row+1, 6)
+            self.batchLayout.addWidget(entry.stopFreqLabel, row+1, 7)
+            self.batchLayout.addWidget(entry.stepLabel, row+1, 8)
+            self.batchLayout.addWidget(entry.ptsLabel, row+1, 9)
+            self.batchLayout.addWidget(entry.avgLabel, row+1, 10)
+            self.batchLayout.addWidget(entry.sensLabel, row+1, 11)
+            self.batchLayout.addWidget(entry.tcLabel, row+1, 12)
+            self.batchLayout.addWidget(entry.itLabel, row+1, 13)
+            self.batchLayout.addWidget(entry.modModeLabel, row+1, 14)
+            self.batchLayout.addWidget(entry.harmLabel, row+1, 15)
+            self.batchLayout.addWidget(entry.modFreqLabel, row+1, 16)
+            self.batchLayout.addWidget(entry.modAmpLabel, row+1, 17)
+            self.batchLayout.addWidget(entry.phaseLabel, row+1, 18)
+
+    def clear_entries(self):
+        ''' Remove all scan entries from the batch list '''
+
+        for button in self.previewButtonGroup.buttons():
+            self.previewButtonGroup.removeButton(button)
+        for button in self.exportLWAButtonGroup.buttons():
+            self.exportLWAButtonGroup.removeButton(button)
+        # keep the row of names
+        while self.batchLayout.count() > self._N_COLUMNS:
+            self.batchLayout.takeAt(self._N_COLUMNS).widget().deleteLater()
+        self.entry_id_to_export = []
+
+    def refresh(self):
+        ''' Pick up scans saved to the file since it was opened, e.g. by a
+            running batch. The list is reloaded if the file was rewritten.
+        '''
+
+        index = lwaparser.update_index(self.filename, self.lwa_index)
+        if index is None:
+            msg = Shared.MsgError(self, 'Cannot read file!', self.filename)
+            msg.exec_()
+            return None
+
+        n = len(self.lwa_index)
+        if len(index) >= n and (index['hd'][:n] == self.lwa_index['hd']).all():
+            # scans appended, add the new ones
+            new_settings = lwaparser.read_entry_settings(self.filename, index, start=n)
+        else:
+            self.clear_entries()
+            self.entry_settings = []
+            new_settings = lwaparser.read_entry_settings(self.filename, index)
+        self.lwa_index = index
+        self.entry_settings += new_settings
+        self.add_entries(new_settings)
+
     def preview_entry(self):
         ''' Preview single scan '''
 
         id_ = self.previewButtonGroup.checkedId()
-        preview_data = lwaparser.preview(id_, self.hd_line_num, src=self.filename)
+        preview_data = lwaparser.preview(id_, self.lwa_index, src=self.filename)
         self.preview_win.setData(preview_data)
         self.preview_win.show()
 
@@ -719,6 +797,8 @@ class LWAParserDialog(QtGui.QDialog):
     def export_lwa(self):
         ''' Export to new lwa file '''
 
+        # export from the current index of the file
+        self.refresh()
         # check if entry_id_to_export list is not empty
         if self.entry_id_to_export:
             output_file, _ = QtGui.QFileDialog.getSaveFileName(self, 'Save lwa file', '', 'SMAP File (*.lwa)')
@@ -733,13 +813,15 @@ class LWAParserDialog(QtGui.QDialog):
                              'Output file shall not overwrite source file')
             msg.exec_()
         elif output_file:
-            lwaparser.export_lwa(list(set(self.entry_id_to_export)), self.hd_line_num, src=self.filename, output=output_file)
+            lwaparser.export_lwa(list(set(self.entry_id_to_export)), self.lwa_index, src=self.filename, output=output_file)
         else:
             pass
 
     def export_xy(self):
         ''' Export to xy text file. User can select delimiter '''
 
+        # export from the current index of the file
+        self.refresh()
         # check if entry_id_to_export list is not empty
         if self.entry_id_to_export:
             output_dir = QtGui.QFileDialog.getExistingDirectory(self, 'Select directory to save xy files')
@@ -754,10 +836,30 @@ class LWAParserDialog(QtGui.QDialog):
                              'Output file shall not overwrite source file')
             msg.exec_()
         elif output_dir:
-            lwaparser.export_xy(list(set(self.entry_id_to_export)), self.hd_line_num, src=self.filename, output_dir=output_dir)
+            id_list = list(set(self.entry_id_to_export))
+            # export in a background thread, and show progress
+            self.exportProgress = QtGui.QProgressDialog('Exporting scans to xy files...',
+                                            'Cancel', 0, len(id_list), self)
+            self.exportProgress.setWindowTitle('Export (XY Format)')
+            self.exportProgress.setWindowModality(QtCore.Qt.WindowModal)
+            self.exportWorker = ExportXYWorker(self, id_list, self.lwa_index,
+                                               self.filename, output_dir)
+            self.exportWorker.progress.connect(self.exportProgress.setValue)
+            self.exportWorker.failed.connect(self.export_failed)
+            self.exportWorker.finished.connect(self.exportProgress.close)
+            self.exportProgress.canceled.connect(self.exportWorker.cancel)
+            self.exportProgress.show()
+            self.exportWorker.start()
         else:
             pass
 
+    def export_failed(self, err_text):
+        ''' Report the error that stopped the xy export '''
+
+        self.exportProgress.close()
+        msg = Shared.MsgError(self, 'Export failed!', err_text)
+        msg.exec_()
+
     def open_new_file(self):
 
         # close this window and delete this instance
@@ -767,12 +869,69 @@ class LWAParserDialog(QtGui.QDialog):
         self.parent.on_lwa_parser()
 
     def reject(self):
+        # stop the running export
+        try:
+            self.exportWorker.cancel()
+            self.exportWorker.wait()
+        except AttributeError:
+            pass
         self.preview_win.close()
         self.preview_win.deleteLater()
         self.close()
         self.deleteLater()
 
 
+class InstProbeWorker(QtCore.QThread):
+    '''
+        Background thread listing & probing the instruments.
+        listed(inst_list) is emitted with the addresses (None if the VISA
+        library cannot be opened), then probed(address, description) as
+        each instrument replies.
+    '''
+
+    listed = QtCore.pyqtSignal(object)
+    probed = QtCore.pyqtSignal(str, str)
+
+    def run(self):
+        inst_list = api_gen.list_resources()
+        self.listed.emit(inst_list)
+        if inst_list:
+            api_gen.probe_all(inst_list, callback=self.probed.emit)
+
+
+class ExportXYWorker(QtCore.QThread):
+    '''
+        Background thread exporting lwa scans to xy files.
+        progress(done) is emitted after each file is written.
+        failed(error text) is emitted if the export stops on an error.
+    '''
+
+    progress = QtCore.pyqtSignal(int)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, parent, id_list, index, src, output_dir):
+        QtCore.QThread.__init__(self, parent)
+        self.id_list = id_list
+        self.index = index
+        self.src = src
+        self.output_dir = output_dir
+        self._canceled = False
+
+    def run(self):
+        try:
+            lwaparser.export_xy(self.id_list, self.index, src=self.src,
+                                output_dir=self.output_dir, callback=self._report)
+        except Exception as err:
+            self.failed.emit('{:s}: {:s}'.format(type(err).__name__, str(err)))
+
+    def _report(self, done, total):
+        self.progress.emit(done)
+        return not self._canceled
+
+    def cancel(self):
+        self._canceled = True
+
+
 class PrevSpectrumDialog(QtGui.QDialog):
     '''
         Preview dialog window for spectrum
@@ -11,6 +11,8 @@ from daq import PresReader
 from api import general as api_gen
 from api import synthesizer as api_syn
 from api import lockin as api_lia
+from api import cache as api_cache
+from api import trace as api_trace
 
 
 class MainWindow(QtGui.QMainWindow):
@@ -87,6 +89,15 @@ class MainWindow(QtGui.QMainWindow):
         self.testModeAction.setShortcut('Ctrl+T')
         self.testModeAction.setWhatsThis('Toggle the test mode to bypass all instrument communication for GUI development.')
 
+        traceAction = QtGui.QAction('Trace Instrument I/O', self)
+        traceAction.setCheckable(True)
+        traceAction.setStatusTip('Record the time and errors of every instrument command')
+        traceAction.toggled.connect(self.on_trace)
+
+        traceSaveAction = QtGui.QAction('Save I/O Trace', self)
+        traceSaveAction.setStatusTip('Save the latency summary and the recorded instrument commands')
+        traceSaveAction.triggered.connect(self.on_trace_save)
+
         # Set menu bar
         self.statusBar()
 
@@ -105,12 +116,17 @@ class MainWindow(QtGui.QMainWindow):
         menuData.addAction(lwaParserAction)
         menuTest = self.menuBar().addMenu('&Test')
         menuTest.addAction(self.testModeAction)
+        menuTest.addAction(traceAction)
+        menuTest.addAction(traceSaveAction)
 
         # Set classes to store all instrument info
         self.synInfo = Shared.SynInfo()
         self.liaInfo = Shared.LiaInfo()
         self.scopeInfo = Shared.ScopeInfo()
         self.motorInfo = Shared.MotorInfo()
+        # write-through caches, skip settings the instrument already has
+        self.synCache = api_cache.InstCache(self.synInfo, api_syn.has_error)
+        self.liaCache = api_cache.InstCache(self.liaInfo, api_lia.has_error)
 
         # Set main window widgets
         self.synStatus = Panels.SynStatus(self)
@@ -271,7 +287,7 @@ class MainWindow(QtGui.QMainWindow):
     def on_pres_reader(self):
         # this is a modaless window, save this attribute to the main class for reuse
         if hasattr(self, 'p_reader_win'):       # if window already activated
-            self.p_reader_win.timer.start()     # restart reading
+            self.p_reader_win.start_polling()   # restart reading
         else:   # initiate window instance
             self.p_reader_win = PresReader.PresReaderWindow(main=self)
         self.p_reader_win.show()
@@ -285,6 +301,25 @@ class MainWindow(QtGui.QMainWindow):
         d = Dialogs.LWAParserDialog(self, filename)
         d.exec_()
 
+    def on_trace(self, state):
+        ''' Switch instrument I/O tracing on/off '''
+
+        api_trace.TRACER.enabled = state
+
+    def on_trace_save(self):
+        ''' Save the I/O trace to a text file '''
+
+        filename, _ = QtGui.QFileDialog.getSaveFileName(self, 'Save I/O Trace',
+                                './visa_trace.txt', 'Text File (*.txt)')
+        if filename:
+            try:
+                api_trace.TRACER.dump(filename)
+            except OSError as err:
+                msg = Shared.MsgError(self, 'Cannot save the I/O trace!', str(err))
+                msg.exec_()
+        else:
+            pass
+
     def closeEvent(self, event):
         q = QtGui.QMessageBox.question(self, 'Quit?',
                        'Are you sure to quit?', QtGui.QMessageBox.Yes |
@@ -10,6 +10,7 @@ import numpy as np
 # import shared gui widgets
 from gui import SharedWidgets as Shared
 from gui import Dialogs
+from data import buffer
 # import instrument api
 from api import synthesizer as api_syn
 from api import lockin as api_lia
@@ -1278,12 +1279,11 @@ class LockinMonitor(QtGui.QWidget):
     def __init__(self, parent):
         QtGui.QWidget.__init__(self, parent)
         self.parent = parent
-        self.counter = 0        # data points counter
 
         self.slenFill = QtGui.QLineEdit()
         self.slenFill.setText('100')
         self.slenFill.setStyleSheet('border: 1px solid {:s}'.format(Shared.msgcolor(2)))
-        self.data = np.zeros(100)
+        self.data = buffer.RingBuffer(100)
         self.yMaxSel = QtGui.QComboBox()
         self.yMaxSel.addItems(['1 V', '100 mV', '10 mV', '1 mV', '100 uV', '10 uV', '1 uV', '100 nV', '10 nV'])
         self.updateRate = QtGui.QComboBox()
@@ -1310,7 +1310,10 @@ class LockinMonitor(QtGui.QWidget):
         self.pgPlot = pg.PlotWidget(title='Lockin Monitor')
         self.pgPlot.setLabel('left', text='Lockin Signal', units='V')
         self.pgPlot.setYRange(0, 1)
-        self.curve = self.pgPlot.plot(self.data)
+        self.curve = self.pgPlot.plot()
+        self.curve.setClipToView(True)
+        self.curve.setDownsampling(auto=True, method='peak')
+        self.refresher = Shared.PlotRefresher(self)
         mainLayout = QtGui.QVBoxLayout()
         mainLayout.setAlignment(QtCore.Qt.AlignTop)
         mainLayout.addWidget(self.pgPlot)
@@ -1345,7 +1348,8 @@ class LockinMonitor(QtGui.QWidget):
 
     def restart(self):
 
-        self.counter = 0    # reset counter
+        self.data.clear()   # reset data
+        self.refresher.set_data(self.curve, None, self.data.view())
         self.startButton.setChecked(True)   # retrigger start button
         self.startButton.setText('Pause')
         self.timer.start()
@@ -1353,7 +1357,7 @@ class LockinMonitor(QtGui.QWidget):
     def stop(self):
 
         self.timer.stop()
-        self.counter = 0
+        self.data.clear()
         self.startButton.setChecked(False)  # reset start button
         self.startButton.setText('Start')
 
@@ -1361,7 +1365,7 @@ class LockinMonitor(QtGui.QWidget):
         status, slen = api_val.val_monitor_sample_len(text)
         self.slenFill.setStyleSheet('border: 1px solid {:s}'.format(Shared.msgcolor(status)))
         if status:
-            self.data = np.zeros(slen)
+            self.data = buffer.RingBuffer(slen)
             self.restart()
         else:
             self.stop()
@@ -1382,24 +1386,18 @@ Automatically reset the update speed to 3pi * time_constant ''')
             self.updateRate.setCurrentIndex(7)
 
     def daq(self):
-        ''' If sampled points are less than the set length, fill up the array
-            If sampled points are more than the set length, roll the array
-            forward and fill the last array element with new data
+        ''' Append new data to the ring buffer. Once the set length is
+            reached, the oldest data point is dropped
         '''
 
-        if self.counter < len(self.data):
-            self.data[self.counter] = api_lia.query_single_x(self.parent.liaHandle)
-            self.counter += 1
-        else:
-            self.data = np.roll(self.data, len(self.data)-1)
-            self.data[-1] = api_lia.query_single_x(self.parent.liaHandle)
+        self.data.append(api_lia.query_single_x(self.parent.liaHandle))
 
     def update_plot(self):
+        ''' Take a new data point. The plot is redrawn by self.refresher '''
+
         self.daq()
-        if self.counter < len(self.data):
-            self.curve.setData(self.data[0:self.counter])
-        else:
-            self.curve.setData(self.data)
+        # the latest points are a moving view into the buffer
+        self.refresher.set_data(self.curve, None, self.data.view())
 
 
 class SpectrumMonitor(QtGui.QWidget):
@@ -189,45 +189,10 @@ class SynInfo():
             self.instName = synHandle.resource_name
             self.instInterface = str(synHandle.interface_type)
             self.instInterfaceNum = synHandle.interface_number
-            self.instRemoteDisp = api_syn.read_remote_disp(synHandle)
-            self.rfToggle = api_syn.read_power_toggle(synHandle)
-            self.synPower = api_syn.read_syn_power(synHandle)
-            self.synFreq = api_syn.read_syn_freq(synHandle)
+            # read all settings in a few compound queries
+            for key, value in api_syn.read_snapshot(synHandle).items():
+                setattr(self, key, value)
             self.probFreq = self.synFreq * self.vdiBandMultiplication
-            self.modToggle = api_syn.read_mod_toggle(synHandle)
-            self.AM1Toggle = api_syn.read_am_state(synHandle, 1)
-            self.AM1Freq = api_syn.read_am_freq(synHandle, 1)
-            self.AM1DepthPercent, self.AM1DepthDbm = api_syn.read_am_depth(synHandle, 1)
-            self.AM1Src = api_syn.read_am_source(synHandle, 1)
-            self.AM1Wave = api_syn.read_am_waveform(synHandle, 1)
-            self.AM2Toggle = api_syn.read_am_state(synHandle, 2)
-            self.AM2Freq = api_syn.read_am_freq(synHandle, 2)
-            self.AM2DepthPercent, self.AM2DepthDbm = api_syn.read_am_depth(synHandle, 2)
-            self.AM2Src = api_syn.read_am_source(synHandle, 2)
-            self.AM2Wave = api_syn.read_am_waveform(synHandle, 2)
-            self.FM1Toggle = api_syn.read_fm_state(synHandle, 1)
-            self.FM1Freq = api_syn.read_fm_freq(synHandle, 1)
-            self.FM1Dev = api_syn.read_fm_dev(synHandle, 1)
-            self.FM1Src = api_syn.read_fm_source(synHandle, 1)
-            self.FM1Wave = api_syn.read_fm_waveform(synHandle, 1)
-            self.FM2Toggle = api_syn.read_fm_state(synHandle, 2)
-            self.FM2Freq = api_syn.read_fm_freq(synHandle, 2)
-            self.FM2Dev = api_syn.read_fm_dev(synHandle, 2)
-            self.FM2Src = api_syn.read_fm_source(synHandle, 2)
-            self.FM2Wave = api_syn.read_fm_waveform(synHandle, 2)
-            self.PM1Toggle = api_syn.read_pm_state(synHandle, 1)
-            self.PM1Freq = api_syn.read_pm_freq(synHandle, 1)
-            self.PM1Dev = api_syn.read_pm_dev(synHandle, 1)
-            self.PM1Src = api_syn.read_pm_source(synHandle, 1)
-            self.PM1Wave = api_syn.read_pm_waveform(synHandle, 1)
-            self.PM2Toggle = api_syn.read_pm_state(synHandle, 2)
-            self.PM2Freq = api_syn.read_pm_freq(synHandle, 2)
-            self.PM2Dev = api_syn.read_pm_dev(synHandle, 2)
-            self.PM2Src = api_syn.read_pm_source(synHandle, 2)
-            self.PM2Wave = api_syn.read_pm_waveform(synHandle, 2)
-            self.LFToggle = api_syn.read_lf_toggle(synHandle)
-            self.LFVoltage = api_syn.read_lf_voltage(synHandle)
-            self.LFSrc = api_syn.read_lf_source(synHandle)
             self.errMsg = ''
         else:
             self.instName = 'No Instrument'
@@ -278,32 +243,20 @@ class LiaInfo():
             self.instName = liaHandle.resource_name
             self.instInterface = str(liaHandle.interface_type)
             self.instInterfaceNum = liaHandle.interface_number
-            self.refSrcIndex = api_lia.read_ref_source(liaHandle)
+            # read all settings in a few compound queries
+            for key, value in api_lia.read_snapshot(liaHandle).items():
+                setattr(self, key, value)
             self.refSrcText = api_lia.REF_SRC_LIST[self.refSrcIndex]
-            self.refFreq = api_lia.read_freq(liaHandle)
-            self.refPhase = api_lia.read_phase(liaHandle)
-            self.refHarm = api_lia.read_harm(liaHandle)
             self.refHarmText = str(self.refHarm)
             self.refHarmIndex = self.refHarm - 1
-            self.configIndex = api_lia.read_input_config(liaHandle)
             self.configText = api_lia.INPUT_CONFIG_LIST[self.configIndex]
-            self.groundingIndex = api_lia.read_input_grounding(liaHandle)
             self.groundingText = api_lia.INPUT_GND_LIST[self.groundingIndex]
-            self.coupleIndex = api_lia.read_couple(liaHandle)
             self.coupleText = api_lia.COUPLE_LIST[self.coupleIndex]
-            self.inputFilterIndex = api_lia.read_input_filter(liaHandle)
             self.inputFilterText = api_lia.INPUT_FILTER_LIST[self.inputFilterIndex]
-            self.sensIndex = api_lia.read_sens(liaHandle)
             self.sensText = api_lia.SENS_LIST[self.sensIndex]
-            self.tcIndex = api_lia.read_tc(liaHandle)
             self.tcText = api_lia.TC_LIST[self.tcIndex]
-            self.reserveIndex = api_lia.read_reserve(liaHandle)
             self.reserveText = api_lia.RESERVE_LIST[self.reserveIndex]
-            self.lpSlopeIndex = api_lia.read_lp_slope(liaHandle)
             self.lpSlopeText = api_lia.LPSLOPE_LIST[self.lpSlopeIndex]
-            self.disp1Text, self.disp2Text = api_lia.read_disp(liaHandle)
-            self.front1Text, self.front2Text = api_lia.read_front_panel(liaHandle)
-            self.sampleRateIndex = api_lia.read_sample_rate(liaHandle)
             self.sampleRateText = api_lia.SAMPLE_RATE_LIST[self.sampleRateIndex]
         else:
             self.instName = 'No Instrument'
@@ -647,6 +600,104 @@ class LWAScanHdEntry(QtGui.QWidget):
         self.phaseLabel.setText('{:.2f} deg'.format(entry_setting[16]))
 
 
+class PlotRefresher(QtCore.QObject):
+    ''' Coalesce plot updates and redraw at a fixed frame rate.
+        Data acquisition marks the changed region of a curve by update();
+        the curve is redrawn at most once per frame, no matter how fast the
+        points come in. Only the region shown so far (the union of all
+        updated regions) is pushed to the curve.
+        The refreshed signal is emitted after each frame that redraws,
+        for other widgets (e.g. progress bars) to follow the same rate.
+    '''
+
+    refreshed = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None, fps=20):
+        QtCore.QObject.__init__(self, parent)
+
+        # curve: [x, y, shown region, changed region], region = (lo, hi)
+        self._curves = {}
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(int(1000 / fps))
+        self.timer.timeout.connect(self.refresh)
+
+    def set_data(self, curve, x, y, shown=True):
+        ''' Attach new data arrays to the curve.
+            Arguments
+                curve: pyqtgraph PlotDataItem
+                x: x array, np.array. None for index
+                y: y array, np.array. The array is referenced, not copied
+                shown: if False, nothing is shown until update()
+        '''
+
+        if shown:
+            self._curves[curve] = [x, y, None, (0, len(y))]
+        else:
+            # an empty region is still pushed once to clear the curve
+            self._curves[curve] = [x, y, None, (0, 0)]
+        self._mark()
+
+    def update(self, curve, lo=0, hi=None):
+        ''' Mark the region [lo, hi) of the curve data changed.
+            Default is the whole array.
+        '''
+
+        entry = self._curves[curve]
+        if hi is None:
+            hi = len(entry[1])
+        entry[3] = _merge_region(entry[3], (lo, hi))
+        self._mark()
+
+    def _mark(self):
+        ''' A redraw is pending. Start frame timer '''
+
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def refresh(self):
+        ''' Redraw all curves with pending updates '''
+
+        redrawn = False
+        for curve, entry in self._curves.items():
+            x, y, shown, changed = entry
+            if changed is None:
+                continue
+            lo, hi = _merge_region(shown, changed)
+            if x is None:
+                curve.setData(np.arange(lo, hi), y[lo:hi])
+            else:
+                curve.setData(x[lo:hi], y[lo:hi])
+            entry[2] = (lo, hi) if hi > lo else None
+            entry[3] = None
+            redrawn = True
+        if redrawn:
+            self.refreshed.emit()
+        else:
+            # nothing is changing, stop timer until the next update
+            self.timer.stop()
+
+    def flush(self):
+        ''' Redraw immediately '''
+
+        self.refresh()
+
+    def stop(self):
+        ''' Stop refreshing. Pending updates are kept '''
+
+        self.timer.stop()
+
+
+def _merge_region(a, b):
+    ''' Smallest region (lo, hi) covering region a and b. None is empty '''
+
+    if a is None or a[0] >= a[1]:
+        return b
+    elif b is None or b[0] >= b[1]:
+        return a
+    else:
+        return (min(a[0], b[0]), max(a[1], b[1]))
+
+
 def msgcolor(status_code):
     ''' Return message color based on status_code.
         0: fatal, red
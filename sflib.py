@@ -11,12 +11,16 @@ calculation. Fit up to 4-th derivative.
 
 The script supports comma, tab and space delimited xy files with any
 number of lines of header information.
-Requires numpy1.8+ and scipy0.16+
+Requires numpy1.8+ and scipy0.18+
 '''
 
 import os
 import re
+import glob
+import warnings
 import numpy as np
+from functools import wraps
+from collections import OrderedDict
 from scipy.optimize import curve_fit
 from scipy.optimize import leastsq
 from math import pi
@@ -27,6 +31,42 @@ from scipy import interpolate
 # ---- Class and Function Declaration ----
 # ----------------------------------------
 
+# fit status codes returned by read_file, fit_spectrum and fit_baseline
+FIT_STAT = {0: 'Fit successful',
+            1: 'Fit failed',
+            2: 'File not found',
+            3: 'Unsupported file format',
+            4: 'Baseline removal failed',
+            5: 'Input Invalid'}
+
+# first data line in a spectrum file: a delimited number pair
+_DATA_LINE = re.compile(rb'\d+( |\t|,)+-?\d+')
+
+# numpy 1.23+ parses text in C inside loadtxt, which is faster than
+# fromstring. Older versions parse loadtxt line by line in Python.
+_C_LOADTXT = tuple(int(v) for v in np.__version__.split('.')[:2]) >= (1, 23)
+
+# size of the file head read to detect header and delimiter
+_HEAD_SIZE = 65536
+
+# Peak widths are raised to powers with float_power, which rounds the same
+# way as scalar arithmetic on a single peak. The ** operator on arrays takes
+# a faster path that may differ in the last bit.
+_wpow = np.float_power
+
+# number of array elements evaluated at once by Function.evaluate
+_BLOCK_SIZE = 16384
+
+
+def _batched(kernel):
+    ''' Turn a lineshape kernel, written for the (peak, len(x)) arrays
+    dx = x - mu, width and A, into a multi-peak method f(self, x, *p) '''
+    @wraps(kernel)
+    def method(self, x, *p):
+        return self.evaluate(kernel, x, p)
+    return method
+
+
 class Function:
     ''' Function class stores all sorts of function form. In spectroscopic
     context, gaussian/lorentzian function families are supported. Also,
@@ -71,115 +111,181 @@ class Function:
             elif self.der == 4:
                 return self.lder4
 
+    def get_jac(self):
+        # get the analytic Jacobian of the function returned by get_func
+        if not self.ftype:
+            return self.gjac
+        elif self.ftype == 1:
+            return self.ljac
+
+    def evaluate(self, kernel, x, p):
+        ''' Evaluate a lineshape kernel for all peaks at once.
+        The parameter vector is reshaped into a (peak, 3) table, so that
+        mu, width and A broadcast against x as column vectors and each peak
+        takes one row of the (peak, len(x)) result, which is then summed
+        over the peak axis. The row by row summation gives the same result
+        as accumulating the peaks one at a time in a loop.
+        Long x vectors are processed in blocks to keep the temporary
+        (peak, block) arrays small enough to stay in cache.
+
+        Arguments:
+        kernel -- lineshape kernel, kernel(dx, width, A)
+        x -- x data vector
+        p -- parameter vector (mu, width, A) * peak
+
+        Returns: sum of all peaks evaluated at x
+        '''
+        x = np.asarray(x, dtype=np.float64)
+        xvec = np.atleast_1d(x)
+        par = np.asarray(p[:3*self.peak], dtype=np.float64).reshape(self.peak, 3)
+        mu = par[:, 0:1]
+        width = par[:, 1:2]
+        A = par[:, 2:3]
+        y = np.empty_like(xvec)
+        block = max(_BLOCK_SIZE // max(self.peak, 1), 1)
+        for i in range(0, len(xvec), block):
+            y[i:i+block] = kernel(xvec[i:i+block] - mu, width, A).sum(axis=0)
+        return y.reshape(x.shape)
+
+    def jacobian(self, kernel, x, p):
+        ''' Evaluate the Jacobian of the multi-peak function.
+        Same broadcasting and blocking as evaluate, but the kernel returns
+        the partial derivatives to mu, width and A for each peak.
+
+        Arguments:
+        kernel -- Jacobian kernel, kernel(dx, width, A)
+        x -- x data vector
+        p -- parameter vector (mu, width, A) * peak
+
+        Returns: (len(x), 3*peak) array, columns ordered as p
+        '''
+        xvec = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        par = np.asarray(p[:3*self.peak], dtype=np.float64).reshape(self.peak, 3)
+        mu = par[:, 0:1]
+        width = par[:, 1:2]
+        A = par[:, 2:3]
+        jac = np.empty((len(xvec), self.peak, 3))
+        block = max(_BLOCK_SIZE // max(self.peak, 1), 1)
+        for i in range(0, len(xvec), block):
+            d_mu, d_width, d_A = kernel(xvec[i:i+block] - mu, width, A)
+            jac[i:i+block, :, 0] = d_mu.T
+            jac[i:i+block, :, 1] = d_width.T
+            jac[i:i+block, :, 2] = d_A.T
+        return jac.reshape(len(xvec), 3*self.peak)
+
+    def gjac(self, x, *p):
+        ''' Jacobian of the Gaussian family of derivative order self.der.
+        With t = (x-mu)/sigma, the n-th derivative is
+            g_n = A(-1)^n He_n(t) exp(-t^2/2) / (sqrt(2pi) sigma^(n+1))
+        where He_n is the probabilists' Hermite polynomial. Then
+            dg_n/dmu = -g_(n+1),  dg_n/dsigma = sigma * g_(n+2)
+        '''
+        n = self.der
+
+        def kernel(dx, sigma, A):
+            t = dx/sigma
+            # Hermite polynomials He_n, He_(n+1), He_(n+2) by recursion
+            he = [np.ones_like(t), t]
+            for k in range(1, n+2):
+                he.append(t*he[k] - k*he[k-1])
+            c = (-1)**n*np.exp(-t**2/2)/(np.sqrt(2*pi)*_wpow(sigma, n+1))
+            return A*c*he[n+1]/sigma, A*c*he[n+2]/sigma, c*he[n]
+
+        return self.jacobian(kernel, x, p)
+
+    def ljac(self, x, *p):
+        ''' Jacobian of the Lorentzian family of derivative order self.der.
+        Each lder_n has the form l = A gamma N(dx, gamma) / (pi D^k), with
+        D = dx^2 + gamma^2/4, so the partials follow from N, dN/ddx and
+        dN/dgamma listed below for each order as (k, N, dN/ddx, dN/dgamma).
+        '''
+        k, num = _LDER_NUM[self.der]
+
+        def kernel(dx, gamma, A):
+            d = dx**2 + _wpow(gamma, 2)/4
+            dk = d**k
+            n, n_dx, n_gamma = num(dx, gamma)
+            d_mu = -A*gamma*(n_dx - 2*k*dx*n/d)/(pi*dk)
+            d_gamma = A*(n + gamma*n_gamma - k*_wpow(gamma, 2)*n/(2*d))/(pi*dk)
+            return d_mu, d_gamma, gamma*n/(pi*dk)
+
+        return self.jacobian(kernel, x, p)
+
+    # Lineshape kernels take dx = x - mu, width and A as arrays broadcast
+    # to (peak, len(x)). They are called through Function.evaluate.
+
     # Gaussian family functions. Integrate[g(x; mu, sigma, A)] = A
-    def gder0(self, x, *p):
-        #! g = p[-1]
-        g = 0
-        for n in range(self.peak):
-            A = p[3*n+2]
-            sigma = p[3*n+1]
-            mu = p[3*n]
-            g += A/(np.sqrt(2*pi)*sigma)*np.exp(-(x-mu)**2/(2*sigma**2))
+    @_batched
+    def gder0(dx, sigma, A):
+        g = A/(np.sqrt(2*pi)*sigma)*np.exp(-dx**2/(2*_wpow(sigma, 2)))
         return g
 
-    def gder1(self, x, *p):
-        #! g = p[-1]
-        g = 0
-        for n in range(self.peak):
-            A = p[3*n+2]
-            sigma = p[3*n+1]
-            mu = p[3*n]
-            g += -A*(x-mu)/(np.sqrt(2*pi)*sigma**3)*np.exp(-(x-mu)**2/(2*sigma**2))
+    @_batched
+    def gder1(dx, sigma, A):
+        g = -A*dx/(np.sqrt(2*pi)*_wpow(sigma, 3))*np.exp(-dx**2/(2*_wpow(sigma, 2)))
         return g
 
-    def gder2(self, x, *p):
-        #! g = p[-1]
-        g = 0
-        for n in range(self.peak):
-            A = p[3*n+2]
-            sigma = p[3*n+1]
-            mu = p[3*n]
-            g += A/(np.sqrt(2*pi)*sigma**3)*(np.exp(-(x-mu)**2/(2*sigma**2))
-                                             *((x-mu)**2/(sigma**2)-1))
+    @_batched
+    def gder2(dx, sigma, A):
+        g = A/(np.sqrt(2*pi)*_wpow(sigma, 3))*(np.exp(-dx**2/(2*_wpow(sigma, 2)))
+                                               *(dx**2/_wpow(sigma, 2)-1))
         return g
 
-    def gder3(self, x, *p):
-        #! g = p[-1]
-        g = 0
-        for n in range(self.peak):
-            A = p[3*n+2]
-            sigma = p[3*n+1]
-            mu = p[3*n]
-            g += A/(np.sqrt(2*pi)*sigma**5)*(x-mu)*np.exp(
-                 -(x-mu)**2/(2*sigma**2))*(3-((x-mu)/sigma)**2)
+    @_batched
+    def gder3(dx, sigma, A):
+        g = A/(np.sqrt(2*pi)*_wpow(sigma, 5))*dx*np.exp(
+            -dx**2/(2*_wpow(sigma, 2)))*(3-(dx/sigma)**2)
         return g
 
-    def gder4(self, x, *p):
-        #! g = p[-1]
-        g = 0
-        for n in range(self.peak):
-            A = p[3*n+2]
-            sigma = p[3*n+1]
-            mu = p[3*n]
-            g += A/(np.sqrt(2*pi)*sigma**5)*(3-6*((x-mu)/sigma)**2+
-                 ((x-mu)/sigma)**4)*np.exp(-(x-mu)**2/(2*sigma**2))
+    @_batched
+    def gder4(dx, sigma, A):
+        g = A/(np.sqrt(2*pi)*_wpow(sigma, 5))*(3-6*(dx/sigma)**2+
+            (dx/sigma)**4)*np.exp(-dx**2/(2*_wpow(sigma, 2)))
         return g
 
     # Lorentzian family functions. Integrate[l(x; mu, gamma, A)] = A
     # gamma is FWHM
-    def lder0(self, x, *p):
-        #! l = p[-1]
-        l = 0
-        for n in range(self.peak):
-            mu = p[3*n]
-            gamma = p[3*n+1]
-            A = p[3*n+2]
-            l += A*gamma/(2*pi*((x-mu)**2+gamma**2/4))
+    @_batched
+    def lder0(dx, gamma, A):
+        l = A*gamma/(2*pi*(dx**2+_wpow(gamma, 2)/4))
         return l
 
-    def lder1(self, x, *p):
-        #! l = p[-1]
-        l = 0
-        for n in range(self.peak):
-            mu = p[3*n]
-            gamma = p[3*n+1]
-            A = p[3*n+2]
-            l += -A*gamma*(x-mu)/(pi*((x-mu)**2+gamma**2/4)**2)
+    @_batched
+    def lder1(dx, gamma, A):
+        l = -A*gamma*dx/(pi*(dx**2+_wpow(gamma, 2)/4)**2)
         return l
 
-    def lder2(self, x, *p):
-        #! l = p[-1]
-        l = 0
-        for n in range(self.peak):
-            mu = p[3*n]
-            gamma = p[3*n+1]
-            A = p[3*n+2]
-            l += A*gamma*(-3*(x-mu)**2+gamma**2/4)/(pi*((x-mu)**2+gamma**2/4)**3)
+    @_batched
+    def lder2(dx, gamma, A):
+        l = A*gamma*(-3*dx**2+_wpow(gamma, 2)/4)/(pi*(dx**2+_wpow(gamma, 2)/4)**3)
         return l
 
-    def lder3(self, x, *p):
-        #! l = p[-1]
-        l = 0
-        for n in range(self.peak):
-            mu = p[3*n]
-            gamma = p[3*n+1]
-            A = p[3*n+2]
-            l += A*gamma*(x-mu)/(pi*((x-mu)**2+gamma**2/4)**4)*(
-                 3*(x-mu)**2+5*gamma**2/4)
+    @_batched
+    def lder3(dx, gamma, A):
+        l = A*gamma*dx/(pi*(dx**2+_wpow(gamma, 2)/4)**4)*(
+            3*dx**2+5*_wpow(gamma, 2)/4)
         return l
 
-    def lder4(self, x, *p):
-        #! l = p[-1]
-        l = 0
-        for n in range(self.peak):
-            mu = p[3*n]
-            gamma = p[3*n+1]
-            A = p[3*n+2]
-            l += A*gamma/(pi*((x-mu)**2+gamma**2/4)**5)*(
-                 5*gamma**4/256-13*((x-mu)*gamma)**2/2-15*(x-mu)**4)
+    @_batched
+    def lder4(dx, gamma, A):
+        l = A*gamma/(pi*(dx**2+_wpow(gamma, 2)/4)**5)*(
+            5*_wpow(gamma, 4)/256-13*(dx*gamma)**2/2-15*dx**4)
         return l
 
 
+# Numerators of the Lorentzian kernels, order: (k, N(dx, gamma)) where
+# N returns (N, dN/ddx, dN/dgamma). Used by Function.ljac.
+_LDER_NUM = (
+    (1, lambda dx, g: (0.5, 0, 0)),
+    (2, lambda dx, g: (-dx, -1, 0)),
+    (3, lambda dx, g: (-3*dx**2 + g**2/4, -6*dx, g/2)),
+    (4, lambda dx, g: (dx*(3*dx**2 + 5*g**2/4), 9*dx**2 + 5*g**2/4,
+                       5*g*dx/2)),
+    (5, lambda dx, g: (5*g**4/256 - 13*(dx*g)**2/2 - 15*dx**4,
+                       -13*dx*g**2 - 60*dx**3, 5*g**3/64 - 13*dx**2*g)),
+)
+
+
 def base(xdata, popt, f):
     ''' Data outside 4 sigma/gamma are considered as baseline.
     Returns the baseline index.
@@ -257,7 +363,7 @@ def fit_baseline(xdata, ydata, deg):
 def get_delm(testline):
     ''' Analyse delimiter in a line '''
     try:
-        return re.search('\d+( |\t|,)+-?\d+', testline).group(1)
+        return re.search(r'\d+( |\t|,)+-?\d+', testline).group(1)
     except AttributeError:
         return False
 
@@ -281,32 +387,68 @@ def out_name_gen(in_name, replace=False):
 
 
 def read_file(file_name, boxwin=1, rescale=1):
-    ''' Load spectrum data '''
-    hd = 0
+    ''' Load spectrum data.
+    Header and delimiter are detected from the buffered head of the file:
+    header lines are skipped up to the first line with a delimited number
+    pair. The numeric block is then parsed in a single pass, by the C parser
+    of loadtxt if numpy has it, or by fromstring on the file buffer otherwise.
+    Comma, tab and space delimiters are supported.
+
+    Arguments:
+    file_name -- spectrum file name
+    boxwin -- boxcar smooth window
+    rescale -- y intensity rescaler
+
+    Returns:
+    xdata -- x data vector
+    ydata -- y data vector
+    fit_stat -- tracker of fit status
+    '''
     try:        # Try to open the file
-        with open(file_name, 'r') as testfile:
-            testline = testfile.readline()
-            while not get_delm(testline):
-                testline = testfile.readline()
-                hd += 1
-        try:
-            delm = get_delm(testline)
-        except AttributeError:
-            fit_stat = 3   # error: unsupported file format
-            return [], [], fit_stat
+        with open(file_name, 'rb') as a_file:
+            buffer = a_file.read(_HEAD_SIZE)
+            # read on until the first data line is complete
+            match = _DATA_LINE.search(buffer)
+            while not (match and buffer.find(b'\n', match.end()) > 0):
+                chunk = a_file.read(_HEAD_SIZE)
+                if not chunk:
+                    break
+                buffer += chunk
+                match = _DATA_LINE.search(buffer)
+            if not _C_LOADTXT:
+                buffer += a_file.read()
     except OSError:
         fit_stat = 2       # error: file not found
         return [], [], fit_stat
-    except UnicodeDecodeError:
-        fit_stat = 3       # error: unsupported file format
+
+    # locate the first data line, everything before is header
+    if not match:
+        fit_stat = 3   # error: unsupported file format
+        return [], [], fit_stat
+    start = buffer.rfind(b'\n', 0, match.start()) + 1
+    end = buffer.find(b'\n', start)
+    if end < 0:
+        end = len(buffer)
+    col = len(buffer[start:end].replace(b',', b' ').split())
+    if col < 2:
+        fit_stat = 3   # error: unsupported file format
         return [], [], fit_stat
 
-    try:        # Try to load the file
-        if delm == ' ':
-            spectrum = np.loadtxt(file_name, skiprows=hd)
+    try:        # Try to parse the numeric block
+        if _C_LOADTXT:
+            delm = ',' if b',' in match.group(0) else None
+            spectrum = np.loadtxt(file_name, delimiter=delm, ndmin=2,
+                                  skiprows=buffer.count(b'\n', 0, start))
         else:
-            spectrum = np.loadtxt(file_name, delimiter=delm, skiprows=hd)
-    except ValueError:
+            block = buffer[start:]
+            if b',' in block:
+                block = block.replace(b',', b' ')
+            with warnings.catch_warnings():
+                # older numpy only warns on unparsable data
+                warnings.simplefilter('error', DeprecationWarning)
+                spectrum = np.fromstring(block, dtype=np.float64, sep=' ')
+            spectrum = spectrum.reshape(-1, col)
+    except (ValueError, DeprecationWarning):
         fit_stat = 3       # error: unsupported file format
         return [], [], fit_stat
 
@@ -316,12 +458,137 @@ def read_file(file_name, boxwin=1, rescale=1):
 
     # perform optional boxcar smooth and rescale
     if rescale != 1:
-        ydata = ydata * rescale
+        ydata *= rescale
+    xdata, ydata = _box_xy(xdata, ydata, boxwin)
+
+    return xdata, ydata, fit_stat
+
+
+def _box_xy(xdata, ydata, boxwin):
+    ''' Boxcar smooth y and trim x to the same length '''
     if boxwin > 1:
         ydata = box_smooth(ydata, boxwin)
-        xdata = xdata[boxwin/2:-boxwin/2]
+        xdata = xdata[(boxwin-1)//2:len(xdata)-boxwin//2]
+    return xdata, ydata
 
-    return xdata, ydata, fit_stat
+
+class SpectrumCache:
+    ''' Cache of parsed spectra, so that reloading a spectrum does not
+    parse the text file again.
+
+    Parsed (x, y) arrays are saved as a hidden .npy sidecar next to the
+    source file, keyed by file size and mtime in the sidecar name, and are
+    memory-mapped on later loads. Recently used spectra are also kept in an
+    in-process LRU, bounded by the number of spectra and total bytes.
+    Sidecars are skipped silently if the directory is not writable.
+    '''
+
+    def __init__(self, max_items=32, max_bytes=256*2**20, sidecar=True):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sidecar = sidecar
+        self.nbytes = 0
+        # file path -> (key, xy array), most recently used at the end
+        self._lru = OrderedDict()
+
+    def read_file(self, file_name, boxwin=1, rescale=1):
+        ''' Same as sflib.read_file, but served from the cache if possible.
+        Cached arrays are never modified: rescale returns a new y array.
+        '''
+        xy, fit_stat = self.load(file_name)
+        if fit_stat:
+            return [], [], fit_stat
+        xdata, ydata = _box_xy(xy[:,0], xy[:,1]*rescale, boxwin)
+        return xdata, ydata, fit_stat
+
+    def load(self, file_name):
+        ''' Get the raw (n, 2) xy array of a spectrum.
+
+        Returns:
+        xy -- read-only xy array. None if failed
+        fit_stat -- tracker of fit status
+        '''
+        path = os.path.abspath(file_name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None, 2     # error: file not found
+        key = '{:d}-{:d}'.format(st.st_size, st.st_mtime_ns)
+
+        # in-process LRU
+        item = self._lru.get(path)
+        if item and item[0] == key:
+            self._lru.move_to_end(path)
+            return item[1], 0
+
+        # sidecar on disk
+        xy = self._load_sidecar(path, key)
+        if xy is None:
+            xdata, ydata, fit_stat = read_file(path)
+            if fit_stat:
+                return None, fit_stat
+            xy = np.column_stack((xdata, ydata))
+            self._save_sidecar(path, key, xy)
+            xy.flags.writeable = False
+
+        self.evict(path)
+        self._lru[path] = (key, xy)
+        self.nbytes += xy.nbytes
+        # drop least recently used spectra if oversize, but keep this one
+        while len(self._lru) > 1 and (len(self._lru) > self.max_items or
+                                      self.nbytes > self.max_bytes):
+            self.evict(next(iter(self._lru)))
+        return xy, 0
+
+    def evict(self, file_name):
+        ''' Remove a spectrum from the in-process LRU '''
+        item = self._lru.pop(os.path.abspath(file_name), None)
+        if item:
+            self.nbytes -= item[1].nbytes
+
+    def clear(self, sidecar=False):
+        ''' Empty the in-process LRU. Also delete sidecars if sidecar=True '''
+        if sidecar:
+            for path in self._lru:
+                for name in self._list_sidecar(path):
+                    try:
+                        os.remove(name)
+                    except OSError:
+                        pass
+        self._lru.clear()
+        self.nbytes = 0
+
+    def _sidecar_name(self, path, key):
+        dir_name, base_name = os.path.split(path)
+        return os.path.join(dir_name, '.{:s}.{:s}.npy'.format(base_name, key))
+
+    def _list_sidecar(self, path):
+        dir_name, base_name = os.path.split(path)
+        return glob.glob(os.path.join(glob.escape(dir_name),
+                         '.{:s}.*-*.npy'.format(glob.escape(base_name))))
+
+    def _load_sidecar(self, path, key):
+        if not self.sidecar:
+            return None
+        try:
+            xy = np.load(self._sidecar_name(path, key), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if xy.ndim == 2 and xy.shape[1] == 2:
+            return xy
+        else:
+            return None
+
+    def _save_sidecar(self, path, key, xy):
+        if not self.sidecar:
+            return None
+        try:
+            # remove sidecars of previous versions of the file
+            for name in self._list_sidecar(path):
+                os.remove(name)
+            np.save(self._sidecar_name(path, key), xy)
+        except OSError:
+            pass
 
 
 def save_fit(out_name, out_tbl, popt, ftype, der, peak):
@@ -450,10 +717,11 @@ def fit_spectrum(f, xdata, ydata, init, deg, smooth_edge=False, THRESHOLD=1e-2):
 
         # Let's fit curve
         try:
-            popt, pcov = curve_fit(f.get_func(), xdata, ydata_db, init)
+            popt, pcov = curve_fit(f.get_func(), xdata, ydata_db, init,
+                                   jac=f.get_jac())
         except (TypeError, ValueError, RuntimeError):
             stat = 1                   # error_1: fit failed
-            return [], [], 0, [], fit_stat
+            return [], [], 0, [], stat
 
         # update residual and initial vector
         residual = ydata_db - f.get_func()(xdata, *popt)
@@ -0,0 +1,63 @@
+#! encoding = utf-8
+
+''' Tests of data.buffer '''
+
+import numpy as np
+from data import buffer
+
+
+def _filled_pyramid(n, **kwargs):
+
+    x = np.arange(n, dtype=float)
+    y = np.sin(x * 0.1) + 0.01 * x
+    pyramid = buffer.MinMaxPyramid(**kwargs)
+    for xi, yi in zip(x, y):
+        pyramid.append(xi, yi)
+    return pyramid, x, y
+
+
+def test_ring_buffer_keeps_last_samples():
+
+    ring = buffer.RingBuffer(5)
+    ring.extend(np.arange(3))
+    for i in range(3, 8):
+        ring.append(i)
+    assert ring.is_full()
+    np.testing.assert_array_equal(ring.view(), np.arange(3, 8))
+    ring.update_last(-1)
+    np.testing.assert_array_equal(ring.view(2), [6, -1])
+
+
+def test_decimate_view_wider_than_data():
+
+    for n in (407, 3263):
+        pyramid, x, y = _filled_pyramid(n)
+        x_out, y_out = pyramid.decimate(x, y, -5, n + 10, npts=100)
+        assert len(x_out) == len(y_out) <= 2 * 100
+        assert y_out.min() == y.min()
+        assert y_out.max() == y.max()
+
+
+def test_decimate_keeps_extremes():
+
+    pyramid, x, y = _filled_pyramid(5000)
+    x_out, y_out = pyramid.decimate(x, y, 1000, 4000, npts=200)
+    assert len(y_out) <= 2 * 200
+    # buckets are aligned to the level, they may reach beyond the range
+    assert y_out.max() >= y[999:4002].max()
+    assert y_out.min() <= y[999:4002].min()
+    assert x_out[0] <= 999 and x_out[-1] >= 4000 - pyramid.factor**2
+
+
+def test_bounded_pyramid_falls_back_to_coarser_levels():
+
+    pyramid, x, y = _filled_pyramid(20000, capacity=64)
+    # every level holds at most capacity buckets
+    x_out, y_out = pyramid.decimate(x, y, npts=100)
+    for level in pyramid._levels:
+        assert len(level[0]) <= 64
+    # the old data are only covered by the coarse levels
+    x_out, y_out = pyramid.decimate(x, y, 0, 2000, npts=100)
+    assert x_out[0] == 0
+    assert y_out.max() >= y[:2002].max()
+    assert y_out.min() == y[:2002].min()
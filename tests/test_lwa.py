@@ -0,0 +1,93 @@
+#! encoding = utf-8
+
+''' Tests of data.save.save_lwa & data.lwaparser '''
+
+import os
+import numpy as np
+from data import save, lwaparser
+
+
+def _h_info(comment, pts_start=100000.0):
+
+    # synmulti, itgtime, sens, tc, mod_freq, mod_depth, mod_mode, lia_harm,
+    # lia_phase, start_freq, step, avg, comment
+    return (6, 100, 0.01, 0.01, 15.0, 30.0, 'FM', 2, 0.0,
+            pts_start, 0.05, 1, comment)
+
+
+def test_save_lwa_non_ascii_comment(tmp_path):
+
+    filename = str(tmp_path / 'scan.lwa')
+    comment = 'T=25°C'
+    y = np.linspace(-0.005, 0.005, 23)
+    save.save_lwa(filename, y, _h_info(comment))
+
+    entry_settings, index = lwaparser.scan_header(filename)
+    assert len(index) == 1
+    # what a text mode write & read in the locale encoding gives back
+    expected = comment.encode(lwaparser.ENCODING, 'replace').decode(lwaparser.ENCODING)
+    assert entry_settings[0][1] == expected
+    x, y_read = lwaparser.read_scan(filename, index[0])
+    assert len(x) == len(y)
+    np.testing.assert_allclose(y_read, y, atol=1e-6)
+
+
+def test_load_index_rebuilds_replaced_file(tmp_path):
+
+    filename = str(tmp_path / 'scan.lwa')
+    save.save_lwa(filename, np.zeros(230), _h_info('A'))
+    save.save_lwa(filename, np.zeros(23), _h_info('B'))
+    _, index = lwaparser.scan_header(filename)
+    assert len(index) == 2
+    len_a = int(index['end'][0])
+
+    # replacement, larger, with 2 scans in place of A so that a header
+    # line is still found at the offset of B
+    new_name = str(tmp_path / 'new.lwa')
+    scratch = str(tmp_path / 'scratch.lwa')
+    save.save_lwa(new_name, np.zeros(30), _h_info('X1'))
+    save.save_lwa(scratch, np.zeros(30), _h_info(''))
+    pad = len_a - os.path.getsize(new_name) - os.path.getsize(scratch)
+    save.save_lwa(new_name, np.zeros(30), _h_info('X' * pad))
+    save.save_lwa(new_name, np.full(23, 0.001), _h_info('B2'))
+    save.save_lwa(new_name, np.zeros(23), _h_info('C'))
+    with open(new_name, 'rb') as f:
+        new = f.read()
+    assert new[len_a:len_a+4] == b'DATE' and len(new) > os.path.getsize(filename)
+    with open(filename, 'wb') as f:
+        f.write(new)
+
+    entry_settings, index = lwaparser.scan_header(filename)
+    assert [entry[1] for entry in entry_settings] == ['X1', 'X' * pad, 'B2', 'C']
+    np.testing.assert_array_equal(index, lwaparser.build_index(filename))
+    x, y_read = lwaparser.read_scan(filename, index[2])
+    np.testing.assert_allclose(y_read, 0.001, atol=1e-6)
+
+
+def test_update_index_picks_up_saved_scan(tmp_path, monkeypatch):
+
+    filename = str(tmp_path / 'scan.lwa')
+    save.save_lwa(filename, np.zeros(23), _h_info('A'))
+    save.save_lwa(filename, np.zeros(31), _h_info('B'))
+    index = lwaparser.load_index(filename)
+    assert len(index) == 2
+
+    size = os.path.getsize(filename)
+    y = np.linspace(-0.001, 0.001, 47)
+    save.save_lwa(filename, y, _h_info('C', pts_start=300000.0))
+
+    # the new record comes from the saved index, the file is not scanned
+    def no_scan(*args, **kwargs):
+        raise AssertionError('lwa file scanned')
+    monkeypatch.setattr(lwaparser, 'build_index', no_scan)
+    monkeypatch.setattr(lwaparser, '_index_scans', no_scan)
+    new_index = lwaparser.update_index(filename, index)
+
+    assert len(new_index) == 3
+    np.testing.assert_array_equal(new_index[:2], index)
+    rec = new_index[2]
+    assert rec['hd'] == size and rec['end'] == os.path.getsize(filename)
+    assert rec['pts'] == 47 and rec['start'] == 300000.0
+    entry_settings = lwaparser.read_entry_settings(filename, new_index, start=2)
+    assert [entry[:2] for entry in entry_settings] == [(3, 'C')]
+    np.testing.assert_allclose(lwaparser.read_scan(filename, rec)[1], y, atol=1e-6)